@@ -44,6 +44,8 @@ LOCAL_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    # First, so it times the whole request
+    "core.common.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -52,6 +54,10 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    # After authentication, as it is for staff users only
+    "core.common.middleware.ProfilingMiddleware",
+    # Request-scoped identity map for the repositories
+    "core.common.middleware.UnitOfWorkMiddleware",
 ]
 
 ROOT_URLCONF = "booking_system.urls"
@@ -90,6 +96,27 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# The table allocation index relies on it to notice inventory changes made by
+# other workers, so deployments must use a shared backend (e.g. the database,
+# memcached or redis); `manage.py check --deploy` fails otherwise.
+
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    }
+}
+
+# Each worker looks up the allocation index version in the cache at most once
+# every ALLOCATION_INDEX_CHECK_SECONDS, so it can keep allocating from the
+# inventory as it was that long before a change made by another worker.
+ALLOCATION_INDEX_CHECK_SECONDS = float(os.getenv("ALLOCATION_INDEX_CHECK_SECONDS", 1))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -156,12 +183,81 @@ REST_FRAMEWORK = {
         "rest_framework.authentication.SessionAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
+    # orjson backed JSON, with the output of DRF's JSONRenderer; swap in
+    # rest_framework.renderers.JSONRenderer and parsers.JSONParser to go back
+    "DEFAULT_RENDERER_CLASSES": (
+        "core.common.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    "DEFAULT_PARSER_CLASSES": (
+        "core.common.parsers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ),
     "DEFAULT_FILTER_BACKENDS": ("django_filters.rest_framework.DjangoFilterBackend",),
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 10,
 }
 
 
+# Metrics recorded and served at /metrics in the Prometheus text format, with
+# METRICS_ENABLED only. Set METRICS_DIR to a directory shared by the server's
+# worker processes, emptied on restart, to add up the metrics of all of them.
+# With METRICS_TOKEN, scrapers must send it as a bearer token.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "False").lower() == "true"
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# With PROFILING_ENABLED, staff users can profile a request by sending an
+# X-Profile header: the cProfile stats and SQL statements come back in place
+# of the response, or with "X-Profile: store" are written to PROFILING_DIR.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "False").lower() == "true"
+PROFILING_DIR = os.getenv("PROFILING_DIR", "")
+PROFILING_STATS_LIMIT = int(os.getenv("PROFILING_STATS_LIMIT", 50))
+
+# Share of service calls traced, from 0 to 1. The timing tree of every traced
+# call, with the services and repositories it went through, is logged as a
+# JSON line to the core.common.tracing logger (see core.common.tracing).
+TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", 0))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "message": {"format": "%(message)s"},
+    },
+    "handlers": {
+        "traces": {"class": "logging.StreamHandler", "formatter": "message"},
+    },
+    "loggers": {
+        "core.common.tracing": {
+            "handlers": ["traces"],
+            "level": os.getenv("TRACING_LOG_LEVEL", "INFO"),
+            "propagate": False,
+        },
+    },
+}
+
+
+# Booking settings
+# Tables are booked in slots of BOOKING_SLOT_MINUTES, each reservation covers
+# BOOKING_DURATION_MINUTES from its start time.
+BOOKING_SLOT_MINUTES = int(os.getenv("BOOKING_SLOT_MINUTES", 30))
+BOOKING_DURATION_MINUTES = int(os.getenv("BOOKING_DURATION_MINUTES", 120))
+# Holds keep a table for BOOKING_HOLD_SECONDS unless the client asks for
+# another duration, up to BOOKING_HOLD_MAX_SECONDS.
+BOOKING_HOLD_SECONDS = int(os.getenv("BOOKING_HOLD_SECONDS", 120))
+BOOKING_HOLD_MAX_SECONDS = int(os.getenv("BOOKING_HOLD_MAX_SECONDS", 900))
+# Largest number of bookings accepted by the batch booking endpoint
+BOOKING_BATCH_MAX_SIZE = int(os.getenv("BOOKING_BATCH_MAX_SIZE", 100))
+# Longest date range, in days, searched by the availability endpoint
+BOOKING_SEARCH_MAX_DAYS = int(os.getenv("BOOKING_SEARCH_MAX_DAYS", 14))
+# Failed bookings suggest up to BOOKING_SUGGESTION_COUNT later start times,
+# looking BOOKING_SUGGESTION_DAYS ahead at most
+BOOKING_SUGGESTION_COUNT = int(os.getenv("BOOKING_SUGGESTION_COUNT", 3))
+BOOKING_SUGGESTION_DAYS = int(os.getenv("BOOKING_SUGGESTION_DAYS", 7))
+
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = os.getenv("CORS_ALLOW_ALL_ORIGINS", "False").lower() == "true"
 
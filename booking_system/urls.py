@@ -5,6 +5,8 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from core.common.views import metrics_view
+
 schema_view = get_schema_view(
     openapi.Info(
         title="Booking System API",
@@ -23,6 +25,7 @@ urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/auth/", include("core.users.api.urls")),
     path("api/bookings/", include("core.bookings.api.urls")),
+    path("metrics", metrics_view, name="metrics"),
     # Swagger UI URLs
     path(
         "swagger/",
@@ -1,3 +1,30 @@
 from django.contrib import admin
 
-# Register your models here.
+from core.bookings.models import Reservation
+from core.common.pagination import EstimatedCountPaginator
+
+
+@admin.register(Reservation)
+class ReservationAdmin(admin.ModelAdmin):
+    """
+    Admin listing of all the reservations.
+
+    The table grows large, so its row count is estimated from the planner
+    statistics (see EstimatedCountPaginator) and the unfiltered total is not
+    counted at all.
+    """
+
+    list_display = (
+        "id",
+        "user",
+        "table",
+        "reservation_date",
+        "reservation_time",
+        "seats_reserved",
+        "status",
+    )
+    list_filter = ("status",)
+    list_select_related = ("user", "table")
+    raw_id_fields = ("user", "table")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
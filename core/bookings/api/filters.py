@@ -0,0 +1,41 @@
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+from django_filters import rest_framework as filters
+
+from core.bookings.models import Reservation
+
+
+class ReservationFilter(filters.FilterSet):
+    """Filters for a user's reservations.
+
+    Every combination is a range scan of an index starting with the user:
+    reservation_user_status_idx with a status, reservation_user_date_idx
+    otherwise.
+    """
+
+    WHEN_CHOICES = (
+        ("upcoming", "Upcoming"),
+        ("past", "Past"),
+    )
+
+    date_from = filters.DateFilter(field_name="reservation_date", lookup_expr="gte")
+    date_to = filters.DateFilter(field_name="reservation_date", lookup_expr="lte")
+    status = filters.ChoiceFilter(choices=Reservation.STATUS_CHOICES)
+    when = filters.ChoiceFilter(choices=WHEN_CHOICES, method="filter_when")
+
+    class Meta:
+        model = Reservation
+        fields = ["date_from", "date_to", "status", "when"]
+
+    def filter_when(self, queryset: QuerySet, name: str, value: str) -> QuerySet:
+        now = timezone.localtime()
+        today, current_time = now.date(), now.time()
+        if value == "upcoming":
+            return queryset.filter(
+                Q(reservation_date__gt=today)
+                | Q(reservation_date=today, reservation_time__gte=current_time)
+            )
+        return queryset.filter(
+            Q(reservation_date__lt=today)
+            | Q(reservation_date=today, reservation_time__lt=current_time)
+        )
@@ -1,9 +1,50 @@
+from datetime import datetime, time, timezone as dt_timezone
+from decimal import Decimal
+from functools import lru_cache
+from operator import methodcaller
+from typing import AbstractSet, Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
 from core.bookings.models import Reservation
+from core.bookings.repositories import ReservationRepository
+from core.tables.models import Table
+from core.tables.services import TableService
+
+TABLE_SUMMARY_FIELDS = ("id", "table_number", "seats", "price_per_seat")
+
+
+class TableSummarySerializer(serializers.ModelSerializer):
+    """Serializer for the table of a reservation."""
+
+    price_per_seat = serializers.DecimalField(
+        max_digits=10, decimal_places=2, read_only=True
+    )
+
+    class Meta:
+        model = Table
+        fields = list(TABLE_SUMMARY_FIELDS)
 
 
 class ReservationSerializer(serializers.ModelSerializer):
-    """Serializer for the Reservation model."""
+    """Serializer for the Reservation model.
+
+    The table is a primary key, or nested when "table" is in the "expand"
+    context. A "fields" context keeps only those fields.
+    """
+
+    EXPANDABLE = {"table": TableSummarySerializer}
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        fields = self.context.get("fields")
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        for name in self.context.get("expand", ()):
+            if name in self.EXPANDABLE and name in self.fields:
+                self.fields[name] = self.EXPANDABLE[name](read_only=True)
 
     class Meta:
         model = Reservation
@@ -20,6 +61,132 @@ class ReservationSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "created_at"]
 
 
+def _format_decimal(places: int) -> Callable[[Decimal], str]:
+    exponent = Decimal(1).scaleb(-places)
+    # Prices repeat across reservations as much as dates do
+    return lru_cache(maxsize=4096)(lambda value: format(value.quantize(exponent), "f"))
+
+
+# Reservations share a handful of dates and slot times, so formatting them
+# once is cheaper
+_format_date = lru_cache(maxsize=4096)(methodcaller("isoformat"))
+
+
+def _nullable(to_representation: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    return lambda value: None if value is None else to_representation(value)
+
+
+def _format_datetime(tzinfo: Any) -> Callable[[datetime], str]:
+    def format_datetime(value: datetime) -> str:
+        if tzinfo is not None and value.tzinfo is not None:
+            value = value.astimezone(tzinfo)
+        value = value.isoformat()
+        if value.endswith("+00:00"):
+            value = value[:-6] + "Z"
+        return value
+
+    return format_datetime
+
+
+class ReservationRowSerializer:
+    """Read-only fast path for ReservationSerializer.
+
+    Builds the same output from QuerySet.values_list() rows instead of model
+    instances, without DRF's per-field machinery. The "fields" and "expand"
+    options work as the ReservationSerializer context does. Select the rows
+    with ``values_list(*serializer.columns, named=True)``, or with
+    ReservationRepository.get_user_reservation_rows, which adds the columns
+    the list is paged on. Dates and times use DRF's default ISO 8601 formats.
+    """
+
+    # A field is (name, column index, formatter or None)
+    Field = Tuple[str, int, Optional[Callable[[Any], Any]]]
+
+    def __init__(
+        self,
+        fields: Optional[AbstractSet[str]] = None,
+        expand: AbstractSet[str] = frozenset(),
+    ) -> None:
+        self.columns: List[str] = []
+        # Resolved once rather than for every row, as DRF does
+        self._timezone = timezone.get_current_timezone() if settings.USE_TZ else None
+        if getattr(self._timezone, "key", None) == "UTC":
+            # The database hands back datetime.timezone.utc, which converts
+            # to itself for free
+            self._timezone = dt_timezone.utc
+        self._fields: List[ReservationRowSerializer.Field] = []
+        self._table_fields: List[ReservationRowSerializer.Field] = []
+
+        for name in ReservationSerializer.Meta.fields:
+            if fields is not None and name not in fields:
+                continue
+            if name == "table" and "table" in expand:
+                self._table_fields = [
+                    self._column(
+                        table_field,
+                        f"table__{table_field}",
+                        Table._meta.get_field(table_field),
+                    )
+                    for table_field in TABLE_SUMMARY_FIELDS
+                ]
+                # Filled in with the nested table, keeping the key order
+                self._fields.append((name, 0, None))
+            else:
+                field = Reservation._meta.get_field(name)
+                self._fields.append(self._column(name, field.attname, field))
+
+    def serialize(self, rows: Iterable[Tuple]) -> List[Dict[str, Any]]:
+        """
+        Serialize values_list rows.
+        """
+        fields = self._fields
+        table_fields = self._table_fields
+        data = []
+        for row in rows:
+            item = {
+                name: (
+                    row[index]
+                    if to_representation is None
+                    else to_representation(row[index])
+                )
+                for name, index, to_representation in fields
+            }
+            if table_fields:
+                item["table"] = {
+                    name: (
+                        row[index]
+                        if to_representation is None
+                        else to_representation(row[index])
+                    )
+                    for name, index, to_representation in table_fields
+                }
+            data.append(item)
+        return data
+
+    def _column(self, name: str, column: str, field: Any) -> Field:
+        self.columns.append(column)
+        to_representation = self._formatter(field)
+        if to_representation is not None and field.null:
+            to_representation = _nullable(to_representation)
+        return name, len(self.columns) - 1, to_representation
+
+    def _formatter(self, field: Any) -> Optional[Callable[[Any], Any]]:
+        internal_type = field.get_internal_type()
+        if internal_type == "DecimalField":
+            return _format_decimal(field.decimal_places)
+        if internal_type == "DateTimeField":
+            return _format_datetime(self._timezone)
+        if internal_type in ("DateField", "TimeField"):
+            return _format_date
+        return None
+
+
+def validate_ends_by_midnight(value: time) -> time:
+    if not TableService.ends_by_midnight(value):
+        raise serializers.ValidationError("Reservations must end by midnight")
+    return value
+
+
 class BookingRequestSerializer(serializers.Serializer):
     """Serializer for booking request data."""
 
@@ -32,8 +199,28 @@ class BookingRequestSerializer(serializers.Serializer):
             raise serializers.ValidationError("Number of people must be positive")
         return value
 
+    def validate_reservation_time(self, value: time) -> time:
+        return validate_ends_by_midnight(value)
+
+
+class BatchBookingRequestSerializer(serializers.Serializer):
+    """Serializer for batch booking request data.
+
+    The bookings are validated one by one with BookingRequestSerializer so
+    that an invalid booking only fails itself.
+    """
+
+    bookings = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+
+    def validate_bookings(self, value: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if len(value) > settings.BOOKING_BATCH_MAX_SIZE:
+            raise serializers.ValidationError(
+                f"Book at most {settings.BOOKING_BATCH_MAX_SIZE} tables at once"
+            )
+        return value
+
 
-class BookingResponseSerializer(serializers.Serializer):
+class BookingDetailsSerializer(serializers.Serializer):
     reservation_id = serializers.IntegerField()
     table_id = serializers.IntegerField()
     seats_reserved = serializers.IntegerField()
@@ -42,14 +229,137 @@ class BookingResponseSerializer(serializers.Serializer):
     reservation_time = serializers.TimeField()
 
 
+class BookingResponseSerializer(BookingDetailsSerializer):
+    """Serializer for booking results.
+
+    Serializes the BookingDetails returned by the services. A party split
+    across several tables lists every reservation.
+    """
+
+    reservations = BookingDetailsSerializer(many=True, required=False)
+
+    def to_representation(self, instance: Any) -> Dict[str, Any]:
+        data = super().to_representation(instance)
+        if data["reservations"] is None:
+            del data["reservations"]
+        return data
+
+
+class QuoteRequestSerializer(serializers.Serializer):
+    """Serializer for quote request data."""
+
+    reservation_date = serializers.DateField(required=False)
+    reservation_time = serializers.TimeField(required=False)
+
+    def validate_reservation_time(self, value: time) -> time:
+        return validate_ends_by_midnight(value)
+
+    def validate(self, attrs: Dict[str, Any]) -> Dict[str, Any]:
+        if ("reservation_date" in attrs) != ("reservation_time" in attrs):
+            raise serializers.ValidationError(
+                "reservation_date and reservation_time must be given together"
+            )
+        return attrs
+
+
+class QuoteSerializer(serializers.Serializer):
+    people_count = serializers.IntegerField()
+    table_id = serializers.IntegerField(
+        source="table.table_number", required=False, allow_null=True
+    )
+    seats_allocated = serializers.IntegerField(required=False, allow_null=True)
+    price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, required=False, allow_null=True
+    )
+
+
+class TableQuoteSerializer(serializers.Serializer):
+    table_id = serializers.IntegerField(source="table.table_number")
+    seats = serializers.IntegerField(source="table.seats")
+    prices = serializers.ListField(
+        child=serializers.DecimalField(max_digits=10, decimal_places=2, allow_null=True)
+    )
+
+
+class QuoteResponseSerializer(serializers.Serializer):
+    """Serializer for quotes.
+
+    ``quotes`` holds the best table for every party size, ``tables`` the
+    price of every party size at each table, null where it doesn't fit.
+    """
+
+    quotes = QuoteSerializer(many=True)
+    tables = TableQuoteSerializer(many=True)
+
+
+class AvailabilityRequestSerializer(serializers.Serializer):
+    """Serializer for availability search data."""
+
+    people_count = serializers.IntegerField(min_value=1)
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    start_time = serializers.TimeField(required=False)
+    end_time = serializers.TimeField(required=False)
+
+    def validate(self, attrs: Dict[str, Any]) -> Dict[str, Any]:
+        days = (attrs["end_date"] - attrs["start_date"]).days + 1
+        if days < 1:
+            raise serializers.ValidationError("end_date must not be before start_date")
+        if days > settings.BOOKING_SEARCH_MAX_DAYS:
+            raise serializers.ValidationError(
+                f"Search at most {settings.BOOKING_SEARCH_MAX_DAYS} days at once"
+            )
+        return attrs
+
+
+class AvailabilitySerializer(serializers.Serializer):
+    reservation_date = serializers.DateField()
+    reservation_time = serializers.TimeField()
+    table_id = serializers.IntegerField(source="table.table_number")
+    seats_allocated = serializers.IntegerField()
+    price = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+
+class HoldRequestSerializer(BookingRequestSerializer):
+    """Serializer for hold request data."""
+
+    hold_seconds = serializers.IntegerField(
+        min_value=1,
+        required=False,
+        default=lambda: settings.BOOKING_HOLD_SECONDS,
+    )
+
+    def validate_hold_seconds(self, value: int) -> int:
+        if value > settings.BOOKING_HOLD_MAX_SECONDS:
+            raise serializers.ValidationError(
+                f"Holds can last at most {settings.BOOKING_HOLD_MAX_SECONDS} seconds"
+            )
+        return value
+
+
+class HoldResponseSerializer(serializers.Serializer):
+    hold_token = serializers.UUIDField()
+    table_id = serializers.IntegerField()
+    seats_reserved = serializers.IntegerField()
+    total_cost = serializers.DecimalField(max_digits=10, decimal_places=2)
+    reservation_date = serializers.DateField()
+    reservation_time = serializers.TimeField()
+    expires_at = serializers.DateTimeField()
+
+
+class ConfirmHoldSerializer(serializers.Serializer):
+    """Serializer for confirming a hold"""
+
+    hold_token = serializers.UUIDField()
+
+
 class CancelReservationSerializer(serializers.Serializer):
     """Serializer for cancellation"""
 
     reservation_id = serializers.IntegerField()
 
     def validate_reservation_id(self, value: int) -> int:
-        try:
-            Reservation.objects.get(id=value)
-        except Reservation.DoesNotExist:
+        # Loaded into the unit of work, where cancelling finds it again
+        if ReservationRepository().get_by_id(value) is None:
             raise serializers.ValidationError("Reservation does not exist")
         return value
@@ -1,7 +1,12 @@
 from django.urls import path
 from core.bookings.api.views import (
+    AvailabilityAPIView,
+    BatchBookTableAPIView,
     BookTableAPIView,
     CancelReservationAPIView,
+    ConfirmHoldAPIView,
+    HoldTableAPIView,
+    QuoteAPIView,
     UserReservationsListAPIView,
 )
 
@@ -10,6 +15,14 @@ app_name = "bookings"
 urlpatterns = [
     # Action 1: Returns reservation details (cost, table ID, and number of seats)
     path("book/", BookTableAPIView.as_view(), name="book_table"),
+    path("book/batch/", BatchBookTableAPIView.as_view(), name="book_tables"),
+    # Current prices of every party size, overall and per table
+    path("quote/", QuoteAPIView.as_view(), name="quote"),
+    # Free start times for a party between two dates
+    path("availability/", AvailabilityAPIView.as_view(), name="availability"),
+    # Two-phase booking: hold a table, then confirm the hold
+    path("hold/", HoldTableAPIView.as_view(), name="hold_table"),
+    path("hold/confirm/", ConfirmHoldAPIView.as_view(), name="confirm_hold"),
     # Action 2: Cancels a reservation
     path("cancel/", CancelReservationAPIView.as_view(), name="cancel_reservation"),
     path(
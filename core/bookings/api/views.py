@@ -1,15 +1,50 @@
+from django.utils.functional import cached_property
 from rest_framework import generics, status, permissions
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from typing import Any
+from datetime import date, time
+from typing import Any, Dict, List, Optional, Set
 
+from core.bookings.api.filters import ReservationFilter
 from core.bookings.api.serializers import (
+    AvailabilityRequestSerializer,
+    AvailabilitySerializer,
+    BatchBookingRequestSerializer,
     BookingRequestSerializer,
     BookingResponseSerializer,
     CancelReservationSerializer,
+    ConfirmHoldSerializer,
+    HoldRequestSerializer,
+    HoldResponseSerializer,
+    QuoteRequestSerializer,
+    QuoteResponseSerializer,
+    ReservationRowSerializer,
     ReservationSerializer,
 )
 from core.bookings.services import ReservationService
+from core.common.pagination import KeysetPagination
+
+
+def no_table_available(
+    service: ReservationService,
+    people_count: int,
+    reservation_date: date,
+    reservation_time: time,
+) -> Response:
+    """
+    Reply to a failed booking with the nearest later times that would work.
+    """
+    suggestions = service.suggest_slots(
+        people_count, reservation_date, reservation_time
+    )
+    return Response(
+        {
+            "error": "No table available",
+            "suggestions": AvailabilitySerializer(suggestions, many=True).data,
+        },
+        status=status.HTTP_400_BAD_REQUEST,
+    )
 
 
 class BookTableAPIView(APIView):
@@ -38,17 +73,163 @@ class BookTableAPIView(APIView):
         )
 
         if not result:
-            return Response(
-                {"error": "No table available"},
-                status=status.HTTP_400_BAD_REQUEST,
+            return no_table_available(
+                service, people_count, reservation_date, reservation_time
+            )
+
+        return Response(
+            BookingResponseSerializer(result).data, status=status.HTTP_201_CREATED
+        )
+
+
+class BatchBookTableAPIView(APIView):
+    """
+    API view for booking tables for many parties in one request.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request: Any) -> Response:
+        serializer = BatchBookingRequestSerializer(data=request.data)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        results: List[Dict[str, Any]] = []
+        valid_bookings = []
+        valid_indexes = []
+        for index, booking in enumerate(serializer.validated_data["bookings"]):
+            booking_serializer = BookingRequestSerializer(data=booking)
+            if booking_serializer.is_valid():
+                valid_bookings.append(booking_serializer.validated_data)
+                valid_indexes.append(index)
+                results.append({})
+            else:
+                results.append({"success": False, "errors": booking_serializer.errors})
+
+        service = ReservationService()
+        booked = service.book_tables(user=request.user, bookings=valid_bookings)
+
+        for index, result in zip(valid_indexes, booked):
+            if result:
+                results[index] = {
+                    "success": True,
+                    **BookingResponseSerializer(result).data,
+                }
+            else:
+                results[index] = {"success": False, "error": "No table available"}
+
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+
+class QuoteAPIView(APIView):
+    """
+    API view for the current prices of every party size.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request: Any) -> Response:
+        serializer = QuoteRequestSerializer(data=request.query_params)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        service = ReservationService()
+        result = service.get_quotes(
+            reservation_date=serializer.validated_data.get("reservation_date"),
+            reservation_time=serializer.validated_data.get("reservation_time"),
+        )
+
+        return Response(QuoteResponseSerializer(result).data, status=status.HTTP_200_OK)
+
+
+class AvailabilityAPIView(APIView):
+    """
+    API view for the times a party can book between two dates.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request: Any) -> Response:
+        serializer = AvailabilityRequestSerializer(data=request.query_params)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        service = ReservationService()
+        result = service.search_availability(**serializer.validated_data)
+
+        return Response(
+            {"slots": AvailabilitySerializer(result, many=True).data},
+            status=status.HTTP_200_OK,
+        )
+
+
+class HoldTableAPIView(APIView):
+    """
+    API view for holding a table for a few seconds before booking it.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request: Any) -> Response:
+        serializer = HoldRequestSerializer(data=request.data)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        service = ReservationService()
+        result = service.hold_table(
+            user=request.user,
+            people_count=serializer.validated_data["people_count"],
+            reservation_date=serializer.validated_data["reservation_date"],
+            reservation_time=serializer.validated_data["reservation_time"],
+            hold_seconds=serializer.validated_data["hold_seconds"],
+        )
+
+        if not result:
+            return no_table_available(
+                service,
+                serializer.validated_data["people_count"],
+                serializer.validated_data["reservation_date"],
+                serializer.validated_data["reservation_time"],
             )
 
-        response_serializer = BookingResponseSerializer(data=result)
-        response_serializer.is_valid(raise_exception=True)
+        response_serializer = HoldResponseSerializer(result)
 
         return Response(response_serializer.data, status=status.HTTP_201_CREATED)
 
 
+class ConfirmHoldAPIView(APIView):
+    """
+    API view for confirming a held table into a reservation.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request: Any) -> Response:
+        serializer = ConfirmHoldSerializer(data=request.data)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        service = ReservationService()
+        result = service.confirm_hold(
+            hold_token=serializer.validated_data["hold_token"], user=request.user
+        )
+
+        if not result:
+            return Response(
+                {"error": "Hold not found or expired"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return Response(
+            BookingResponseSerializer(result).data, status=status.HTTP_201_CREATED
+        )
+
+
 class CancelReservationAPIView(APIView):
     """
     API view for cancelling a reservation.
@@ -80,15 +261,68 @@ class CancelReservationAPIView(APIView):
         return Response({"message": result["message"]}, status=status.HTTP_200_OK)
 
 
+class ReservationPagination(KeysetPagination):
+    """
+    Pages through reservations newest first, along reservation_user_date_idx.
+    """
+
+    ordering = ("-reservation_date", "-reservation_time", "-id")
+
+
 class UserReservationsListAPIView(generics.ListAPIView):
     """
     API view for listing reservations.
 
+    The queryset holds values_list rows of only the columns asked for, which
+    are serialized with ReservationRowSerializer. It gives the same output
+    as serializer_class.
     """
 
     serializer_class = ReservationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ReservationPagination
+    filterset_class = ReservationFilter
+
+    def get_expand(self) -> Set[str]:
+        """
+        Get the relations to nest, from the comma-separated "expand" parameter.
+        """
+        expand = self.request.query_params.get("expand", "")
+        return {name for name in expand.split(",") if name}
+
+    def get_fields(self) -> Optional[Set[str]]:
+        """
+        Get the fields to return, from the comma-separated "fields" parameter.
+        """
+        if "fields" not in self.request.query_params:
+            return None
+        fields = {
+            name for name in self.request.query_params["fields"].split(",") if name
+        }
+        unknown = fields - set(ReservationSerializer.Meta.fields)
+        if unknown:
+            raise ValidationError(
+                {"fields": f"Unknown fields: {', '.join(sorted(unknown))}"}
+            )
+        return fields
+
+    @cached_property
+    def row_serializer(self) -> ReservationRowSerializer:
+        return ReservationRowSerializer(
+            fields=self.get_fields(), expand=self.get_expand()
+        )
+
+    def list(self, request: Any, *args: Any, **kwargs: Any) -> Response:
+        serializer = self.row_serializer
+        rows = self.filter_queryset(self.get_queryset())
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serializer.serialize(page))
+        return Response(serializer.serialize(rows))
 
     def get_queryset(self):
         service = ReservationService()
-        return service.get_user_reservations(self.request.user)
+        return service.get_user_reservation_rows(
+            self.request.user, self.row_serializer.columns
+        )
@@ -0,0 +1,349 @@
+import json
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+
+User = get_user_model()
+
+OPERATIONS = ("login", "book", "cancel", "list")
+
+# The statuses an operation is expected to answer with; a booking is refused
+# with 400 when no table is left
+EXPECTED_STATUSES = {
+    "login": {200},
+    "book": {201, 400},
+    "cancel": {200},
+    "list": {200},
+}
+
+USERNAME_PREFIX = "loadtest-"
+
+
+@dataclass
+class Result:
+    """The outcome of one request."""
+
+    operation: str
+    status: int
+    duration: float
+
+    @property
+    def error(self) -> bool:
+        return self.status not in EXPECTED_STATUSES[self.operation]
+
+
+class InProcessTransport:
+    """
+    Send requests through the Django test client, in this process.
+    """
+
+    def __init__(self) -> None:
+        self.client = Client(raise_request_exception=False, HTTP_HOST=_allowed_host())
+
+    def request(
+        self, method: str, path: str, data: Any = None, token: Optional[str] = None
+    ) -> Tuple[int, Any]:
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {token}"} if token else {}
+        if method == "GET":
+            response = self.client.get(path, data, **headers)
+        else:
+            response = self.client.post(
+                path, json.dumps(data), content_type="application/json", **headers
+            )
+        try:
+            body = json.loads(response.content) if response.content else None
+        except ValueError:
+            body = None
+        return response.status_code, body
+
+    def close(self) -> None:
+        # Every worker thread has database connections of its own
+        connections.close_all()
+
+
+class HTTPTransport:
+    """
+    Send requests to a running server.
+    """
+
+    def __init__(self, base_url: str, timeout: float = 30.0) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def request(
+        self, method: str, path: str, data: Any = None, token: Optional[str] = None
+    ) -> Tuple[int, Any]:
+        url = self.base_url + path
+        body = None
+        headers = {"Accept": "application/json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        if method == "GET":
+            if data:
+                url += "?" + urllib.parse.urlencode(data)
+        else:
+            body = json.dumps(data).encode()
+            headers["Content-Type"] = "application/json"
+
+        request = urllib.request.Request(url, body, headers, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                status, content = response.status, response.read()
+        except urllib.error.HTTPError as error:
+            status, content = error.code, error.read()
+        try:
+            return status, json.loads(content) if content else None
+        except ValueError:
+            return status, None
+
+    def close(self) -> None:
+        pass
+
+
+@dataclass
+class VirtualUser:
+    """
+    A user running operations, keeping the reservations it booked to cancel.
+    """
+
+    transport: Any
+    email: str
+    password: str
+    rng: random.Random
+    days: int
+    max_people: int
+    token: Optional[str] = None
+    reservation_ids: List[int] = field(default_factory=list)
+
+    def run(self, operation: str) -> Result:
+        if self.token is None:
+            operation = "login"
+        elif operation == "cancel" and not self.reservation_ids:
+            # Nothing left to cancel, book something instead
+            operation = "book"
+
+        started = time.perf_counter()
+        try:
+            status = getattr(self, operation)()
+        except OSError:
+            # The server could not be reached or timed out
+            status = 0
+        return Result(operation, status, time.perf_counter() - started)
+
+    def login(self) -> int:
+        status, body = self.transport.request(
+            "POST",
+            reverse("users:login"),
+            {"email": self.email, "password": self.password},
+        )
+        if status == 200:
+            self.token = body["access"]
+        return status
+
+    def book(self) -> int:
+        slot_minutes = settings.BOOKING_SLOT_MINUTES
+        # Lunch and dinner times, on slot boundaries
+        minute = self.rng.randrange(12 * 60, 22 * 60, slot_minutes)
+        status, body = self.transport.request(
+            "POST",
+            reverse("bookings:book_table"),
+            {
+                "people_count": self.rng.randint(1, self.max_people),
+                "reservation_date": (
+                    date.today() + timedelta(days=self.rng.randint(1, self.days))
+                ).isoformat(),
+                "reservation_time": f"{minute // 60:02d}:{minute % 60:02d}",
+            },
+            self.token,
+        )
+        if status == 201:
+            self.reservation_ids.append(body["reservation_id"])
+        return status
+
+    def cancel(self) -> int:
+        reservation_id = self.reservation_ids.pop(
+            self.rng.randrange(len(self.reservation_ids))
+        )
+        status, _ = self.transport.request(
+            "POST",
+            reverse("bookings:cancel_reservation"),
+            {"reservation_id": reservation_id},
+            self.token,
+        )
+        return status
+
+    def list(self) -> int:
+        status, _ = self.transport.request(
+            "GET", reverse("bookings:user_reservations"), None, self.token
+        )
+        return status
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    """
+    Parse a mix such as "login=1,book=4,cancel=2,list=3" into weights.
+    """
+    weights = dict.fromkeys(OPERATIONS, 0)
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in weights:
+            raise ValueError(f"Unknown operation {name!r}, use one of {OPERATIONS}")
+        if not weight.strip().isdigit():
+            raise ValueError(f"Invalid weight for {name!r}: {weight!r}")
+        weights[name] = int(weight)
+    if not any(weights.values()):
+        raise ValueError("The mix needs at least one operation with a weight")
+    return weights
+
+
+def create_users(count: int, password: str) -> List[str]:
+    """
+    Get the emails of the load-test users, creating the missing ones.
+    """
+    emails = []
+    for index in range(count):
+        username = f"{USERNAME_PREFIX}{index}"
+        email = f"{username}@example.com"
+        user, _ = User.objects.get_or_create(
+            username=username, defaults={"email": email}
+        )
+        if not user.check_password(password):
+            user.set_password(password)
+            user.save(update_fields=["password"])
+        emails.append(user.email)
+    return emails
+
+
+def delete_users() -> int:
+    """
+    Delete the load-test users, with their reservations.
+    """
+    _, deleted = User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+    return deleted.get(User._meta.label, 0)
+
+
+def run_load_test(
+    transport_factory: Callable[[], Any],
+    emails: Sequence[str],
+    password: str,
+    mix: Dict[str, int],
+    requests: int,
+    workers: int,
+    duration: Optional[float] = None,
+    seed: Optional[int] = None,
+    days: int = 30,
+    max_people: int = 8,
+) -> Tuple[List[Result], float]:
+    """
+    Run the mix with concurrent workers, one virtual user each.
+
+    Stops after ``requests`` requests in all, or after ``duration`` seconds.
+    Returns the result of every request and the time the run took.
+    """
+    operations = [name for name in OPERATIONS if mix[name]]
+    weights = [mix[name] for name in operations]
+    lock = threading.Lock()
+    remaining = [requests]
+    results: List[Result] = []
+    seeds = random.Random(seed)
+    started = time.perf_counter()
+    deadline = started + duration if duration else math.inf
+
+    def work(email: str, worker_seed: int) -> None:
+        rng = random.Random(worker_seed)
+        transport = transport_factory()
+        user = VirtualUser(transport, email, password, rng, days, max_people)
+        try:
+            while time.perf_counter() < deadline:
+                with lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+                result = user.run(rng.choices(operations, weights)[0])
+                with lock:
+                    results.append(result)
+        finally:
+            transport.close()
+
+    threads = [
+        threading.Thread(
+            target=work, args=(emails[index % len(emails)], seeds.getrandbits(32))
+        )
+        for index in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - started
+
+
+def percentile(ordered: Sequence[float], percent: float) -> float:
+    """
+    Get a percentile of sorted values, by the nearest-rank method.
+    """
+    if not ordered:
+        return 0.0
+    rank = math.ceil(percent / 100 * len(ordered))
+    return ordered[max(rank, 1) - 1]
+
+
+def summarize_results(results: Sequence[Result], elapsed: float) -> Dict[str, Any]:
+    """
+    Get the latency, throughput and error rate of every operation and overall.
+    """
+
+    def summary(selected: Sequence[Result]) -> Dict[str, Any]:
+        durations = sorted(result.duration * 1000 for result in selected)
+        errors = sum(result.error for result in selected)
+        statuses: Dict[str, int] = {}
+        for result in selected:
+            statuses[str(result.status)] = statuses.get(str(result.status), 0) + 1
+        return {
+            "requests": len(selected),
+            "errors": errors,
+            "error_rate": errors / len(selected) if selected else 0.0,
+            "throughput": len(selected) / elapsed if elapsed else 0.0,
+            "latency_ms": {
+                "p50": percentile(durations, 50),
+                "p95": percentile(durations, 95),
+                "p99": percentile(durations, 99),
+                "mean": sum(durations) / len(durations) if durations else 0.0,
+                "max": durations[-1] if durations else 0.0,
+            },
+            "statuses": dict(sorted(statuses.items())),
+        }
+
+    return {
+        "elapsed": elapsed,
+        "endpoints": {
+            operation: summary(
+                [result for result in results if result.operation == operation]
+            )
+            for operation in OPERATIONS
+            if any(result.operation == operation for result in results)
+        },
+        "total": summary(results),
+    }
+
+
+def _allowed_host() -> str:
+    # The test client's default host is only allowed while testing
+    for host in settings.ALLOWED_HOSTS:
+        if host and host != "*" and not host.startswith("."):
+            return host
+    return "localhost"
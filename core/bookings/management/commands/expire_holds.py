@@ -0,0 +1,12 @@
+from typing import Any
+from django.core.management.base import BaseCommand
+
+from core.bookings.repositories import BookingHoldRepository
+
+
+class Command(BaseCommand):
+    help = "Delete expired booking holds and free the table slots they kept."
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        deleted = BookingHoldRepository().delete_expired_holds()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired holds"))
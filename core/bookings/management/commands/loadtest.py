@@ -0,0 +1,174 @@
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+from functools import partial
+from typing import Any, Dict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from core.bookings.loadtest import (
+    HTTPTransport,
+    InProcessTransport,
+    create_users,
+    delete_users,
+    parse_mix,
+    run_load_test,
+    summarize_results,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a mix of login, book, cancel and list requests with concurrent "
+        "workers, and report the latency, throughput and error rate of each. "
+        "Requests go through the app in this process, or to a running server "
+        "with --url. The load-test users are created in the configured "
+        "database, which must be the server's, and deleted afterwards along "
+        "with their reservations."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--url",
+            help="Base URL of a running server, e.g. http://localhost:8000. "
+            "Without it, requests are handled in this process.",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=4, help="Concurrent workers (default 4)."
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=500,
+            help="Requests to send in all (default 500).",
+        )
+        parser.add_argument(
+            "--duration",
+            type=float,
+            help="Stop after this many seconds, even if requests are left.",
+        )
+        parser.add_argument(
+            "--mix",
+            default="login=1,book=4,cancel=2,list=3",
+            help="Weights of the operations (default login=1,book=4,cancel=2,"
+            "list=3).",
+        )
+        parser.add_argument(
+            "--users",
+            type=int,
+            help="Load-test users, shared by the workers (default one each).",
+        )
+        parser.add_argument(
+            "--password",
+            default="load-test-password",
+            help="Password of the load-test users.",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=30,
+            help="Book dates up to this many days ahead (default 30).",
+        )
+        parser.add_argument(
+            "--max-people",
+            type=int,
+            default=8,
+            help="Largest party to book for (default 8).",
+        )
+        parser.add_argument("--seed", type=int, help="Seed of the request mix.")
+        parser.add_argument(
+            "--label", default="", help="Label stored with the results, e.g. a tag."
+        )
+        parser.add_argument("--output", help="Write the results as JSON to a file.")
+        parser.add_argument(
+            "--keep-users",
+            action="store_true",
+            help="Keep the load-test users and their reservations.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        try:
+            mix = parse_mix(options["mix"])
+        except ValueError as error:
+            raise CommandError(str(error))
+        workers = options["workers"]
+        for name in ("workers", "requests", "days", "max_people"):
+            if options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')} must be positive")
+
+        url = options["url"]
+        transport_factory = partial(HTTPTransport, url) if url else InProcessTransport
+
+        emails = create_users(options["users"] or workers, options["password"])
+        started_at = datetime.now(timezone.utc)
+        try:
+            results, elapsed = run_load_test(
+                transport_factory,
+                emails,
+                options["password"],
+                mix,
+                requests=options["requests"],
+                workers=workers,
+                duration=options["duration"],
+                seed=options["seed"],
+                days=options["days"],
+                max_people=options["max_people"],
+            )
+        finally:
+            if not options["keep_users"]:
+                delete_users()
+
+        report: Dict[str, Any] = {
+            "label": options["label"],
+            "started_at": started_at.isoformat(),
+            "revision": _revision(),
+            "python": platform.python_version(),
+            "target": url or "in-process",
+            "workers": workers,
+            "users": len(emails),
+            "mix": mix,
+            "seed": options["seed"],
+            **summarize_results(results, elapsed),
+        }
+        self.write_report(report)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(report, file, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def write_report(self, report: Dict[str, Any]) -> None:
+        self.stdout.write(
+            f"{report['total']['requests']} requests in {report['elapsed']:.2f}s "
+            f"against {report['target']} with {report['workers']} workers"
+        )
+        header = (
+            f"{'endpoint':<10}{'requests':>10}{'errors':>8}{'rate/s':>10}"
+            f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+        )
+        self.stdout.write(header)
+        rows = {**report["endpoints"], "total": report["total"]}
+        for name, summary in rows.items():
+            latency = summary["latency_ms"]
+            line = (
+                f"{name:<10}{summary['requests']:>10}"
+                f"{summary['error_rate']:>8.1%}{summary['throughput']:>10.1f}"
+                f"{latency['p50']:>10.1f}{latency['p95']:>10.1f}"
+                f"{latency['p99']:>10.1f}"
+            )
+            self.stdout.write(self.style.ERROR(line) if summary["errors"] else line)
+
+
+def _revision() -> str:
+    # The commit under test, when run from a git checkout
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
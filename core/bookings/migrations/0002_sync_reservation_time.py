@@ -0,0 +1,76 @@
+# Generated by Django 4.2.11 on 2026-10-18 07:43
+
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("tables", "0002_initial_tables"),
+        ("bookings", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="reservation",
+            options={"ordering": ["-reservation_date", "-reservation_time"]},
+        ),
+        migrations.AlterUniqueTogether(
+            name="reservation",
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name="reservation",
+            name="reservation_time",
+            field=models.TimeField(
+                default=datetime.time(0, 0), help_text="Time of the reservation"
+            ),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name="reservation",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("confirmed", "Confirmed"),
+                    ("cancelled", "Cancelled"),
+                ],
+                default="pending",
+                max_length=20,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="reservation",
+            name="table",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="reservations",
+                to="tables.table",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="reservation",
+            name="total_cost",
+            field=models.DecimalField(decimal_places=2, max_digits=10),
+        ),
+        migrations.AlterField(
+            model_name="reservation",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="reservations",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="reservation",
+            unique_together={
+                ("table", "reservation_date", "reservation_time", "status")
+            },
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.11 on 2026-10-18 07:47
+
+import core.bookings.models
+from django.db import migrations, models
+
+
+def add_period_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    # The reservation period as a tstzrange, kept in sync by PostgreSQL
+    schema_editor.execute("""
+        ALTER TABLE bookings_reservation
+        ADD COLUMN period tstzrange GENERATED ALWAYS AS (
+            tstzrange(
+                timezone('UTC', reservation_date + reservation_time),
+                timezone('UTC', reservation_date + reservation_time + duration),
+                '[)'
+            )
+        ) STORED
+        """)
+    # Active reservations of the same table can't overlap. The table id is
+    # compared as a one-element range so plain GiST works without btree_gist.
+    schema_editor.execute("""
+        ALTER TABLE bookings_reservation
+        ADD CONSTRAINT reservation_no_overlap EXCLUDE USING gist (
+            int8range(table_id, table_id, '[]') WITH &&,
+            period WITH &&
+        ) WHERE (status <> 'cancelled')
+        """)
+
+
+def remove_period_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "ALTER TABLE bookings_reservation "
+        "DROP CONSTRAINT IF EXISTS reservation_no_overlap"
+    )
+    schema_editor.execute(
+        "ALTER TABLE bookings_reservation DROP COLUMN IF EXISTS period"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookings", "0002_sync_reservation_time"),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name="reservation",
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name="reservation",
+            name="duration",
+            field=models.DurationField(
+                default=core.bookings.models.get_default_duration,
+                help_text="Length of the reservation",
+            ),
+        ),
+        migrations.RunPython(add_period_constraint, remove_period_constraint),
+    ]
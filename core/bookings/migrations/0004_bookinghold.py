@@ -0,0 +1,71 @@
+# Generated by Django 4.2.11 on 2026-10-18 07:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tables", "0003_tableoccupancy"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("bookings", "0003_reservation_period"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookingHold",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "token",
+                    models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+                ),
+                (
+                    "seats_reserved",
+                    models.PositiveIntegerField(help_text="Number of seats held"),
+                ),
+                ("total_cost", models.DecimalField(decimal_places=2, max_digits=10)),
+                (
+                    "reservation_date",
+                    models.DateField(help_text="Date of the reservation"),
+                ),
+                (
+                    "reservation_time",
+                    models.TimeField(help_text="Time of the reservation"),
+                ),
+                ("expires_at", models.DateTimeField(db_index=True)),
+                (
+                    "table",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="booking_holds",
+                        to="tables.table",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="booking_holds",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["expires_at"],
+            },
+        ),
+    ]
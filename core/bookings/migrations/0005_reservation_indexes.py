@@ -0,0 +1,36 @@
+# Generated by Django 4.2.11 on 2026-10-18 08:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookings", "0004_bookinghold"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="reservation",
+            index=models.Index(
+                fields=["user", "-reservation_date", "-reservation_time", "-id"],
+                name="reservation_user_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="reservation",
+            index=models.Index(
+                condition=models.Q(("status", "cancelled"), _negated=True),
+                fields=["user", "reservation_date", "reservation_time"],
+                name="reservation_active_user_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="reservation",
+            index=models.Index(
+                condition=models.Q(("status", "cancelled"), _negated=True),
+                fields=["table", "reservation_date", "reservation_time"],
+                name="reservation_active_table_idx",
+            ),
+        ),
+    ]
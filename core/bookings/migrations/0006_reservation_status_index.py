@@ -0,0 +1,26 @@
+# Generated by Django 4.2.11 on 2026-10-18 08:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookings", "0005_reservation_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="reservation",
+            index=models.Index(
+                fields=[
+                    "user",
+                    "status",
+                    "-reservation_date",
+                    "-reservation_time",
+                    "-id",
+                ],
+                name="reservation_user_status_idx",
+            ),
+        ),
+    ]
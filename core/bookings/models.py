@@ -1,11 +1,39 @@
-from django.db import models
+import dataclasses
+import uuid
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from django.db import IntegrityError, connections, models, router, transaction
+from django.db.models import Q
 from django.conf import settings
-from typing import Dict, Any, Optional
+from django.utils import timezone
+from typing import Dict, Any, List, Optional, Tuple
 
 from core.common.models import TimeStampedModel
 from core.tables.models import Table
 
 
+def get_default_duration() -> timedelta:
+    return timedelta(minutes=settings.BOOKING_DURATION_MINUTES)
+
+
+@dataclasses.dataclass(slots=True)
+class BookingDetails:
+    """
+    Details returned to the user after booking.
+
+    A party split across several tables adds up the seats and cost of its
+    reservations, which are listed in ``reservations``.
+    """
+
+    reservation_id: int
+    table_id: int
+    seats_reserved: int
+    total_cost: Decimal
+    reservation_date: date
+    reservation_time: time
+    reservations: Optional[List["BookingDetails"]] = None
+
+
 class Reservation(TimeStampedModel):
     """
     Model for a table reservation.
@@ -43,75 +71,408 @@ class Reservation(TimeStampedModel):
 
     reservation_time = models.TimeField(help_text="Time of the reservation")
 
+    duration = models.DurationField(
+        default=get_default_duration, help_text="Length of the reservation"
+    )
+
     class Meta:
         ordering = ["-reservation_date", "-reservation_time"]
-        # A table can't be double-booked for the same date and time
-        unique_together = ["table", "reservation_date", "reservation_time", "status"]
+        # A table can't be double-booked for overlapping periods. On PostgreSQL
+        # this is enforced by the reservation_no_overlap exclusion constraint
+        # (see migration 0003), other databases fall back to a check in save().
+        indexes = [
+            # A user's reservations newest first, all of them or by status
+            models.Index(
+                fields=["user", "-reservation_date", "-reservation_time", "-id"],
+                name="reservation_user_date_idx",
+            ),
+            models.Index(
+                fields=[
+                    "user",
+                    "status",
+                    "-reservation_date",
+                    "-reservation_time",
+                    "-id",
+                ],
+                name="reservation_user_status_idx",
+            ),
+            # Active reservations only: a user's upcoming bookings and the
+            # overlap checks of a table
+            models.Index(
+                fields=["user", "reservation_date", "reservation_time"],
+                condition=~Q(status="cancelled"),
+                name="reservation_active_user_idx",
+            ),
+            models.Index(
+                fields=["table", "reservation_date", "reservation_time"],
+                condition=~Q(status="cancelled"),
+                name="reservation_active_table_idx",
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"{self.user.email} - Table {self.table.table_number} - {self.reservation_date}"
 
-    def cancel(self) -> bool:
+    def get_booking_details(self) -> BookingDetails:
+        """
+        Get the details returned to the user after booking.
+        """
+        return BookingDetails(
+            reservation_id=self.id,
+            table_id=self.table.table_number,
+            seats_reserved=self.seats_reserved,
+            # Freshly created reservations still hold the price as a float
+            total_cost=self._meta.get_field("total_cost").to_python(self.total_cost),
+            reservation_date=self.reservation_date,
+            reservation_time=self.reservation_time,
+        )
+
+    # Saving other fields can't make a reservation overlap another
+    PERIOD_FIELDS = {
+        "table",
+        "status",
+        "reservation_date",
+        "reservation_time",
+        "duration",
+    }
+
+    def save(self, *args: Any, **kwargs: Any) -> None:
+        using = kwargs.get("using") or router.db_for_write(type(self), instance=self)
+        update_fields = kwargs.get("update_fields")
+        if (
+            connections[using].vendor != "postgresql"
+            and self.status != "cancelled"
+            and (update_fields is None or self.PERIOD_FIELDS & set(update_fields))
+            and self._overlaps_active_reservation(using)
+        ):
+            raise IntegrityError("Table is already reserved for an overlapping period")
+        super().save(*args, **kwargs)
+
+    def get_period(self) -> Tuple[datetime, datetime]:
+        """
+        Get the start and end of the reservation.
+        """
+        reservation_date = self._meta.get_field("reservation_date").to_python(
+            self.reservation_date
+        )
+        reservation_time = self._meta.get_field("reservation_time").to_python(
+            self.reservation_time
+        )
+        starts_at = datetime.combine(reservation_date, reservation_time)
+        return starts_at, starts_at + self.duration
+
+    def _overlaps_active_reservation(self, using: str) -> bool:
+        """
+        Check for overlapping reservations of the table in application code.
+        """
+        starts_at, ends_at = self.get_period()
+        # Reservations are shorter than a day, so neighbours are within a day
+        neighbours = (
+            Reservation.objects.using(using)
+            .filter(
+                table_id=self.table_id,
+                reservation_date__range=(
+                    starts_at.date() - timedelta(days=1),
+                    ends_at.date(),
+                ),
+            )
+            .exclude(status="cancelled")
+            .exclude(pk=self.pk)
+            .only("reservation_date", "reservation_time", "duration")
+        )
+        for other in neighbours:
+            other_starts_at, other_ends_at = other.get_period()
+            if other_starts_at < ends_at and starts_at < other_ends_at:
+                return True
+        return False
+
+    def cancel(self) -> int:
         """
         Cancel  reservation.
+
+        Returns the number of reservations cancelled: 0 when it already was,
+        even by a concurrent request. The status and the table's slots
+        change together or not at all.
         """
+        # Import here to avoid circular imports
+        from core.tables.services import TableService
+
         if self.status == "cancelled":
-            return False
+            return 0
+
+        updated_at = timezone.now()
+        with transaction.atomic(savepoint=False):
+            cancelled = (
+                Reservation.objects.filter(pk=self.pk)
+                .exclude(status="cancelled")
+                .update(status="cancelled", updated_at=updated_at)
+            )
+            if cancelled:
+                # Make the table's slots available again
+                TableService.release_slots(self)
 
         self.status = "cancelled"
-        self.save()
+        if cancelled:
+            self.updated_at = updated_at
+        return cancelled
 
-        # Make the table available again
-        self.table.is_available = True
-        self.table.save()
+    @classmethod
+    def create_reservation(
+        cls,
+        user: settings.AUTH_USER_MODEL,
+        people_count: int,
+        reservation_date: str,
+        reservation_time: str,
+    ) -> Optional[BookingDetails]:
+        """
+        Create a new reservation for a user and specific number of people.
 
-        return True
+        A party too large for any single table is split across several
+        tables, one reservation each, all listed in the details.
+        """
+        # Import here to avoid circular imports
+        from core.tables.allocation import allocation_index
+        from core.tables.services import TableService
+
+        table_service = TableService()
+
+        def book(table: Table, table_info: Dict[str, Any]) -> BookingDetails:
+            reservation = cls.objects.create(
+                user=user,
+                table=table,
+                seats_reserved=table_info["seats_allocated"],
+                total_cost=table_info["price"],
+                reservation_date=reservation_date,
+                reservation_time=reservation_time,
+                status="confirmed",
+            )
+
+            # Take the table's slots for the reservation time
+            table_service.occupy_slots(
+                table,
+                reservation,
+                reservation_date,
+                reservation_time,
+                slot_bitmap=table_info["slot_bitmap"],
+            )
+
+            return reservation.get_booking_details()
+
+        result = table_service.allocate(
+            people_count, reservation_date, reservation_time, book
+        )
+        if result is not None or allocation_index.can_seat(people_count):
+            return result
+
+        # No table is big enough, split the party across several tables
+        def book_combination(
+            tables: List[Tuple[Table, Dict[str, Any]]],
+        ) -> BookingDetails:
+            details = [book(table, table_info) for table, table_info in tables]
+            return dataclasses.replace(
+                details[0],
+                seats_reserved=sum(item.seats_reserved for item in details),
+                total_cost=sum(item.total_cost for item in details),
+                reservations=details,
+            )
+
+        return table_service.allocate_combination(
+            people_count, reservation_date, reservation_time, book_combination
+        )
 
     @classmethod
-    def create_reservation(
+    def create_reservations(
+        cls,
+        user: settings.AUTH_USER_MODEL,
+        bookings: List[Dict[str, Any]],
+    ) -> List[Optional[BookingDetails]]:
+        """
+        Create many reservations for a user in one allocation pass.
+
+        Each booking holds people_count, reservation_date and reservation_time.
+        Returns the booking details, or None when no table was left, in the
+        order of the bookings.
+        """
+        # Import here to avoid circular imports
+        from core.tables.services import TableService
+
+        table_service = TableService()
+
+        with transaction.atomic():
+            plan = table_service.allocate_batch(
+                [
+                    (
+                        booking["people_count"],
+                        booking["reservation_date"],
+                        booking["reservation_time"],
+                    )
+                    for booking in bookings
+                ]
+            )
+
+            reservations = [
+                (
+                    cls(
+                        user=user,
+                        table=table_info["table"],
+                        seats_reserved=table_info["seats_allocated"],
+                        total_cost=table_info["price"],
+                        reservation_date=booking["reservation_date"],
+                        reservation_time=booking["reservation_time"],
+                        status="confirmed",
+                    )
+                    if table_info
+                    else None
+                )
+                for booking, table_info in zip(bookings, plan)
+            ]
+            created = [reservation for reservation in reservations if reservation]
+            cls.objects.bulk_create(created)
+            table_service.occupy_slots_for_reservations(
+                created,
+                [table_info["slot_bitmap"] for table_info in plan if table_info],
+            )
+
+        return [
+            reservation.get_booking_details() if reservation else None
+            for reservation in reservations
+        ]
+
+
+class BookingHold(TimeStampedModel):
+    """
+    Model for a short-lived hold on a table, confirmed into a reservation.
+    """
+
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="booking_holds",
+    )
+
+    table = models.ForeignKey(
+        Table,
+        on_delete=models.CASCADE,
+        related_name="booking_holds",
+    )
+
+    seats_reserved = models.PositiveIntegerField(help_text="Number of seats held")
+
+    total_cost = models.DecimalField(max_digits=10, decimal_places=2)
+
+    reservation_date = models.DateField(help_text="Date of the reservation")
+
+    reservation_time = models.TimeField(help_text="Time of the reservation")
+
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ["expires_at"]
+
+    def __str__(self) -> str:
+        return f"Hold {self.token} - Table {self.table_id} - {self.reservation_date}"
+
+    @property
+    def is_expired(self) -> bool:
+        return self.expires_at <= timezone.now()
+
+    @classmethod
+    def create_hold(
         cls,
         user: settings.AUTH_USER_MODEL,
         people_count: int,
         reservation_date: str,
         reservation_time: str,
+        hold_seconds: int,
     ) -> Optional[Dict[str, Any]]:
         """
-        Create a new reservation for a user and specific number of people.
+        Hold the best table for a user and specific number of people.
         """
         # Import here to avoid circular imports
         from core.tables.services import TableService
 
-        # Find the best table for this reservation using the service
         table_service = TableService()
-        optimal_table_info = table_service.find_optimal_table(people_count)
-
-        if not optimal_table_info:
-            return None
-
-        table = optimal_table_info["table"]
-        seats_allocated = optimal_table_info["seats_allocated"]
-        price = optimal_table_info["price"]
-
-        # Create reservation
-        reservation = cls.objects.create(
-            user=user,
-            table=table,
-            seats_reserved=seats_allocated,
-            total_cost=price,
-            reservation_date=reservation_date,
-            reservation_time=reservation_time,
-            status="confirmed",
+
+        def book(table: Table, table_info: Dict[str, Any]) -> Dict[str, Any]:
+            hold = cls.objects.create(
+                user=user,
+                table=table,
+                seats_reserved=table_info["seats_allocated"],
+                total_cost=table_info["price"],
+                reservation_date=reservation_date,
+                reservation_time=reservation_time,
+                expires_at=timezone.now() + timedelta(seconds=hold_seconds),
+            )
+
+            # Take the table's slots until the hold expires
+            table_service.occupy_slots(
+                table, None, reservation_date, reservation_time, hold=hold
+            )
+
+            return {
+                "hold_token": hold.token,
+                "table_id": table.table_number,
+                "seats_reserved": hold.seats_reserved,
+                "total_cost": hold.total_cost,
+                "reservation_date": reservation_date,
+                "reservation_time": reservation_time,
+                "expires_at": hold.expires_at,
+            }
+
+        return table_service.allocate(
+            people_count, reservation_date, reservation_time, book
         )
 
-        # Make the table unavailable
-        table.is_available = False
-        table.save()
-
-        return {
-            "reservation_id": reservation.id,
-            "table_id": table.table_number,
-            "seats_reserved": seats_allocated,
-            "total_cost": price,
-            "reservation_date": reservation_date,
-            "reservation_time": reservation_time,
-        }
+    def confirm(self) -> Optional[Reservation]:
+        """
+        Turn the hold into a confirmed reservation.
+
+        Returns None when the hold expired, or lost its slots, before it
+        could be confirmed.
+        """
+        # Import here to avoid circular imports
+        from core.tables.services import TableService
+
+        with transaction.atomic():
+            # Expired holds lose their slots to bookings holding this lock, so
+            # it is taken before checking the hold
+            locked = TableService.lock_table_days(
+                [(self.table_id, self.reservation_date)]
+            )
+            hold = (
+                BookingHold.objects.select_for_update()
+                .filter(pk=self.pk, expires_at__gt=timezone.now())
+                .first()
+            )
+            if hold is None:
+                return None
+
+            reservation = Reservation.objects.create(
+                user_id=hold.user_id,
+                table_id=hold.table_id,
+                seats_reserved=hold.seats_reserved,
+                total_cost=hold.total_cost,
+                reservation_date=hold.reservation_date,
+                reservation_time=hold.reservation_time,
+                status="confirmed",
+            )
+
+            # Hand the held slots over to the reservation
+            handed_over = hold.occupancies.update(
+                reservation=reservation, hold=None, expires_at=None
+            )
+            if handed_over != len(TableService.get_slots(hold.reservation_time)):
+                # Some were reclaimed, and may be another booking's by now
+                transaction.set_rollback(True)
+                return None
+            TableService.update_slot_bitmaps(
+                [reservation], occupy=True, locked=locked.values()
+            )
+            hold.delete()
+
+        # The table loaded with the hold, for the booking details
+        if BookingHold.table.is_cached(self):
+            reservation.table = self.table
+        return reservation
@@ -1,7 +1,11 @@
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Sequence
+from uuid import UUID
 from django.db.models import QuerySet
+from django.utils import timezone
 
-from core.bookings.models import Reservation
+from core.bookings.models import BookingHold, Reservation
+from core.common.tracing import traced
+from core.common.unit_of_work import get_unit_of_work
 
 
 class ReservationRepository:
@@ -9,27 +13,61 @@ class ReservationRepository:
     Repository for Reservation model.
     """
 
+    # Always selected, as the list is paged on them
+    LIST_ORDERING_FIELDS = ("id", "reservation_date", "reservation_time")
+
+    @traced
     def get_by_id(self, reservation_id: int) -> Optional[Reservation]:
         """
         Get reservation by ID.
+
+        Within a unit of work the reservation is only fetched once.
         """
+        work = get_unit_of_work()
+        if work:
+            reservation = work.get(Reservation, reservation_id)
+            if reservation:
+                return reservation
         try:
-            return Reservation.objects.get(id=reservation_id)
+            reservation = Reservation.objects.get(id=reservation_id)
         except Reservation.DoesNotExist:
             return None
+        return work.add(reservation) if work else reservation
 
+    @traced
     def get_user_reservations(self, user_id: int) -> QuerySet:
         """
         Get all reservations for user.
         """
         return Reservation.objects.filter(user_id=user_id)
 
+    @traced
+    def get_user_reservation_rows(
+        self, user_id: int, columns: Sequence[str]
+    ) -> QuerySet:
+        """
+        Get all reservations for user as named tuples of the given columns.
+
+        Only those columns are selected, followed by the columns the list is
+        ordered by when they are not among them. Columns of the table, such
+        as "table__seats", are joined in the same query.
+        """
+        columns = [
+            *columns,
+            *(name for name in self.LIST_ORDERING_FIELDS if name not in columns),
+        ]
+        return Reservation.objects.filter(user_id=user_id).values_list(
+            *columns, named=True
+        )
+
+    @traced
     def create_reservation(self, data: Dict[str, Any]) -> Reservation:
         """
         Create reservation.
         """
         return Reservation.objects.create(**data)
 
+    @traced
     def update_reservation(
         self, reservation: Reservation, data: Dict[str, Any]
     ) -> Reservation:
@@ -41,6 +79,7 @@ class ReservationRepository:
         reservation.save()
         return reservation
 
+    @traced
     def delete_reservation(self, reservation_id: int) -> bool:
         """
         Delete reservation by ID.
@@ -52,12 +91,42 @@ class ReservationRepository:
         except Reservation.DoesNotExist:
             return False
 
+    @traced
     def cancel_reservation(self, reservation_id: int) -> Optional[Reservation]:
         """
         Cancel reservation by ID.
         """
-        reservation = ReservationRepository.get_by_id(reservation_id)
+        reservation = self.get_by_id(reservation_id)
         if reservation:
             reservation.cancel()
             return reservation
         return None
+
+
+class BookingHoldRepository:
+    """
+    Repository for BookingHold model.
+    """
+
+    @traced
+    def get_active_hold(self, token: UUID, user_id: int) -> Optional[BookingHold]:
+        """
+        Get an unexpired hold of a user by token, reclaiming it if expired.
+        """
+        hold = (
+            BookingHold.objects.select_related("table")
+            .filter(token=token, user_id=user_id)
+            .first()
+        )
+        if hold and hold.is_expired:
+            hold.delete()
+            return None
+        return hold
+
+    @traced
+    def delete_expired_holds(self) -> int:
+        """
+        Delete all expired holds, freeing their table slots.
+        """
+        _, deleted = BookingHold.objects.filter(expires_at__lte=timezone.now()).delete()
+        return deleted.get(BookingHold._meta.label, 0)
@@ -1,7 +1,12 @@
-from typing import Optional, Dict, Any, List
+from datetime import date, time
+from typing import Optional, Dict, Any, List, Sequence
+from uuid import UUID
 from django.contrib.auth import get_user_model
-from core.bookings.models import Reservation
-from core.bookings.repositories import ReservationRepository
+from django.db.models import QuerySet
+from core.bookings.models import BookingDetails, BookingHold, Reservation
+from core.bookings.repositories import BookingHoldRepository, ReservationRepository
+from core.common.tracing import traced
+from core.tables.services import TableService
 
 User = get_user_model()
 
@@ -13,14 +18,16 @@ class ReservationService:
 
     def __init__(self):
         self.repository = ReservationRepository()
+        self.hold_repository = BookingHoldRepository()
 
+    @traced
     def book_table(
         self,
         user: User,
         people_count: int,
         reservation_date: str,
         reservation_time: str,
-    ) -> Optional[Dict[str, Any]]:
+    ) -> Optional[BookingDetails]:
         """
         Book a table for a user and number of people.
         """
@@ -32,6 +39,54 @@ class ReservationService:
             reservation_time=reservation_time,
         )
 
+    @traced
+    def book_tables(
+        self, user: User, bookings: List[Dict[str, Any]]
+    ) -> List[Optional[BookingDetails]]:
+        """
+        Book tables for many parties of a user at once.
+        """
+
+        return Reservation.create_reservations(user=user, bookings=bookings)
+
+    def hold_table(
+        self,
+        user: User,
+        people_count: int,
+        reservation_date: str,
+        reservation_time: str,
+        hold_seconds: int,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Hold a table for a user for a few seconds before confirming it.
+        """
+
+        return BookingHold.create_hold(
+            user=user,
+            people_count=people_count,
+            reservation_date=reservation_date,
+            reservation_time=reservation_time,
+            hold_seconds=hold_seconds,
+        )
+
+    @traced
+    def confirm_hold(self, hold_token: UUID, user: User) -> Optional[BookingDetails]:
+        """
+        Confirm a hold into a reservation.
+        """
+        hold = self.hold_repository.get_active_hold(hold_token, user.id)
+
+        if not hold:
+            return None
+
+        reservation = hold.confirm()
+
+        if not reservation:
+            return None
+
+        return reservation.get_booking_details()
+
+    @traced
     def cancel_reservation(self, reservation_id: int, user: User) -> Dict[str, Any]:
         """
         Cancel reservation.
@@ -41,25 +96,64 @@ class ReservationService:
         if not reservation:
             return {"success": False, "message": "Reservation not found"}
 
-        if reservation.user != user:
+        if reservation.user_id != user.id:
             return {
                 "success": False,
                 "message": "You do not have permission to cancel this reservation",
             }
 
-        success = reservation.cancel()
-
-        if success:
+        if reservation.cancel():
             return {"success": True, "message": "Reservation cancelled successfully"}
         else:
             return {"success": False, "message": "Reservation is already cancelled"}
 
+    def get_quotes(
+        self,
+        reservation_date: Optional[date] = None,
+        reservation_time: Optional[time] = None,
+    ) -> Dict[str, Any]:
+        """
+        Get the current prices for every party size.
+        """
+        return TableService().get_quotes(reservation_date, reservation_time)
+
+    def search_availability(
+        self,
+        people_count: int,
+        start_date: date,
+        end_date: date,
+        start_time: Optional[time] = None,
+        end_time: Optional[time] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Get the times between two dates at which a party can book a table.
+        """
+        return TableService().search_availability(
+            people_count, start_date, end_date, start_time, end_time
+        )
+
+    def suggest_slots(
+        self, people_count: int, reservation_date: date, reservation_time: time
+    ) -> List[Dict[str, Any]]:
+        """
+        Get the nearest later times a party could book instead.
+        """
+        return TableService().suggest_slots(
+            people_count, reservation_date, reservation_time
+        )
+
     def get_user_reservations(self, user: User) -> List[Reservation]:
         """
         get all reservations for a user.
         """
         return self.repository.get_user_reservations(user.id)
 
+    def get_user_reservation_rows(self, user: User, columns: Sequence[str]) -> QuerySet:
+        """
+        get the reservations of a user as rows of the given columns.
+        """
+        return self.repository.get_user_reservation_rows(user.id, columns)
+
     def get_reservation_details(
         self, reservation_id: int, user: User
     ) -> Optional[Reservation]:
@@ -68,7 +162,7 @@ class ReservationService:
         """
         reservation = self.repository.get_by_id(reservation_id)
 
-        if reservation and reservation.user == user:
+        if reservation and reservation.user_id == user.id:
             return reservation
 
         return None
@@ -0,0 +1,131 @@
+import sys
+import threading
+import time as timer
+from datetime import date, time, timedelta
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TransactionTestCase, skipUnlessDBFeature
+from core.bookings.models import Reservation
+from core.bookings.services import ReservationService
+from core.tables.models import Table
+from core.tables.services import TableService
+
+User = get_user_model()
+
+
+@skipUnlessDBFeature("has_select_for_update")
+class ConcurrentBookingStressTest(TransactionTestCase):
+    """
+    Books the same slots from many threads at once and checks that no table
+    ends up double-booked, and that no booking was turned away while a table
+    was left free.
+    """
+
+    bookings_per_client = 8
+    dates = 4
+    # Lunch and dinner, so bookings of other slots of a table run alongside
+    times = (time(12, 0), time(19, 0))
+
+    def setUp(self):
+        Table.objects.all().delete()
+        self.users = User.objects.bulk_create(
+            User(email=f"stress{index}@test.com", username=f"stress{index}")
+            for index in range(32)
+        )
+        for table_number in range(1, 11):
+            Table.objects.create(
+                table_number=table_number,
+                seats=4 + table_number % 7,
+                price_per_seat=10.00 + table_number,
+            )
+        self.first_date = date.today() + timedelta(days=1)
+
+    def run_clients(self, clients):
+        results = {"booked": 0, "full": 0, "errors": [], "turned_away": set()}
+        lock = threading.Lock()
+        barrier = threading.Barrier(clients)
+
+        def client(user):
+            service = ReservationService()
+            barrier.wait()
+            try:
+                for attempt in range(self.bookings_per_client):
+                    reservation_date = self.first_date + timedelta(
+                        days=attempt % self.dates
+                    )
+                    reservation_time = self.times[
+                        attempt // self.dates % len(self.times)
+                    ]
+                    try:
+                        result = service.book_table(
+                            user=user,
+                            people_count=4,
+                            reservation_date=reservation_date,
+                            reservation_time=reservation_time,
+                        )
+                    except Exception as error:
+                        with lock:
+                            results["errors"].append(error)
+                        continue
+                    with lock:
+                        results["booked" if result else "full"] += 1
+                        if not result:
+                            results["turned_away"].add(
+                                (reservation_date, reservation_time)
+                            )
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=client, args=(user,))
+            for user in self.users[:clients]
+        ]
+        started = timer.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = timer.perf_counter() - started
+        return results, elapsed
+
+    def assert_no_double_bookings(self):
+        active = Reservation.objects.exclude(status="cancelled")
+        seen = set()
+        for reservation in active:
+            key = (
+                reservation.table_id,
+                reservation.reservation_date,
+                reservation.reservation_time,
+            )
+            self.assertNotIn(key, seen, f"Table double-booked: {key}")
+            seen.add(key)
+
+    def assert_no_free_table_when_turned_away(self, turned_away):
+        # Nothing is cancelled, so a table free now was free all along
+        service = TableService()
+        for reservation_date, reservation_time in turned_away:
+            self.assertFalse(
+                service.get_free_tables(reservation_date, reservation_time)
+                .filter(seats__gte=4)
+                .exists(),
+                f"Turned away with a table free: {reservation_date} "
+                f"{reservation_time}",
+            )
+
+    def test_concurrent_bookings(self):
+        for clients in (1, 8, 32):
+            Reservation.objects.all().delete()
+            results, elapsed = self.run_clients(clients)
+            attempts = clients * self.bookings_per_client
+
+            self.assertEqual(results["errors"], [])
+            self.assertEqual(results["booked"] + results["full"], attempts)
+            self.assertEqual(Reservation.objects.count(), results["booked"])
+            self.assert_no_double_bookings()
+            self.assert_no_free_table_when_turned_away(results["turned_away"])
+
+            sys.stderr.write(
+                f"\n{clients:>2} clients: {attempts} attempts, "
+                f"{results['booked']} booked, {results['full']} full, "
+                f"{attempts / elapsed:.1f} bookings/s"
+            )
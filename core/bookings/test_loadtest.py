@@ -0,0 +1,125 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import (
+    LiveServerTestCase,
+    SimpleTestCase,
+    TransactionTestCase,
+    override_settings,
+    skipUnlessDBFeature,
+)
+from core.bookings.loadtest import Result, parse_mix, percentile, summarize_results
+from core.tables.models import Table
+
+User = get_user_model()
+
+FAST_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
+
+class LoadTestReportTest(SimpleTestCase):
+    def test_parse_mix(self):
+        self.assertEqual(
+            parse_mix("book=3, list=1"), {"login": 0, "book": 3, "cancel": 0, "list": 1}
+        )
+        for mix in ("book=1,pay=1", "book=-1", "book=x", "book=0"):
+            with self.assertRaises(ValueError):
+                parse_mix(mix)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 99), 7)
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_summarize_results(self):
+        results = [
+            Result("book", 201, 0.010),
+            Result("book", 400, 0.020),
+            Result("book", 500, 0.030),
+            Result("list", 200, 0.005),
+        ]
+        report = summarize_results(results, elapsed=2.0)
+
+        book = report["endpoints"]["book"]
+        self.assertEqual(book["requests"], 3)
+        # No table left is an answer, a server error is not
+        self.assertEqual(book["errors"], 1)
+        self.assertAlmostEqual(book["error_rate"], 1 / 3)
+        self.assertEqual(book["throughput"], 1.5)
+        self.assertAlmostEqual(book["latency_ms"]["p50"], 20)
+        self.assertAlmostEqual(book["latency_ms"]["p99"], 30)
+        self.assertEqual(book["statuses"], {"201": 1, "400": 1, "500": 1})
+        self.assertNotIn("login", report["endpoints"])
+        self.assertEqual(report["total"]["requests"], 4)
+
+
+class LoadTestCommandMixin:
+    def setUp(self):
+        Table.objects.all().delete()
+        for table_number in range(1, 6):
+            Table.objects.create(
+                table_number=table_number,
+                seats=4 + table_number,
+                price_per_seat=10.00 + table_number,
+            )
+
+    def run_command(self, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "results.json")
+            call_command(
+                "loadtest", output=output, seed=1, stdout=StringIO(), **options
+            )
+            with open(output) as file:
+                return json.load(file)
+
+    def check_report(self, report, requests):
+        self.assertEqual(report["total"]["requests"], requests)
+        self.assertEqual(report["total"]["errors"], 0, report["endpoints"])
+        self.assertEqual(set(report["endpoints"]), {"login", "book", "cancel", "list"})
+        for summary in report["endpoints"].values():
+            latency = summary["latency_ms"]
+            self.assertLessEqual(latency["p50"], latency["p95"])
+            self.assertLessEqual(latency["p95"], latency["p99"])
+            self.assertGreater(summary["throughput"], 0)
+        # The load-test users are deleted along with their reservations
+        self.assertFalse(User.objects.filter(username__startswith="loadtest-").exists())
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class LoadTestCommandTest(LoadTestCommandMixin, TransactionTestCase):
+    def test_in_process(self):
+        report = self.run_command(workers=1, requests=30, label="v1")
+
+        self.assertEqual(report["target"], "in-process")
+        self.assertEqual(report["label"], "v1")
+        self.assertEqual(report["workers"], 1)
+        self.check_report(report, 30)
+
+    # SQLite locks the whole database for writes, making concurrent bookings fail
+    @skipUnlessDBFeature("has_select_for_update_skip_locked")
+    def test_concurrent_workers(self):
+        report = self.run_command(workers=4, requests=60)
+
+        self.assertEqual(report["workers"], 4)
+        self.assertEqual(report["users"], 4)
+        self.check_report(report, 60)
+
+    def test_invalid_options(self):
+        with self.assertRaises(CommandError):
+            call_command("loadtest", mix="book=1,pay=1")
+        with self.assertRaises(CommandError):
+            call_command("loadtest", workers=0)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class LoadTestServerTest(LoadTestCommandMixin, LiveServerTestCase):
+    def test_running_server(self):
+        report = self.run_command(url=self.live_server_url, workers=1, requests=20)
+
+        self.assertEqual(report["target"], self.live_server_url)
+        self.check_report(report, 20)
@@ -1,11 +1,16 @@
-from django.test import TestCase
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
-from datetime import date, timedelta
+from datetime import date, time, timedelta
+from unittest.mock import patch
+from core.bookings.api.filters import ReservationFilter
+from core.bookings.api.views import ReservationPagination
 from core.bookings.models import Reservation
-from core.tables.models import Table
+from core.tables.models import Table, TableOccupancy, TableSlotBitmap
+from core.tables.services import TableService
 
 User = get_user_model()
 
@@ -36,6 +41,7 @@ class BookingAPITest(TestCase):
             total_cost=40.00,
             status="confirmed",
             reservation_date=date.today(),
+            reservation_time=time(19, 0),
         )
 
         self.client = APIClient()
@@ -62,6 +68,7 @@ class BookingAPITest(TestCase):
         data = {
             "people_count": 6,
             "reservation_date": tomorrow.isoformat(),
+            "reservation_time": "19:00",
         }
         response = self.client.post(self.book_url, data, format="json")
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
@@ -74,6 +81,7 @@ class BookingAPITest(TestCase):
         data = {
             "people_count": -1,
             "reservation_date": date.today().isoformat(),
+            "reservation_time": "19:00",
         }
         response = self.client.post(self.book_url, data, format="json")
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -101,3 +109,235 @@ class BookingAPITest(TestCase):
         self.assertEqual(
             reservations_response.status_code, status.HTTP_401_UNAUTHORIZED
         )
+
+
+class ReservationCancelMixin:
+    def setUp(self):
+        Table.objects.all().delete()
+        self.user = User.objects.create_user(
+            email="cancel@test.com",
+            password="testpassword",
+            username="cancel",
+        )
+        self.table = Table.objects.create(
+            table_number=204, seats=4, price_per_seat=10.00
+        )
+        self.reservation_date = date.today() + timedelta(days=1)
+
+    def book(self):
+        result = Reservation.create_reservation(
+            self.user, 4, self.reservation_date, time(19, 0)
+        )
+        return Reservation.objects.get(pk=result.reservation_id)
+
+    def get_slots(self):
+        return TableSlotBitmap.objects.get(
+            table=self.table, date=self.reservation_date
+        ).slots
+
+
+class ReservationCancelTest(ReservationCancelMixin, TestCase):
+    def test_cancel(self):
+        reservation = self.book()
+        updated_at = reservation.updated_at
+
+        # One conditional UPDATE, then the slots: DELETE, SELECT, UPDATE
+        with self.assertNumQueries(4):
+            self.assertEqual(reservation.cancel(), 1)
+
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.status, "cancelled")
+        self.assertGreater(reservation.updated_at, updated_at)
+        self.assertFalse(TableOccupancy.objects.filter(table=self.table).exists())
+        self.assertEqual(self.get_slots(), 0)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(reservation.cancel(), 0)
+
+    def test_cancel_stale_reservation(self):
+        reservation = self.book()
+        stale = Reservation.objects.get(pk=reservation.pk)
+        reservation.cancel()
+        rebooked = self.book()
+        slots = self.get_slots()
+
+        # Already cancelled by someone else, the new booking keeps its slots
+        self.assertEqual(stale.cancel(), 0)
+        self.assertEqual(stale.status, "cancelled")
+        self.assertEqual(self.get_slots(), slots)
+        self.assertTrue(TableOccupancy.objects.filter(reservation=rebooked).exists())
+
+
+class ReservationCancelTransactionTest(ReservationCancelMixin, TransactionTestCase):
+    def test_cancel_is_atomic(self):
+        reservation = self.book()
+        slots = self.get_slots()
+        # Outside of any transaction, so only cancel() can roll back
+        with patch.object(
+            TableService, "update_slot_bitmaps", side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                reservation.cancel()
+
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.status, "confirmed")
+        self.assertTrue(TableOccupancy.objects.filter(reservation=reservation).exists())
+        self.assertEqual(self.get_slots(), slots)
+
+
+class ReservationOverlapTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="overlap@test.com",
+            password="testpassword",
+            username="overlap",
+        )
+        self.table = Table.objects.create(
+            table_number=203,
+            seats=4,
+            price_per_seat=10.00,
+        )
+        self.reservation_date = date.today() + timedelta(days=1)
+        self.reservation = self.create_reservation(time(19, 0))
+
+    def create_reservation(self, reservation_time, status="confirmed"):
+        return Reservation.objects.create(
+            user=self.user,
+            table=self.table,
+            seats_reserved=4,
+            total_cost=30.00,
+            status=status,
+            reservation_date=self.reservation_date,
+            reservation_time=reservation_time,
+            duration=timedelta(hours=2),
+        )
+
+    def test_get_period(self):
+        starts_at, ends_at = self.reservation.get_period()
+        self.assertEqual(ends_at - starts_at, timedelta(hours=2))
+        self.assertEqual(starts_at.time(), time(19, 0))
+
+    def test_overlapping_reservation_rejected(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.create_reservation(time(20, 30))
+
+    def test_saving_other_fields_skips_overlap_check(self):
+        self.reservation.seats_reserved = 3
+        with self.assertNumQueries(1):
+            self.reservation.save(update_fields=["seats_reserved"])
+
+    def test_adjacent_reservation_allowed(self):
+        self.create_reservation(time(21, 0))
+        self.create_reservation(time(17, 0))
+        self.assertEqual(Reservation.objects.filter(table=self.table).count(), 3)
+
+    def test_rebooking_after_cancellations_allowed(self):
+        self.reservation.cancel()
+        second = self.create_reservation(time(19, 0))
+        second.cancel()
+        self.create_reservation(time(19, 0))
+        self.assertEqual(
+            Reservation.objects.filter(table=self.table)
+            .exclude(status="cancelled")
+            .count(),
+            1,
+        )
+
+
+@skipUnlessDBFeature("supports_explaining_query_execution")
+class ReservationIndexTest(TestCase):
+    """
+    Checks that the reservation list and availability queries use an index
+    on a large table, once the planner has statistics about it.
+    """
+
+    reservation_count = 20000
+
+    @classmethod
+    def setUpTestData(cls):
+        Table.objects.all().delete()
+        tables = Table.objects.bulk_create(
+            Table(table_number=number, seats=4, price_per_seat=10.00)
+            for number in range(1, 11)
+        )
+        users = User.objects.bulk_create(
+            User(email=f"index{index}@test.com", username=f"index{index}")
+            for index in range(200)
+        )
+        first_date = date(2020, 1, 1)
+        Reservation.objects.bulk_create(
+            Reservation(
+                user=users[index % len(users)],
+                table=tables[index % len(tables)],
+                seats_reserved=4,
+                total_cost=30.00,
+                status="cancelled" if index % 10 == 0 else "confirmed",
+                reservation_date=first_date + timedelta(days=index // len(tables)),
+                reservation_time=time(19, 0),
+            )
+            for index in range(cls.reservation_count)
+        )
+        cls.user = users[0]
+        cls.table = tables[0]
+        cls.date = first_date + timedelta(days=100)
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Reservation._meta.db_table}")
+
+    def assertNoSequentialScan(self, queryset):
+        table = Reservation._meta.db_table
+        plan = queryset.explain()
+        # PostgreSQL reports "Seq Scan on <table>", SQLite "SCAN <table>"
+        # without "USING INDEX"
+        self.assertNotIn(f"Seq Scan on {table}", plan)
+        self.assertNotRegex(plan, rf"SCAN {table}(?! USING)")
+
+    def test_user_reservations_list(self):
+        reservations = Reservation.objects.filter(user=self.user)
+        self.assertNoSequentialScan(reservations[:10])
+        self.assertNoSequentialScan(reservations.values("pk"))
+
+    def test_user_reservations_next_page(self):
+        pagination = ReservationPagination()
+        reservations = Reservation.objects.filter(user=self.user).order_by(
+            *pagination.ordering
+        )
+        last = reservations[50]
+        position = [
+            str(last.reservation_date),
+            str(last.reservation_time),
+            str(last.pk),
+        ]
+        page = reservations.filter(
+            pagination._after(Reservation, pagination.ordering, position)
+        )[:11]
+        self.assertNoSequentialScan(page)
+        # The position bounds the index scan instead of filtering its rows
+        self.assertRegex(
+            page.explain(),
+            r"Index Cond: .*reservation_date <=|USING INDEX \w+ \(.*reservation_date<",
+        )
+
+    def test_filtered_user_reservations_list(self):
+        reservations = Reservation.objects.filter(user=self.user)
+        for params in (
+            {"status": "confirmed"},
+            {"status": "cancelled", "date_from": "2020-03-01"},
+            {"date_from": "2020-03-01", "date_to": "2020-06-01"},
+            {"when": "upcoming"},
+            {"when": "past", "status": "confirmed"},
+        ):
+            with self.subTest(**params):
+                queryset = ReservationFilter(params, queryset=reservations).qs
+                self.assertNoSequentialScan(
+                    queryset.order_by("-reservation_date", "-reservation_time", "-id")[
+                        :10
+                    ]
+                )
+
+    def test_table_availability(self):
+        self.assertNoSequentialScan(
+            Reservation.objects.filter(
+                table=self.table,
+                reservation_date__range=(self.date - timedelta(days=1), self.date),
+            ).exclude(status="cancelled")
+        )
@@ -1,10 +1,13 @@
-from django.test import TestCase
+import json
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
-from datetime import date
+from datetime import date, time, timedelta
+from decimal import Decimal
 from unittest.mock import patch
-from core.bookings.models import Reservation
+from core.bookings.models import BookingDetails, Reservation
 from core.bookings.services import ReservationService
 from core.tables.models import Table
+from core.tables.services import TableService
 
 User = get_user_model()
 
@@ -35,6 +38,7 @@ class ReservationServiceTest(TestCase):
             total_cost=40.00,
             status="confirmed",
             reservation_date=date.today(),
+            reservation_time=time(19, 0),
         )
 
         self.service = ReservationService()
@@ -46,24 +50,27 @@ class ReservationServiceTest(TestCase):
 
     @patch("core.bookings.models.Reservation.create_reservation")
     def test_book_table(self, mock_create_reservation):
-        expected_result = {
-            "reservation_id": 1,
-            "table_id": 1,
-            "seats_reserved": 4,
-            "total_cost": 40.00,
-            "reservation_date": date.today(),
-        }
+        expected_result = BookingDetails(
+            reservation_id=1,
+            table_id=1,
+            seats_reserved=4,
+            total_cost=Decimal("40.00"),
+            reservation_date=date.today(),
+            reservation_time=time(19, 0),
+        )
         mock_create_reservation.return_value = expected_result
         result = self.service.book_table(
             user=self.user,
             people_count=4,
             reservation_date=date.today(),
+            reservation_time=time(19, 0),
         )
         self.assertEqual(result, expected_result)
         mock_create_reservation.assert_called_once_with(
             user=self.user,
             people_count=4,
             reservation_date=date.today(),
+            reservation_time=time(19, 0),
         )
 
     def test_cancel_reservation_not_found(self):
@@ -88,8 +95,208 @@ class ReservationServiceTest(TestCase):
             total_cost=90.00,
             status="confirmed",
             reservation_date=date.today(),
+            reservation_time=time(19, 0),
         )
         reservations = self.service.get_user_reservations(self.user)
         self.assertEqual(len(reservations), 2)
         self.assertIn(self.reservation, reservations)
         self.assertIn(another_reservation, reservations)
+
+    def test_book_table_same_slot_uses_next_table(self):
+        Table.objects.create(
+            table_number=303,
+            seats=4,
+            price_per_seat=12.00,
+            is_available=True,
+        )
+        booking_date = date.today() + timedelta(days=1)
+        first = self.service.book_table(
+            user=self.user,
+            people_count=4,
+            reservation_date=booking_date,
+            reservation_time=time(19, 0),
+        )
+        second = self.service.book_table(
+            user=self.user,
+            people_count=4,
+            reservation_date=booking_date,
+            reservation_time=time(20, 0),
+        )
+        third = self.service.book_table(
+            user=self.user,
+            people_count=4,
+            reservation_date=booking_date,
+            reservation_time=time(19, 30),
+        )
+        self.assertEqual(first.table_id, 301)
+        self.assertEqual(second.table_id, 303)
+        self.assertIsNone(third)
+
+    def test_book_table_other_date_reuses_table(self):
+        first = self.service.book_table(
+            user=self.user,
+            people_count=4,
+            reservation_date=date.today() + timedelta(days=1),
+            reservation_time=time(19, 0),
+        )
+        second = self.service.book_table(
+            user=self.user,
+            people_count=4,
+            reservation_date=date.today() + timedelta(days=2),
+            reservation_time=time(19, 0),
+        )
+        self.assertEqual(first.table_id, 301)
+        self.assertEqual(second.table_id, 301)
+
+    def test_cancel_reservation_frees_slot(self):
+        booking_date = date.today() + timedelta(days=1)
+        booking = self.service.book_table(
+            user=self.user,
+            people_count=4,
+            reservation_date=booking_date,
+            reservation_time=time(19, 0),
+        )
+        result = self.service.cancel_reservation(
+            reservation_id=booking.reservation_id, user=self.user
+        )
+        self.assertTrue(result["success"])
+        rebooked = self.service.book_table(
+            user=self.user,
+            people_count=4,
+            reservation_date=booking_date,
+            reservation_time=time(19, 0),
+        )
+        self.assertEqual(rebooked.table_id, 301)
+
+    def test_book_table_skips_table_booked_meanwhile(self):
+        Table.objects.create(
+            table_number=303,
+            seats=4,
+            price_per_seat=12.00,
+            is_available=True,
+        )
+        booking_date = date.today() + timedelta(days=1)
+        self.service.book_table(
+            user=self.user,
+            people_count=4,
+            reservation_date=booking_date,
+            reservation_time=time(19, 0),
+        )
+
+        # Both bookings saw the cheapest table free, as when they run at once
+        with patch.object(TableService, "get_occupied_table_ids", return_value=set()):
+            result = self.service.book_table(
+                user=self.user,
+                people_count=4,
+                reservation_date=booking_date,
+                reservation_time=time(19, 0),
+            )
+        self.assertEqual(result.table_id, 303)
+
+    def lock_table_days_held_by_others(self, table_ids):
+        # Days of these tables are locked by other bookings until waited for
+        lock_table_days = TableService.lock_table_days
+        calls = []
+
+        def lock(table_days, skip_locked=False):
+            table_days = list(table_days)
+            calls.append((table_days, skip_locked))
+            if skip_locked and {table_id for table_id, _ in table_days} & table_ids:
+                return {}
+            return lock_table_days(table_days, skip_locked)
+
+        return patch.object(TableService, "lock_table_days", side_effect=lock), calls
+
+    def test_book_table_skips_table_being_booked(self):
+        Table.objects.create(
+            table_number=303,
+            seats=4,
+            price_per_seat=12.00,
+            is_available=True,
+        )
+        locking, calls = self.lock_table_days_held_by_others({self.table.pk})
+        with locking:
+            result = self.service.book_table(
+                user=self.user,
+                people_count=4,
+                reservation_date=date.today() + timedelta(days=1),
+                reservation_time=time(19, 0),
+            )
+        self.assertEqual(result.table_id, 303)
+        self.assertTrue(all(skip_locked for _, skip_locked in calls))
+
+    def test_book_table_waits_when_every_table_is_being_booked(self):
+        booking_date = date.today() + timedelta(days=1)
+        locking, calls = self.lock_table_days_held_by_others({self.table.pk})
+        with locking:
+            result = self.service.book_table(
+                user=self.user,
+                people_count=4,
+                reservation_date=booking_date,
+                reservation_time=time(19, 0),
+            )
+        self.assertEqual(result.table_id, 301)
+        self.assertEqual(
+            calls,
+            [
+                ([(self.table.pk, booking_date)], True),
+                ([(self.table.pk, booking_date)], False),
+            ],
+        )
+
+    def test_book_large_party_waits_for_tables_being_booked(self):
+        table = Table.objects.create(
+            table_number=302,
+            seats=6,
+            price_per_seat=8.00,
+            is_available=True,
+        )
+        booking_date = date.today() + timedelta(days=1)
+        locking, calls = self.lock_table_days_held_by_others({table.pk})
+        with locking:
+            result = self.service.book_table(
+                user=self.user,
+                people_count=9,
+                reservation_date=booking_date,
+                reservation_time=time(19, 0),
+            )
+        self.assertEqual(
+            sorted(item.table_id for item in result.reservations), [301, 302]
+        )
+        table_days = sorted([(self.table.pk, booking_date), (table.pk, booking_date)])
+        self.assertEqual(
+            [(sorted(days), skip_locked) for days, skip_locked in calls],
+            [(table_days, True), (table_days, False)],
+        )
+
+    @override_settings(TRACING_SAMPLE_RATE=1)
+    def test_traces(self):
+        with self.assertLogs("core.common.tracing") as logs:
+            self.service.book_table(
+                user=self.user,
+                people_count=4,
+                reservation_date=date.today() + timedelta(days=1),
+                reservation_time=time(19, 0),
+            )
+            self.service.cancel_reservation(self.reservation.id, self.user)
+
+        book, cancel = [json.loads(output.split(":", 2)[2]) for output in logs.output]
+        self.assertEqual(book["name"], "ReservationService.book_table")
+        allocate = book["children"][0]
+        self.assertEqual(allocate["name"], "TableService.allocate")
+        self.assertEqual(
+            [child["name"] for child in allocate["children"]],
+            [
+                "TableService.get_occupied_table_ids",
+                "TableService.lock_table_days",
+                "TableService.reclaim_expired_slots",
+                "TableService.occupy_slots",
+            ],
+        )
+        self.assertGreaterEqual(book["duration_ms"], allocate["duration_ms"])
+
+        self.assertEqual(cancel["name"], "ReservationService.cancel_reservation")
+        self.assertEqual(
+            [child["name"] for child in cancel["children"]],
+            ["ReservationRepository.get_by_id", "TableService.release_slots"],
+        )
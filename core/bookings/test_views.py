@@ -1,11 +1,33 @@
-from django.test import TestCase
+import sys
+import time as timer
+from functools import partial
+from io import StringIO
+from unittest.mock import patch
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 from rest_framework import status
-from datetime import date, timedelta
-from core.bookings.models import Reservation
-from core.tables.models import Table
+from datetime import date, time, timedelta
+from core.bookings.api.serializers import (
+    BookingResponseSerializer,
+    ReservationRowSerializer,
+    ReservationSerializer,
+)
+from core.bookings.api.views import UserReservationsListAPIView
+from core.bookings.admin import ReservationAdmin
+from core.bookings.models import BookingHold, Reservation
+from core.bookings.repositories import ReservationRepository
+from core.common.testing import benchmark
+from core.common.pagination import EstimatedCountPaginator
+from core.tables.models import Table, TableOccupancy, TableSlotBitmap
+from core.tables.services import TableService
 
 User = get_user_model()
 
@@ -35,6 +57,7 @@ class BookingAPITest(TestCase):
             total_cost=40.00,
             status="confirmed",
             reservation_date=date.today(),
+            reservation_time=time(19, 0),
         )
 
         self.client = APIClient()
@@ -61,21 +84,79 @@ class BookingAPITest(TestCase):
         data = {
             "people_count": 6,
             "reservation_date": tomorrow.isoformat(),
+            "reservation_time": "19:00",
+        }
+        # Trusted service output is serialized without validating it again
+        with patch.object(
+            BookingResponseSerializer, "is_valid", side_effect=AssertionError
+        ):
+            response = self.client.post(self.book_url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        reservation = Reservation.objects.get(table__table_number=102)
+        self.assertEqual(
+            response.json(),
+            {
+                "reservation_id": reservation.pk,
+                "table_id": 102,
+                "seats_reserved": 6,
+                "total_cost": "75.00",
+                "reservation_date": tomorrow.isoformat(),
+                "reservation_time": "19:00:00",
+            },
+        )
+
+    def test_book_table_queries(self):
+        data = {
+            "people_count": 4,
+            "reservation_date": (date.today() + timedelta(days=1)).isoformat(),
+            "reservation_time": "19:00",
+        }
+        # Warm the allocation index
+        self.client.post(self.book_url, {**data, "reservation_time": "12:00"})
+
+        # PostgreSQL's exclusion constraint replaces the overlap check. The
+        # day bitmap locked for the booking is updated without reading it again
+        with self.assertNumQueries(10 if connection.vendor == "postgresql" else 11):
+            response = self.client.post(self.book_url, data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_book_large_party_across_tables(self):
+        Table.objects.create(table_number=102, seats=6, price_per_seat=8.00)
+        Table.objects.create(table_number=103, seats=4, price_per_seat=12.00)
+        data = {
+            "people_count": 9,
+            "reservation_date": (date.today() + timedelta(days=1)).isoformat(),
+            "reservation_time": "19:00",
         }
         response = self.client.post(self.book_url, data, format="json")
+
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
-        self.assertIn("reservation_id", response.data)
-        self.assertIn("table_id", response.data)
-        self.assertIn("seats_reserved", response.data)
-        self.assertIn("total_cost", response.data)
+        self.assertEqual(response.data["seats_reserved"], 10)
+        self.assertEqual(response.data["total_cost"], "70.00")
+        self.assertEqual(
+            [item["table_id"] for item in response.data["reservations"]], [101, 102]
+        )
+        self.assertEqual(Reservation.objects.filter(status="confirmed").count(), 3)
 
     def test_book_table_invalid_data(self):
         data = {
             "people_count": -1,
             "reservation_date": date.today().isoformat(),
+            "reservation_time": "19:00",
+        }
+        response = self.client.post(self.book_url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_book_table_past_midnight(self):
+        data = {
+            "people_count": 4,
+            "reservation_date": (date.today() + timedelta(days=1)).isoformat(),
+            "reservation_time": "23:00",
         }
         response = self.client.post(self.book_url, data, format="json")
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("reservation_time", response.data)
+        self.assertFalse(Reservation.objects.filter(reservation_time="23:00").exists())
 
     def test_cancel_reservation_success(self):
         data = {"reservation_id": self.reservation.id}
@@ -85,6 +166,29 @@ class BookingAPITest(TestCase):
         self.reservation.refresh_from_db()
         self.assertEqual(self.reservation.status, "cancelled")
 
+    def test_cancel_reservation_queries(self):
+        result = Reservation.create_reservation(
+            self.user, 4, date.today() + timedelta(days=1), time(19, 0)
+        )
+        # The reservation is selected once, for validating and cancelling,
+        # then updated, its slots deleted and the day bitmap locked and
+        # updated. The bitmap is binary, so it can't be cleared in the UPDATE
+        # itself, which keeps the cancellation above three queries.
+        with self.assertNumQueries(5), CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                self.cancel_url, {"reservation_id": result.reservation_id}
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sum(
+                query["sql"].startswith("SELECT")
+                and "bookings_reservation" in query["sql"]
+                for query in queries
+            ),
+            1,
+        )
+        self.assertFalse(any("users_user" in query["sql"] for query in queries))
+
     def test_cancel_nonexistent_reservation(self):
         data = {"reservation_id": 999}
         response = self.client.post(self.cancel_url, data, format="json")
@@ -100,3 +204,821 @@ class BookingAPITest(TestCase):
         self.assertEqual(
             reservations_response.status_code, status.HTTP_401_UNAUTHORIZED
         )
+
+
+class BookingHoldAPITest(TestCase):
+    def setUp(self):
+        Table.objects.all().delete()
+        self.user = User.objects.create_user(
+            email="hold@test.com",
+            password="testpassword",
+            username="hold",
+        )
+        self.table = Table.objects.create(
+            table_number=101,
+            seats=4,
+            price_per_seat=10.00,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        self.hold_url = reverse("bookings:hold_table")
+        self.confirm_url = reverse("bookings:confirm_hold")
+        self.book_url = reverse("bookings:book_table")
+        self.booking = {
+            "people_count": 4,
+            "reservation_date": (date.today() + timedelta(days=1)).isoformat(),
+            "reservation_time": "19:00",
+        }
+
+    def expire_holds(self):
+        past = timezone.now() - timedelta(seconds=1)
+        BookingHold.objects.update(expires_at=past)
+        TableOccupancy.objects.filter(hold__isnull=False).update(expires_at=past)
+
+    def test_hold_and_confirm(self):
+        response = self.client.post(self.hold_url, self.booking, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["table_id"], 101)
+        self.assertIn("expires_at", response.data)
+
+        response = self.client.post(
+            self.confirm_url,
+            {"hold_token": response.data["hold_token"]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        reservation = Reservation.objects.get(id=response.data["reservation_id"])
+        self.assertEqual(reservation.status, "confirmed")
+        self.assertFalse(BookingHold.objects.exists())
+        self.assertEqual(
+            set(reservation.occupancies.values_list("expires_at", flat=True)), {None}
+        )
+
+    def test_hold_party_larger_than_any_table(self):
+        response = self.client.post(
+            self.hold_url, {**self.booking, "people_count": 6}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_held_table_cannot_be_booked(self):
+        self.client.post(self.hold_url, self.booking, format="json")
+        response = self.client.post(self.book_url, self.booking, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            [item["reservation_time"] for item in response.data["suggestions"]],
+            ["21:00:00", "21:30:00", "22:00:00"],
+        )
+
+    def test_expired_hold_is_reclaimed(self):
+        self.client.post(self.hold_url, self.booking, format="json")
+        self.expire_holds()
+        response = self.client.post(self.book_url, self.booking, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_confirm_expired_hold(self):
+        response = self.client.post(self.hold_url, self.booking, format="json")
+        self.expire_holds()
+        response = self.client.post(
+            self.confirm_url,
+            {"hold_token": response.data["hold_token"]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(BookingHold.objects.exists())
+
+    def test_confirm_hold_expiring_while_waiting_for_lock(self):
+        response = self.client.post(self.hold_url, self.booking, format="json")
+        lock_table_days = TableService.lock_table_days
+
+        def expire_then_lock(table_days, skip_locked=False):
+            # The hold expires and another booking reclaims its slots first
+            self.expire_holds()
+            TableOccupancy.objects.filter(expires_at__lte=timezone.now()).delete()
+            return lock_table_days(table_days, skip_locked)
+
+        with patch.object(
+            TableService, "lock_table_days", side_effect=expire_then_lock
+        ):
+            response = self.client.post(
+                self.confirm_url,
+                {"hold_token": response.data["hold_token"]},
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Reservation.objects.exists())
+
+    def test_confirm_hold_without_its_slots(self):
+        response = self.client.post(self.hold_url, self.booking, format="json")
+        TableOccupancy.objects.filter(hold__isnull=False).delete()
+        response = self.client.post(
+            self.confirm_url,
+            {"hold_token": response.data["hold_token"]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Reservation.objects.exists())
+        self.assertFalse(TableSlotBitmap.objects.exclude(bitmap=b"").exists())
+
+    def test_confirm_other_users_hold(self):
+        response = self.client.post(self.hold_url, self.booking, format="json")
+        other = User.objects.create_user(
+            email="other@test.com", password="testpassword", username="other"
+        )
+        self.client.force_authenticate(user=other)
+        response = self.client.post(
+            self.confirm_url,
+            {"hold_token": response.data["hold_token"]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_hold_seconds_limit(self):
+        data = dict(self.booking, hold_seconds=settings.BOOKING_HOLD_MAX_SECONDS + 1)
+        response = self.client.post(self.hold_url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_expire_holds_command(self):
+        self.client.post(self.hold_url, self.booking, format="json")
+        self.client.post(
+            self.hold_url,
+            dict(self.booking, reservation_time="22:00"),
+            format="json",
+        )
+        BookingHold.objects.filter(reservation_time="19:00").update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        out = StringIO()
+        call_command("expire_holds", stdout=out)
+        self.assertIn("Deleted 1 expired holds", out.getvalue())
+        self.assertEqual(BookingHold.objects.count(), 1)
+        self.assertEqual(TableOccupancy.objects.count(), 4)
+
+
+class BatchBookingAPITest(TestCase):
+    def setUp(self):
+        Table.objects.all().delete()
+        self.user = User.objects.create_user(
+            email="batch@test.com",
+            password="testpassword",
+            username="batch",
+        )
+        for table_number in (101, 102, 103):
+            Table.objects.create(
+                table_number=table_number,
+                seats=4,
+                price_per_seat=10.00 + table_number % 100,
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("bookings:book_tables")
+        self.reservation_date = date.today() + timedelta(days=1)
+
+    def booking(self, days=0, reservation_time="19:00", people_count=4):
+        return {
+            "people_count": people_count,
+            "reservation_date": (
+                self.reservation_date + timedelta(days=days)
+            ).isoformat(),
+            "reservation_time": reservation_time,
+        }
+
+    def test_batch_booking_per_item_results(self):
+        bookings = [self.booking() for _ in range(4)]
+        bookings.insert(1, self.booking(people_count=-1))
+        response = self.client.post(self.url, {"bookings": bookings}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        results = response.data["results"]
+        self.assertEqual(
+            [result["success"] for result in results],
+            [True, False, True, True, False],
+        )
+        self.assertIn("people_count", results[1]["errors"])
+        self.assertEqual(results[4]["error"], "No table available")
+        self.assertEqual(
+            [results[index]["table_id"] for index in (0, 2, 3)], [101, 102, 103]
+        )
+        self.assertEqual(Reservation.objects.count(), 3)
+        self.assertEqual(TableOccupancy.objects.count(), 12)
+
+    def test_batch_booking_reuses_tables_across_slots(self):
+        bookings = [
+            self.booking(),
+            self.booking(reservation_time="21:00"),
+            self.booking(days=1),
+        ]
+        response = self.client.post(self.url, {"bookings": bookings}, format="json")
+        self.assertEqual(
+            [result["table_id"] for result in response.data["results"]],
+            [101, 101, 101],
+        )
+
+    def test_batch_booking_respects_existing_bookings(self):
+        self.client.post(reverse("bookings:book_table"), self.booking(), format="json")
+        response = self.client.post(
+            self.url, {"bookings": [self.booking()]}, format="json"
+        )
+        self.assertEqual(response.data["results"][0]["table_id"], 102)
+
+    def test_batch_booking_sees_bookings_made_while_waiting(self):
+        other_user = User.objects.create_user(
+            email="other@test.com", password="testpassword", username="other"
+        )
+        lock_table_days = TableService.lock_table_days
+        interleaved = []
+
+        def book_then_lock(table_days, skip_locked=False):
+            # Another booking takes the cheapest table while the batch waits
+            # for its locks
+            if not interleaved:
+                interleaved.append(None)
+                interleaved[0] = Reservation.create_reservation(
+                    other_user, 4, self.reservation_date, time(19, 0)
+                )
+            return lock_table_days(table_days, skip_locked)
+
+        with patch.object(TableService, "lock_table_days", side_effect=book_then_lock):
+            response = self.client.post(
+                self.url, {"bookings": [self.booking()]}, format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(interleaved[0].table_id, 101)
+        self.assertEqual(response.data["results"][0]["table_id"], 102)
+        self.assertEqual(Reservation.objects.count(), 2)
+
+    def test_batch_booking_locks_only_the_tables_picked(self):
+        other_user = User.objects.create_user(
+            email="other@test.com", password="testpassword", username="other"
+        )
+        table_ids = dict(Table.objects.values_list("table_number", "pk"))
+        lock_table_days = TableService.lock_table_days
+        calls = []
+
+        def lock(table_days, skip_locked=False):
+            table_days = set(table_days)
+            calls.append((table_days, skip_locked))
+            if len(calls) == 1:
+                # Another booking takes the cheapest table before the lock
+                reservation = Reservation.objects.create(
+                    user=other_user,
+                    table_id=table_ids[101],
+                    seats_reserved=4,
+                    total_cost=33.00,
+                    reservation_date=self.reservation_date,
+                    reservation_time=time(19, 0),
+                    status="confirmed",
+                )
+                TableService().occupy_slots(
+                    reservation.table,
+                    reservation,
+                    self.reservation_date,
+                    reservation.reservation_time,
+                )
+            elif (table_ids[102], self.reservation_date) in table_days:
+                # and another one holds the next table's day
+                return {}
+            return lock_table_days(table_days, skip_locked)
+
+        with patch.object(TableService, "lock_table_days", side_effect=lock):
+            response = self.client.post(
+                self.url, {"bookings": [self.booking()]}, format="json"
+            )
+        self.assertEqual(response.data["results"][0]["table_id"], 103)
+        self.assertEqual(
+            calls,
+            [
+                ({(table_ids[table_number], self.reservation_date)}, skip_locked)
+                for table_number, skip_locked in (
+                    (101, False),
+                    (102, True),
+                    (103, True),
+                )
+            ],
+        )
+
+    def test_batch_booking_query_count_is_constant(self):
+        self.client.post(self.url, {"bookings": [self.booking()]}, format="json")
+        for size in (5, 20):
+            bookings = [self.booking(days=day + 1) for day in range(size)]
+            with self.assertNumQueries(10):
+                response = self.client.post(
+                    self.url, {"bookings": bookings}, format="json"
+                )
+            self.assertTrue(
+                all(result["success"] for result in response.data["results"])
+            )
+
+    def test_batch_booking_size_limit(self):
+        bookings = [self.booking()] * (settings.BOOKING_BATCH_MAX_SIZE + 1)
+        response = self.client.post(self.url, {"bookings": bookings}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        with override_settings(BOOKING_BATCH_MAX_SIZE=2):
+            response = self.client.post(
+                self.url, {"bookings": [self.booking()] * 3}, format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("bookings", response.data)
+
+
+class QuoteAPITest(TestCase):
+    def setUp(self):
+        Table.objects.all().delete()
+        self.user = User.objects.create_user(
+            email="quote@test.com",
+            password="testpassword",
+            username="quote",
+        )
+        self.table1 = Table.objects.create(
+            table_number=101, seats=4, price_per_seat=10.00
+        )
+        self.table2 = Table.objects.create(
+            table_number=102, seats=6, price_per_seat=8.00
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("bookings:quote")
+
+    def test_quotes(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(quote["table_id"], quote["price"]) for quote in response.data["quotes"]],
+            [
+                (102, "16.00"),
+                (102, "16.00"),
+                (101, "30.00"),
+                (101, "30.00"),
+                (102, "40.00"),
+                (102, "40.00"),
+            ],
+        )
+        self.assertEqual(
+            response.data["tables"][0]["prices"],
+            ["20.00", "20.00", "30.00", "30.00", None, None],
+        )
+
+    def test_quotes_skip_occupied_tables(self):
+        reservation_date = date.today() + timedelta(days=1)
+        self.client.post(
+            reverse("bookings:book_table"),
+            {
+                "people_count": 6,
+                "reservation_date": reservation_date.isoformat(),
+                "reservation_time": "19:00",
+            },
+            format="json",
+        )
+        response = self.client.get(
+            self.url,
+            {
+                "reservation_date": reservation_date.isoformat(),
+                "reservation_time": "20:00",
+            },
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [table["table_id"] for table in response.data["tables"]], [101]
+        )
+        self.assertIsNone(response.data["quotes"][5]["table_id"])
+
+    def test_quotes_need_date_and_time(self):
+        response = self.client.get(
+            self.url, {"reservation_date": date.today().isoformat()}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AvailabilityAPITest(TestCase):
+    def setUp(self):
+        Table.objects.all().delete()
+        self.user = User.objects.create_user(
+            email="availability@test.com",
+            password="testpassword",
+            username="availability",
+        )
+        Table.objects.create(table_number=101, seats=6, price_per_seat=10.00)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("bookings:availability")
+        self.start_date = date.today() + timedelta(days=1)
+
+    def test_availability_skips_booked_slots(self):
+        self.client.post(
+            reverse("bookings:book_table"),
+            {
+                "people_count": 6,
+                "reservation_date": self.start_date.isoformat(),
+                "reservation_time": "19:00",
+            },
+            format="json",
+        )
+        response = self.client.get(
+            self.url,
+            {
+                "people_count": 6,
+                "start_date": self.start_date.isoformat(),
+                "end_date": (self.start_date + timedelta(days=2)).isoformat(),
+                "start_time": "18:00",
+                "end_time": "21:00",
+            },
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        slots = [
+            (item["reservation_date"], item["reservation_time"])
+            for item in response.data["slots"]
+        ]
+        self.assertEqual(len(slots), 1 + 7 + 7)
+        self.assertIn((self.start_date.isoformat(), "21:00:00"), slots)
+        self.assertNotIn((self.start_date.isoformat(), "18:00:00"), slots)
+        self.assertEqual(response.data["slots"][0]["price"], "50.00")
+
+    def test_availability_range_limit(self):
+        response = self.client.get(
+            self.url,
+            {
+                "people_count": 2,
+                "start_date": self.start_date.isoformat(),
+                "end_date": (
+                    self.start_date + timedelta(days=settings.BOOKING_SEARCH_MAX_DAYS)
+                ).isoformat(),
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ReservationListAPITest(TestCase):
+    def setUp(self):
+        Table.objects.all().delete()
+        self.user = User.objects.create_user(
+            email="list@test.com",
+            password="testpassword",
+            username="list",
+        )
+        tables = [
+            Table.objects.create(table_number=number, seats=4, price_per_seat=10.00)
+            for number in (101, 102, 103)
+        ]
+        # Several reservations share a date and time, on different tables
+        Reservation.objects.bulk_create(
+            Reservation(
+                user=self.user,
+                table=tables[index % 3],
+                seats_reserved=4,
+                total_cost=30.00,
+                status="confirmed",
+                reservation_date=date(2030, 1, 1) + timedelta(days=index // 6),
+                reservation_time=time(12 + index // 3 % 2 * 7, 0),
+            )
+            for index in range(25)
+        )
+        self.expected = list(
+            Reservation.objects.order_by(
+                "-reservation_date", "-reservation_time", "-id"
+            ).values_list("id", flat=True)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("bookings:user_reservations")
+
+    def test_lists_the_view_queryset(self):
+        get_queryset = UserReservationsListAPIView.get_queryset
+
+        def lunch_only(view):
+            return get_queryset(view).filter(reservation_time=time(12, 0))
+
+        with patch.object(UserReservationsListAPIView, "get_queryset", lunch_only):
+            response = self.client.get(self.url, {"page_size": 100})
+        lunch = Reservation.objects.filter(user=self.user, reservation_time=time(12, 0))
+        self.assertEqual(
+            {item["id"] for item in response.data["results"]},
+            set(lunch.values_list("id", flat=True)),
+        )
+
+    def test_pages_follow_the_ordering(self):
+        ids = []
+        pages = []
+        url = f"{self.url}?page_size=4"
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append([item["id"] for item in response.data["results"]])
+            ids.extend(pages[-1])
+            url = response.data["next"]
+        self.assertEqual(ids, self.expected)
+        self.assertEqual(len(pages), 7)
+
+        # And back again from the last page
+        url = response.data["previous"]
+        for page in reversed(pages[:-1]):
+            response = self.client.get(url)
+            self.assertEqual([item["id"] for item in response.data["results"]], page)
+            url = response.data["previous"]
+        self.assertIsNone(url)
+
+    def test_expand_table(self):
+        for page_size in (5, 25):
+            with self.assertNumQueries(1):
+                response = self.client.get(
+                    self.url, {"expand": "table", "page_size": page_size}
+                )
+            self.assertEqual(len(response.data["results"]), page_size)
+        table = Table.objects.get(pk=response.data["results"][0]["table"]["id"])
+        self.assertEqual(
+            response.data["results"][0]["table"],
+            {
+                "id": table.pk,
+                "table_number": table.table_number,
+                "seats": 4,
+                "price_per_seat": "10.00",
+            },
+        )
+
+        response = self.client.get(self.url)
+        self.assertIsInstance(response.data["results"][0]["table"], int)
+
+    def test_sparse_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                self.url, {"fields": "reservation_date,reservation_time,status"}
+            )
+        self.assertEqual(
+            set(response.data["results"][0]),
+            {"reservation_date", "reservation_time", "status"},
+        )
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("total_cost", queries[0]["sql"])
+        self.assertNotIn("updated_at", queries[0]["sql"])
+
+        # Paging still works on the columns the list is ordered by
+        response = self.client.get(response.data["next"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_sparse_fields_with_expanded_table(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                self.url, {"fields": "id,table", "expand": "table"}
+            )
+        self.assertEqual(
+            set(response.data["results"][0]["table"]),
+            {"id", "table_number", "seats", "price_per_seat"},
+        )
+
+    def test_unknown_fields(self):
+        response = self.client.get(self.url, {"fields": "status,user"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {"cursor": "bm90LWEtY3Vyc29y"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ReservationRowSerializerTest(TestCase):
+    def setUp(self):
+        Table.objects.all().delete()
+        self.user = User.objects.create_user(
+            email="rows@test.com",
+            password="testpassword",
+            username="rows",
+        )
+        tables = Table.objects.bulk_create(
+            Table(table_number=number, seats=6, price_per_seat="12.50")
+            for number in range(101, 111)
+        )
+        Reservation.objects.bulk_create(
+            Reservation(
+                user=self.user,
+                table=tables[index % len(tables)],
+                seats_reserved=2 + index % 5,
+                total_cost=f"{25 + index * 12.5:.2f}",
+                status="cancelled" if index % 3 == 0 else "confirmed",
+                reservation_date=date(2030, 1, 1)
+                + timedelta(days=index // len(tables)),
+                reservation_time=time(12, 30),
+            )
+            for index in range(100)
+        )
+        self.repository = ReservationRepository()
+
+    def serialize(self, fields=None, expand=frozenset()):
+        rows = ReservationRowSerializer(fields=fields, expand=expand)
+        queryset = self.repository.get_user_reservations(self.user.id).order_by("id")
+        expected = ReservationSerializer(
+            queryset, many=True, context={"fields": fields, "expand": expand}
+        ).data
+        data = rows.serialize(
+            self.repository.get_user_reservation_rows(
+                self.user.id, rows.columns
+            ).order_by("id")
+        )
+        return data, expected
+
+    def test_parity_with_reservation_serializer(self):
+        for fields in (None, {"id", "table"}, {"total_cost", "created_at", "status"}):
+            for expand in (frozenset(), {"table"}):
+                with self.subTest(fields=fields, expand=expand):
+                    data, expected = self.serialize(fields, expand)
+                    self.assertEqual(data, expected)
+                    # Same keys in the same order, for the same JSON
+                    self.assertEqual(
+                        JSONRenderer().render(data), JSONRenderer().render(expected)
+                    )
+
+    @benchmark
+    def test_benchmark_serialization(self):
+        expand = {"table"}
+        queryset = self.repository.get_user_reservations(self.user.id)
+        reservations = list(queryset.select_related("table"))
+        rows = ReservationRowSerializer(expand=expand)
+        values = list(queryset.values_list(*rows.columns, named=True))
+
+        def best_of(serialize, runs=50):
+            timings = []
+            for _ in range(runs):
+                started = timer.perf_counter()
+                serialize()
+                timings.append(timer.perf_counter() - started)
+            return min(timings)
+
+        drf = best_of(
+            lambda: ReservationSerializer(
+                reservations, many=True, context={"expand": expand}
+            ).data
+        )
+        fast = best_of(lambda: rows.serialize(values))
+
+        sys.stderr.write(
+            f"\nSerializing {len(values)} reservations: "
+            f"ReservationSerializer {drf * 1000:.2f} ms, "
+            f"ReservationRowSerializer {fast * 1000:.2f} ms ({drf / fast:.0f}x)"
+        )
+        self.assertGreaterEqual(drf / fast, 5)
+
+
+class ReservationFilterAPITest(TestCase):
+    def setUp(self):
+        Table.objects.all().delete()
+        self.tables = Table.objects.bulk_create(
+            Table(table_number=number, seats=4, price_per_seat=10.00)
+            for number in range(101, 111)
+        )
+        self.user = User.objects.create_user(
+            email="filter@test.com",
+            password="testpassword",
+            username="filter",
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("bookings:user_reservations")
+        self.reservation_count = 0
+
+    def create_reservations(self, user, count, first_date):
+        # Every reservation gets its own table and day, so none overlap
+        Reservation.objects.bulk_create(
+            Reservation(
+                user=user,
+                table=self.tables[index % len(self.tables)],
+                seats_reserved=4,
+                total_cost=30.00,
+                status="cancelled" if index % 4 == 0 else "confirmed",
+                reservation_date=first_date
+                + timedelta(days=(self.reservation_count + index) // len(self.tables)),
+                reservation_time=time(19, 0),
+            )
+            for index in range(count)
+        )
+        self.reservation_count += count
+
+    def get_ids(self, params):
+        response = self.client.get(self.url, {**params, "page_size": 100})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {item["id"] for item in response.data["results"]}
+
+    def test_filters(self):
+        today = date.today()
+        self.create_reservations(self.user, 40, today - timedelta(days=2))
+        reservations = Reservation.objects.filter(user=self.user)
+
+        self.assertEqual(
+            self.get_ids({"status": "cancelled"}),
+            set(reservations.filter(status="cancelled").values_list("id", flat=True)),
+        )
+        self.assertEqual(
+            self.get_ids({"date_from": today.isoformat(), "status": "confirmed"}),
+            set(
+                reservations.filter(
+                    reservation_date__gte=today, status="confirmed"
+                ).values_list("id", flat=True)
+            ),
+        )
+        upcoming = self.get_ids({"when": "upcoming"})
+        past = self.get_ids({"when": "past"})
+        self.assertFalse(upcoming & past)
+        self.assertEqual(len(upcoming | past), 40)
+        self.assertLessEqual(
+            set(
+                reservations.filter(reservation_date__lt=today).values_list(
+                    "id", flat=True
+                )
+            ),
+            past,
+        )
+
+    def test_invalid_filter(self):
+        response = self.client.get(self.url, {"status": "unknown"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_queries_independent_of_history_size(self):
+        first_date = date(2020, 1, 1)
+        filters = (
+            {"status": "confirmed"},
+            {"date_from": "2020-02-01", "date_to": "2020-03-01"},
+            {"when": "upcoming"},
+            {"when": "past", "status": "cancelled"},
+        )
+        query_counts = {}
+        for history in (100, 5000):
+            user = User.objects.create_user(
+                email=f"history{history}@test.com", username=f"history{history}"
+            )
+            self.create_reservations(user, history, first_date)
+            self.client.force_authenticate(user=user)
+            for params in filters:
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                query_counts[(history, tuple(params.items()))] = len(queries)
+
+        for params in filters:
+            self.assertEqual(
+                query_counts[(5000, tuple(params.items()))],
+                query_counts[(100, tuple(params.items()))],
+            )
+
+
+# The admin pages link static files, which are not collected for the tests
+@override_settings(
+    STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage"
+)
+class ReservationAdminTest(TestCase):
+    def setUp(self):
+        Table.objects.all().delete()
+        self.admin = User.objects.create_superuser(
+            email="admin@test.com", password="testpassword", username="admin"
+        )
+        table = Table.objects.create(table_number=101, seats=4, price_per_seat=10.00)
+        Reservation.objects.bulk_create(
+            Reservation(
+                user=self.admin,
+                table=table,
+                seats_reserved=4,
+                total_cost=30.00,
+                status="confirmed",
+                reservation_date=date(2030, 1, 1) + timedelta(days=day),
+                reservation_time=time(19, 0),
+            )
+            for day in range(150)
+        )
+        self.client.force_login(self.admin)
+        self.url = reverse("admin:bookings_reservation_changelist")
+
+    def test_changelist_counts_small_tables_exactly(self):
+        with patch.object(EstimatedCountPaginator, "estimate_count", return_value=100):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        changelist = response.context["cl"]
+        self.assertIsInstance(changelist.paginator, EstimatedCountPaginator)
+        self.assertFalse(changelist.paginator.is_estimate)
+        self.assertEqual(changelist.result_count, 150)
+
+    def test_changelist_estimates_large_tables(self):
+        with patch.object(
+            EstimatedCountPaginator, "estimate_count", return_value=2_000_000
+        ), patch.object(connection, "vendor", "postgresql"):
+            response = self.client.get(self.url, {"p": 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        changelist = response.context["cl"]
+        self.assertTrue(changelist.paginator.is_estimate)
+        self.assertEqual(changelist.result_count, 2_000_000)
+        self.assertEqual(len(changelist.result_list), 50)
+
+    @skipUnlessDBFeature("supports_explaining_query_execution")
+    def test_changelist_estimates_from_planner_statistics(self):
+        if connection.vendor != "postgresql":
+            self.skipTest("Estimates come from PostgreSQL statistics")
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Reservation._meta.db_table}")
+        paginator = partial(EstimatedCountPaginator, exact_count_threshold=100)
+        with patch.object(ReservationAdmin, "paginator", paginator):
+            for params in ({}, {"status__exact": "confirmed"}):
+                response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                changelist = response.context["cl"]
+                self.assertTrue(changelist.paginator.is_estimate)
+                self.assertAlmostEqual(changelist.result_count, 150, delta=30)
@@ -0,0 +1,203 @@
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Tuple
+
+from django.conf import settings
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Metric(NamedTuple):
+    """A counter or a histogram, with the upper bounds of its buckets."""
+
+    name: str
+    kind: str
+    documentation: str
+    buckets: Tuple[float, ...] = ()
+
+
+REQUEST_DURATION = Metric(
+    "http_request_duration_seconds",
+    "histogram",
+    "Time taken to answer requests, by view.",
+    (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+REQUEST_QUERIES = Metric(
+    "http_request_db_queries",
+    "histogram",
+    "SQL queries run per request, by view.",
+    (0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+REQUEST_QUERY_SECONDS = Metric(
+    "http_request_db_query_seconds_total",
+    "counter",
+    "Time spent running SQL queries, by view.",
+)
+
+
+class QueryTimer:
+    """
+    Database execute wrapper counting the queries run and the time they take.
+
+    See ``connection.execute_wrapper``.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(
+        self,
+        execute: Callable[..., Any],
+        sql: str,
+        params: Any,
+        many: bool,
+        context: Dict[str, Any],
+    ) -> Any:
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Metrics of this process, in the Prometheus text format.
+
+    With ``settings.METRICS_DIR``, every process writes its metrics to a
+    file of its own there, at most every ``flush_seconds``, and ``collect``
+    adds up the files of all processes, so a scrape hitting any gunicorn
+    worker sees the whole server. Files are named after the process id;
+    empty the directory when the server is restarted.
+    """
+
+    def __init__(self, metrics: Iterable[Metric], flush_seconds: float = 1.0) -> None:
+        self.metrics = {metric.name: metric for metric in metrics}
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, Labels], List[float]] = {}
+        self._last_flush = 0.0
+
+    def observe(self, metric: Metric, labels: Labels, value: float) -> None:
+        """
+        Add a value to a counter, or an observation to a histogram.
+        """
+        key = (metric.name, labels)
+        with self._lock:
+            values = self._values.get(key)
+            if values is None:
+                # A histogram keeps the count of each bucket, then sum and count
+                size = len(metric.buckets) + 3 if metric.kind == "histogram" else 1
+                values = self._values[key] = [0.0] * size
+            if metric.kind == "histogram":
+                values[bisect_left(metric.buckets, value)] += 1
+                values[-2] += value
+                values[-1] += 1
+            else:
+                values[0] += value
+
+    def snapshot(self) -> Dict[str, List[float]]:
+        """
+        Get the metrics of this process, keyed by name and labels as JSON.
+        """
+        with self._lock:
+            return {
+                json.dumps([name, labels]): list(values)
+                for (name, labels), values in self._values.items()
+            }
+
+    def flush(self, force: bool = False) -> None:
+        """
+        Write the metrics of this process to METRICS_DIR, if it is set.
+        """
+        directory = settings.METRICS_DIR
+        now = time.monotonic()
+        if not directory or (not force and now - self._last_flush < self.flush_seconds):
+            return
+        self._last_flush = now
+
+        path = os.path.join(directory, f"{os.getpid()}.json")
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as file:
+            json.dump(self.snapshot(), file)
+        os.replace(temporary, path)
+
+    def collect(self) -> Dict[Tuple[str, Labels], List[float]]:
+        """
+        Get the metrics of every process, added up.
+        """
+        directory = settings.METRICS_DIR
+        if not directory:
+            snapshots = [self.snapshot()]
+        else:
+            self.flush(force=True)
+            snapshots = []
+            for path in glob.glob(os.path.join(directory, "*.json")):
+                try:
+                    with open(path) as file:
+                        snapshots.append(json.load(file))
+                except (OSError, ValueError):
+                    continue
+
+        collected: Dict[Tuple[str, Labels], List[float]] = {}
+        for snapshot in snapshots:
+            for key, values in snapshot.items():
+                name, labels = json.loads(key)
+                if name not in self.metrics:
+                    continue
+                key = (name, tuple(tuple(label) for label in labels))
+                total = collected.setdefault(key, [0.0] * len(values))
+                for index, value in enumerate(values):
+                    total[index] += value
+        return collected
+
+    def render(self) -> str:
+        """
+        Render the metrics of every process in the Prometheus text format.
+        """
+        collected = self.collect()
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for (name, labels), values in sorted(collected.items()):
+                if name != metric.name:
+                    continue
+                if metric.kind != "histogram":
+                    lines.append(f"{name}{_format_labels(labels)} {_number(values[0])}")
+                    continue
+                cumulative = 0.0
+                for bound, count in zip((*metric.buckets, "+Inf"), values):
+                    cumulative += count
+                    bucket_labels = _format_labels((*labels, ("le", _number(bound))))
+                    lines.append(f"{name}_bucket{bucket_labels} {_number(cumulative)}")
+                lines.append(
+                    f"{name}_sum{_format_labels(labels)} {_number(values[-2])}"
+                )
+                lines.append(
+                    f"{name}_count{_format_labels(labels)} {_number(values[-1])}"
+                )
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _number(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+registry = MetricsRegistry([REQUEST_DURATION, REQUEST_QUERIES, REQUEST_QUERY_SECONDS])
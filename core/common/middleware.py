@@ -0,0 +1,88 @@
+import time
+from typing import Callable
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import HttpRequest, HttpResponse
+
+from core.common.metrics import (
+    REQUEST_DURATION,
+    REQUEST_QUERIES,
+    REQUEST_QUERY_SECONDS,
+    QueryTimer,
+    registry,
+)
+from core.common.profiling import PROFILE_HEADER, is_staff, profile_request
+from core.common.unit_of_work import unit_of_work
+
+# Anything else is recorded as "other", to keep the number of series bounded
+HTTP_METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+
+class MetricsMiddleware:
+    """
+    Record the latency and SQL queries of every request, by view.
+
+    Requests are labelled with the name of the URL pattern they matched
+    rather than their path. Left out of the middleware chain unless
+    METRICS_ENABLED is set, as nothing serves the metrics then. See
+    core.common.metrics.
+    """
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]) -> None:
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        queries = QueryTimer()
+        started = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        match = request.resolver_match
+        labels = (
+            ("view", match.view_name if match else "unmatched"),
+            ("method", request.method if request.method in HTTP_METHODS else "other"),
+        )
+        registry.observe(
+            REQUEST_DURATION, (*labels, ("status", str(response.status_code))), duration
+        )
+        registry.observe(REQUEST_QUERIES, labels, queries.count)
+        registry.observe(REQUEST_QUERY_SECONDS, labels, queries.duration)
+        registry.flush()
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Profile requests from staff users that send the X-Profile header.
+
+    Left out of the middleware chain unless PROFILING_ENABLED is set, and
+    other requests only pay for a header lookup. See core.common.profiling.
+    """
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]) -> None:
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if PROFILE_HEADER not in request.headers or not is_staff(request):
+            return self.get_response(request)
+        return profile_request(self.get_response, request)
+
+
+class UnitOfWorkMiddleware:
+    """
+    Run every request in its own unit of work (see core.common.unit_of_work).
+    """
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        with unit_of_work():
+            return self.get_response(request)
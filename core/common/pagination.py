@@ -1,6 +1,114 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import Model, Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, PageNumberPagination
+from rest_framework.request import Request
 from rest_framework.response import Response
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
+
+
+class EstimatedPage(Page):
+    """
+    Page of an estimated count, which knows whether rows follow it.
+    """
+
+    def __init__(
+        self, object_list: List[Any], number: int, paginator: Paginator
+    ) -> None:
+        self.has_more = len(object_list) > paginator.per_page
+        super().__init__(object_list[: paginator.per_page], number, paginator)
+
+    def has_next(self) -> bool:
+        return self.has_more
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that takes large counts from the PostgreSQL planner statistics.
+
+    A COUNT(*) reads every matching row. The number of rows of a whole table
+    is read from pg_class.reltuples instead, and that of a filtered queryset
+    from the row estimate of its EXPLAIN plan. When the estimate is below
+    ``exact_count_threshold`` the exact count is cheap and used instead.
+    Other databases always count exactly.
+
+    As the count may be off, pages are not capped to it: a page past the
+    estimated last page may still have rows, and ``has_next`` is known from
+    fetching one row more.
+    """
+
+    def __init__(
+        self, *args: Any, exact_count_threshold: int = 10000, **kwargs: Any
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.exact_count_threshold = exact_count_threshold
+        self.is_estimate = False
+
+    @cached_property
+    def count(self) -> int:
+        queryset = self.object_list
+        if (
+            not isinstance(queryset, QuerySet)
+            or connections[queryset.db].vendor != "postgresql"
+        ):
+            return super().count
+
+        estimate = self.estimate_count(queryset)
+        if estimate < self.exact_count_threshold:
+            return queryset.count()
+
+        self.is_estimate = True
+        return estimate
+
+    @staticmethod
+    def estimate_count(queryset: QuerySet) -> int:
+        """
+        Estimate the number of rows of a queryset from planner statistics.
+        """
+        connection = connections[queryset.db]
+        with connection.cursor() as cursor:
+            if not queryset.query.where and not queryset.query.distinct:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [connection.ops.quote_name(queryset.model._meta.db_table)],
+                )
+                row = cursor.fetchone()
+                # -1 until the table has been vacuumed or analyzed
+                if row and row[0] >= 0:
+                    return row[0]
+
+            sql, params = queryset.order_by().query.sql_with_params()
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    def validate_number(self, number: Any) -> int:
+        # Counting tells whether the count is an estimate
+        self.count
+        if not self.is_estimate:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages["invalid_page"])
+        if number < 1:
+            raise EmptyPage(self.error_messages["min_page"])
+        return number
+
+    def page(self, number: Any) -> Page:
+        number = self.validate_number(number)
+        if not self.is_estimate:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        return EstimatedPage(
+            list(self.object_list[bottom : bottom + self.per_page + 1]), number, self
+        )
 
 
 class CustomPaginationWithCount(PageNumberPagination):
@@ -23,3 +131,126 @@ class CustomPaginationWithCount(PageNumberPagination):
                 "results": data,
             }
         )
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination keyed on every field of ``ordering``.
+
+    DRF's CursorPagination only compares the first ordering field and skips
+    ties with an offset. Here the cursor holds the values of all the
+    ordering fields of the last row, and the next page is the rows after it
+    in the ordering, so every page is one range scan of an index on those
+    fields, however deep. The ordering must end with a unique field. Pages
+    may hold model instances or named values_list rows that include the
+    ordering fields.
+    """
+
+    page_size = 10
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering: Tuple[str, ...] = ("-id",)
+
+    def paginate_queryset(
+        self, queryset: QuerySet, request: Request, view: Any = None
+    ) -> Optional[List[Model]]:
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.cursor = self.decode_cursor(request)
+        reverse = bool(self.cursor and self.cursor.reverse)
+        ordering = self.get_ordering(request, queryset, view)
+        if reverse:
+            ordering = tuple(self._flip(field) for field in ordering)
+
+        self.model = queryset.model
+        queryset = queryset.order_by(*ordering)
+        if self.cursor:
+            queryset = queryset.filter(
+                self._after(queryset.model, ordering, self.cursor.position)
+            )
+
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[: self.page_size]
+        if reverse:
+            self.page.reverse()
+
+        self.has_next = has_more if not reverse else True
+        self.has_previous = self.cursor is not None if not reverse else has_more
+        return self.page
+
+    def get_ordering(
+        self, request: Request, queryset: QuerySet, view: Any
+    ) -> Tuple[str, ...]:
+        return tuple(self.ordering)
+
+    def get_next_link(self) -> Optional[str]:
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=False, position=self._position(self.page[-1]))
+        )
+
+    def get_previous_link(self) -> Optional[str]:
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=True, position=self._position(self.page[0]))
+        )
+
+    def decode_cursor(self, request: Request) -> Optional[Cursor]:
+        cursor = super().decode_cursor(request)
+        if cursor is None:
+            return None
+        try:
+            position = json.loads(cursor.position)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor._replace(position=position)
+
+    def _position(self, instance: Model) -> str:
+        return json.dumps(
+            [
+                self.model._meta.get_field(field.lstrip("-")).value_to_string(instance)
+                for field in self.ordering
+            ]
+        )
+
+    def _after(self, model: type, ordering: Tuple[str, ...], position: List[str]) -> Q:
+        """
+        Match the rows after a position in the ordering.
+
+        (a, b, c) > (x, y, z) is a > x, or a = x and b > y, or a = x and
+        b = y and c > z; descending fields compare the other way round. The
+        ORs can't bound an index scan, so they are ANDed with a >= x, which
+        can.
+        """
+        try:
+            values = [
+                model._meta.get_field(field.lstrip("-")).to_python(value)
+                for field, value in zip(ordering, position)
+            ]
+        except ValidationError:
+            raise NotFound(self.invalid_cursor_message)
+
+        condition = Q()
+        equal: Dict[str, Any] = {}
+        for field, value in zip(ordering, values):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= Q(**equal, **{f"{name}__{lookup}": value})
+            equal[name] = value
+
+        first = ordering[0]
+        lookup = "lte" if first.startswith("-") else "gte"
+        return Q(**{f"{first.lstrip('-')}__{lookup}": values[0]}) & condition
+
+    @staticmethod
+    def _flip(field: str) -> str:
+        return field[1:] if field.startswith("-") else f"-{field}"
@@ -0,0 +1,42 @@
+import io
+from typing import IO, Any, Dict, Optional
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+
+from core.common.renderers import ORJSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+class ORJSONParser(JSONParser):
+    """
+    JSON parser built on orjson.
+
+    orjson only reads UTF-8 and always rejects NaN and infinity, so other
+    encodings and non-strict JSON are parsed by JSONParser, as is everything
+    when orjson isn't installed. Invalid JSON is parsed again by JSONParser
+    for the same error messages.
+    """
+
+    renderer_class = ORJSONRenderer
+
+    def parse(
+        self,
+        stream: IO[bytes],
+        media_type: Optional[str] = None,
+        parser_context: Optional[Dict[str, Any]] = None,
+    ) -> Any:
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        if orjson is None or not self.strict or encoding.lower() != "utf-8":
+            return super().parse(stream, media_type, parser_context)
+
+        content = stream.read()
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError:
+            return super().parse(io.BytesIO(content), media_type, parser_context)
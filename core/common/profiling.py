@@ -0,0 +1,138 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpRequest, HttpResponse, JsonResponse
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+# Header asking for a request to be profiled; "store" writes the profile to
+# PROFILING_DIR, anything else returns it in place of the response.
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper keeping every SQL statement run, with its timing.
+
+    See ``connection.execute_wrapper``.
+    """
+
+    def __init__(self) -> None:
+        self.queries: List[Dict[str, Any]] = []
+
+    def __call__(
+        self,
+        execute: Callable[..., Any],
+        sql: str,
+        params: Any,
+        many: bool,
+        context: Dict[str, Any],
+    ) -> Any:
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            if not many:
+                # The statement as sent, with its parameters filled in
+                sql = context["connection"].ops.last_executed_query(
+                    context["cursor"], sql, params
+                )
+            self.queries.append({"sql": sql, "many": many, "duration": duration})
+
+
+def is_staff(request: HttpRequest) -> bool:
+    """
+    Check whether the request comes from a staff user.
+
+    The API authenticates in its views, so the request is authenticated here
+    with the API's own authentication classes.
+    """
+    user = getattr(request, "user", None)
+    if user is not None and user.is_staff:
+        return True
+    drf_request = Request(
+        request,
+        authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+    )
+    try:
+        return drf_request.user.is_staff
+    except APIException:
+        return False
+
+
+def profile_request(
+    get_response: Callable[[HttpRequest], HttpResponse], request: HttpRequest
+) -> HttpResponse:
+    """
+    Answer the request under cProfile, recording the SQL statements it runs.
+
+    The profile is stored in PROFILING_DIR when the profile header asks for
+    it, and returned in place of the response otherwise.
+    """
+    profiler = cProfile.Profile()
+    queries = QueryRecorder()
+    started = time.perf_counter()
+    with connection.execute_wrapper(queries):
+        profiler.enable()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+    duration = time.perf_counter() - started
+
+    report = {
+        "method": request.method,
+        "path": request.get_full_path(),
+        "status": response.status_code,
+        "duration": duration,
+        "query_count": len(queries.queries),
+        "query_duration": sum(query["duration"] for query in queries.queries),
+        "queries": queries.queries,
+    }
+
+    directory = settings.PROFILING_DIR
+    if directory and request.headers[PROFILE_HEADER].lower() == "store":
+        profile_id = store_profile(directory, profiler, report)
+        response[PROFILE_ID_HEADER] = profile_id
+        return response
+
+    report["stats"] = format_stats(profiler)
+    return JsonResponse(report)
+
+
+def format_stats(profiler: cProfile.Profile, limit: Optional[int] = None) -> str:
+    """
+    Get the functions taking the most cumulative time, as printed by pstats.
+    """
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(
+        limit or settings.PROFILING_STATS_LIMIT
+    )
+    return stream.getvalue()
+
+
+def store_profile(
+    directory: str, profiler: cProfile.Profile, report: Dict[str, Any]
+) -> str:
+    """
+    Write the pstats dump to ``<id>.prof`` and the report to ``<id>.json``.
+
+    The dump loads with ``pstats.Stats`` or any viewer reading that format.
+    """
+    profile_id = uuid.uuid4().hex
+    profiler.dump_stats(os.path.join(directory, f"{profile_id}.prof"))
+    with open(os.path.join(directory, f"{profile_id}.json"), "w") as file:
+        json.dump(report, file, indent=2)
+    return profile_id
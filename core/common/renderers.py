@@ -0,0 +1,59 @@
+from typing import Any, Dict, Optional
+
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSON renderer built on orjson, with the output of DRF's JSONRenderer.
+
+    Dates, times, datetimes and Decimals go through DRF's JSONEncoder, so
+    they are formatted as before, and everything else is encoded by orjson.
+    Pretty printed output, non-default JSON settings and data orjson can't
+    encode (such as integers wider than 64 bits) are rendered by
+    JSONRenderer, as is everything when orjson isn't installed.
+
+    The output only differs for floats, including Decimals the encoder
+    turns into floats. Those under 1e-4 or from 1e16 in magnitude are
+    written in another form of the same value (1e16 for 1e+16, 0.0000999
+    for 9.99e-05), and NaN and infinite floats are written as null.
+    """
+
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def render(
+        self,
+        data: Any,
+        accepted_media_type: Optional[str] = None,
+        renderer_context: Optional[Dict[str, Any]] = None,
+    ) -> bytes:
+        if data is None:
+            return b""
+
+        if (
+            orjson is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data, default=self.encoder_class().default, option=self.options
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Escaped like JSONRenderer does, for a strict javascript subset.
+        # Checking for ASCII first skips both scans for most responses
+        if not ret.isascii():
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+                b"\xe2\x80\xa9", b"\\u2029"
+            )
+        return ret
@@ -0,0 +1,9 @@
+import os
+from unittest import skipUnless
+
+# Timings depend on the machine and its load, so the benchmarks only run
+# when asked for, e.g. BENCHMARKS=true python manage.py test core
+benchmark = skipUnless(
+    os.getenv("BENCHMARKS", "False").lower() == "true",
+    "set BENCHMARKS=true to run the benchmarks",
+)
@@ -0,0 +1,485 @@
+import io
+import json
+import os
+import pstats
+import sys
+import tempfile
+import time as timer
+import uuid
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from unittest import mock
+from django.db import connection
+from django.contrib.auth import get_user_model
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+    skipUnlessDBFeature,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework.utils.serializer_helpers import ReturnDict
+from rest_framework_simplejwt.tokens import RefreshToken
+from core.common.metrics import (
+    REQUEST_DURATION,
+    REQUEST_QUERIES,
+    REQUEST_QUERY_SECONDS,
+    MetricsRegistry,
+    registry,
+)
+from core.common.parsers import ORJSONParser
+from core.common.profiling import PROFILE_ID_HEADER
+from core.common.renderers import ORJSONRenderer
+from core.common.testing import benchmark
+from core.common.tracing import span, traced
+from core.common.unit_of_work import get_unit_of_work, unit_of_work
+from core.common.pagination import EstimatedCountPaginator
+from core.tables.models import Table
+
+
+class EstimatedCountPaginatorTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Table.objects.all().delete()
+        Table.objects.bulk_create(
+            Table(table_number=number, seats=4 + number % 7, price_per_seat=10.00)
+            for number in range(1, 3001)
+        )
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(f"ANALYZE {Table._meta.db_table}")
+
+    def test_small_querysets_are_counted_exactly(self):
+        queryset = Table.objects.filter(table_number__lte=50).order_by("table_number")
+        paginator = EstimatedCountPaginator(queryset, 10, exact_count_threshold=1000)
+        page = paginator.page(1)
+        self.assertEqual(paginator.count, 50)
+        self.assertFalse(paginator.is_estimate)
+        self.assertEqual(len(page), 10)
+
+    @skipUnlessDBFeature("supports_explaining_query_execution")
+    def test_estimate_is_close(self):
+        if connection.vendor != "postgresql":
+            self.skipTest("Estimates come from PostgreSQL statistics")
+
+        for queryset, exact in (
+            (Table.objects.all(), 3000),
+            (Table.objects.filter(seats__gte=5), 3000 - 3000 // 7),
+        ):
+            paginator = EstimatedCountPaginator(
+                queryset, 10, exact_count_threshold=1000
+            )
+            with self.assertNumQueries(1):
+                self.assertAlmostEqual(paginator.count, exact, delta=exact * 0.2)
+            self.assertTrue(paginator.is_estimate)
+
+    @skipUnlessDBFeature("supports_explaining_query_execution")
+    def test_pages_past_estimate(self):
+        if connection.vendor != "postgresql":
+            self.skipTest("Estimates come from PostgreSQL statistics")
+
+        # Statistics that undercount the table
+        queryset = Table.objects.order_by("table_number")
+        paginator = EstimatedCountPaginator(queryset, 100, exact_count_threshold=1000)
+        with mock.patch.object(paginator, "estimate_count", return_value=1500):
+            page = paginator.page(30)
+        self.assertEqual(page[0].table_number, 2901)
+        self.assertFalse(page.has_next())
+        self.assertTrue(paginator.page(29).has_next())
+
+
+class ORJSONRendererTest(SimpleTestCase):
+    def reservation(self, index):
+        return {
+            "id": index,
+            "table": {"id": 7, "table_number": 107, "price_per_seat": "12.50"},
+            "seats_reserved": 4,
+            "total_cost": Decimal("37.50") + index,
+            "status": "confirmed",
+            "reservation_date": date(2030, 1, 1) + timedelta(days=index),
+            "reservation_time": time(19, 30, 0, 123456 * (index % 2)),
+            "created_at": datetime(
+                2029, 12, 1, 8, 15, 0, 654321 * (index % 2), tzinfo=timezone.utc
+            ),
+            "price": 37.5 + index,
+        }
+
+    def test_matches_json_renderer(self):
+        payload = ReturnDict(
+            {
+                "results": [self.reservation(index) for index in range(20)],
+                "naive": datetime(2030, 1, 1, 12, 0),
+                "offset": datetime(
+                    2030, 1, 1, 12, 0, tzinfo=timezone(timedelta(hours=2))
+                ),
+                "duration": timedelta(hours=2),
+                "uuid": uuid.UUID(int=42),
+                "text": "Café \u2028 \u2029 \U0001f37d",
+                "keys": {1: "one", None: "none", "flag": True},
+                "bool_keys": {True: "yes", False: "no"},
+                "nested": [(1, 2), {"empty": {}}, [], None, False],
+                "big": 2**70,
+            },
+            serializer=None,
+        )
+        for data in (payload, self.reservation(1), [], {}, "", 0):
+            with self.subTest(data=data):
+                self.assertEqual(
+                    ORJSONRenderer().render(data), JSONRenderer().render(data)
+                )
+        self.assertEqual(ORJSONRenderer().render(None), b"")
+
+    def test_numbers_and_dates_match_json_renderer(self):
+        data = {
+            "floats": [37.5, 0.1 + 0.2, 1 / 3, -0.0, 1.0, 1e-4, 9999999999999998.0],
+            "decimals": [Decimal("37.50"), Decimal("-0.01"), Decimal("1E+3")],
+            "datetimes": [
+                datetime(2030, 1, 1, 19, 30, 0, 1, tzinfo=timezone.utc),
+                datetime(2030, 1, 1, tzinfo=timezone(timedelta(hours=-5))),
+                date(2030, 12, 31),
+                time(0, 0),
+            ],
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_large_and_small_floats_keep_their_value(self):
+        data = [1e16, 1.5e300, 9.99e-5, 5e-7, Decimal("1E+20"), Decimal("2.5E-5")]
+        rendered = ORJSONRenderer().render(data)
+        self.assertNotEqual(rendered, JSONRenderer().render(data))
+        self.assertEqual(json.loads(rendered), json.loads(JSONRenderer().render(data)))
+
+    def test_indented_output_matches_json_renderer(self):
+        data = self.reservation(1)
+        self.assertEqual(
+            ORJSONRenderer().render(data, "application/json; indent=4"),
+            JSONRenderer().render(data, "application/json; indent=4"),
+        )
+
+    def test_without_orjson(self):
+        data = self.reservation(1)
+        with mock.patch("core.common.renderers.orjson", None):
+            self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    @benchmark
+    def test_benchmark_rendering(self):
+        # As serializers hand it over, with dates and Decimals as strings
+        data = json.loads(
+            JSONRenderer().render(
+                {"results": [self.reservation(index) for index in range(100)]}
+            )
+        )
+
+        def best_of(render, runs=20):
+            timings = []
+            for _ in range(runs):
+                started = timer.perf_counter()
+                render(data)
+                timings.append(timer.perf_counter() - started)
+            return min(timings)
+
+        drf = best_of(JSONRenderer().render)
+        fast = best_of(ORJSONRenderer().render)
+        sys.stderr.write(
+            f"\nRendering 100 reservations: JSONRenderer {drf * 1000:.2f} ms, "
+            f"ORJSONRenderer {fast * 1000:.2f} ms ({drf / fast:.1f}x)"
+        )
+        self.assertLess(fast, drf)
+
+
+class ORJSONParserTest(SimpleTestCase):
+    def parse(self, parser, content, **parser_context):
+        return parser.parse(io.BytesIO(content), parser_context=parser_context)
+
+    def test_matches_json_parser(self):
+        for content in (
+            b'{"people_count": 4, "reservation_date": "2030-01-01"}',
+            '{"name": "Caf\u00e9 \\u2028", "items": [1, 2.5, null, true]}'.encode(),
+            b"[]",
+            b'"text"',
+        ):
+            with self.subTest(content=content):
+                self.assertEqual(
+                    self.parse(ORJSONParser(), content),
+                    self.parse(JSONParser(), content),
+                )
+
+    def test_other_encodings(self):
+        content = '{"name": "Café"}'.encode("latin-1")
+        self.assertEqual(
+            self.parse(ORJSONParser(), content, encoding="latin-1"), {"name": "Café"}
+        )
+
+    def test_invalid_json(self):
+        for content in (b'{"people_count": ', b'{"price": NaN}'):
+            with self.subTest(content=content):
+                with self.assertRaises(ParseError) as orjson_error:
+                    self.parse(ORJSONParser(), content)
+                with self.assertRaises(ParseError) as json_error:
+                    self.parse(JSONParser(), content)
+                self.assertEqual(str(orjson_error.exception), str(json_error.exception))
+
+    def test_without_orjson(self):
+        with mock.patch("core.common.parsers.orjson", None):
+            self.assertEqual(self.parse(ORJSONParser(), b'{"a": [1]}'), {"a": [1]})
+
+
+class UnitOfWorkTest(TestCase):
+    def setUp(self):
+        self.table = Table.objects.create(
+            table_number=901, seats=4, price_per_seat=10.00
+        )
+
+    def test_identity_map(self):
+        with unit_of_work() as work:
+            self.assertIs(get_unit_of_work(), work)
+            self.assertIsNone(work.get(Table, self.table.pk))
+
+            table = work.add(Table.objects.get(pk=self.table.pk))
+            self.assertIs(work.get(Table, str(self.table.pk)), table)
+            self.assertIs(work.add(Table.objects.get(pk=self.table.pk)), table)
+        self.assertIsNone(get_unit_of_work())
+
+
+# The middleware is loaded with the settings of a test client's first request
+@override_settings(METRICS_ENABLED=True)
+class MetricsTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="metrics@test.com", password="testpassword", username="metrics"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.labels = (("view", "bookings:user_reservations"), ("method", "GET"))
+
+    def get_values(self, metric, labels):
+        return registry.snapshot().get(json.dumps([metric.name, labels]))
+
+    def test_requests_are_recorded_by_view(self):
+        before = self.get_values(REQUEST_QUERIES, self.labels) or [0.0] * 12
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("bookings:user_reservations"))
+        after = self.get_values(REQUEST_QUERIES, self.labels)
+
+        self.assertEqual(after[-1] - before[-1], 1)
+        self.assertEqual(after[-2] - before[-2], len(queries))
+        self.assertIsNotNone(
+            self.get_values(REQUEST_DURATION, (*self.labels, ("status", "200")))
+        )
+        self.assertGreater(self.get_values(REQUEST_QUERY_SECONDS, self.labels)[0], 0)
+
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        text = response.content.decode()
+        self.assertIn("# TYPE http_request_duration_seconds histogram", text)
+        self.assertIn(
+            'http_request_db_queries_bucket{view="bookings:user_reservations",'
+            'method="GET",le="+Inf"}',
+            text,
+        )
+
+    def test_unmatched_requests(self):
+        self.client.get("/not-a-page/")
+        self.assertIsNotNone(
+            self.get_values(
+                REQUEST_DURATION,
+                (("view", "unmatched"), ("method", "GET"), ("status", "404")),
+            )
+        )
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        before = self.get_values(REQUEST_QUERIES, self.labels)
+        self.client.get(reverse("bookings:user_reservations"))
+        self.assertEqual(self.get_values(REQUEST_QUERIES, self.labels), before)
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 401)
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+
+
+class MetricsRegistryTest(SimpleTestCase):
+    labels = (("view", "bookings:book_table"), ("method", "POST"))
+
+    def test_render(self):
+        metrics = MetricsRegistry([REQUEST_QUERIES, REQUEST_QUERY_SECONDS])
+        for count in (0, 3, 3, 12, 500):
+            metrics.observe(REQUEST_QUERIES, self.labels, count)
+        metrics.observe(REQUEST_QUERY_SECONDS, self.labels, 0.25)
+        metrics.observe(
+            REQUEST_QUERY_SECONDS, (("view", 'a"b\\c'), ("method", "GET")), 1
+        )
+
+        with override_settings(METRICS_DIR=""):
+            lines = metrics.render().splitlines()
+
+        labels = 'view="bookings:book_table",method="POST"'
+        for line in (
+            "# TYPE http_request_db_queries histogram",
+            f'http_request_db_queries_bucket{{{labels},le="0"}} 1',
+            f'http_request_db_queries_bucket{{{labels},le="2"}} 1',
+            f'http_request_db_queries_bucket{{{labels},le="3"}} 3',
+            f'http_request_db_queries_bucket{{{labels},le="20"}} 4',
+            f'http_request_db_queries_bucket{{{labels},le="100"}} 4',
+            f'http_request_db_queries_bucket{{{labels},le="+Inf"}} 5',
+            f"http_request_db_queries_sum{{{labels}}} 518",
+            f"http_request_db_queries_count{{{labels}}} 5",
+            "# TYPE http_request_db_query_seconds_total counter",
+            f"http_request_db_query_seconds_total{{{labels}}} 0.25",
+            'http_request_db_query_seconds_total{view="a\\"b\\\\c",method="GET"} 1',
+        ):
+            self.assertIn(line, lines)
+
+    def test_processes_are_added_up(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(METRICS_DIR=directory):
+                workers = [MetricsRegistry([REQUEST_QUERIES]) for _ in range(3)]
+                for index, worker in enumerate(workers):
+                    worker.observe(REQUEST_QUERIES, self.labels, index + 1)
+                    # Stand in for the other worker processes
+                    with mock.patch("os.getpid", return_value=1000 + index):
+                        worker.flush(force=True)
+
+                # Only flushed once a second, unless forced
+                workers[0].observe(REQUEST_QUERIES, self.labels, 10)
+                with mock.patch("os.getpid", return_value=1000):
+                    workers[0].flush()
+                self.assertEqual(len(os.listdir(directory)), 3)
+
+                scraped = MetricsRegistry([REQUEST_QUERIES])
+                with mock.patch("os.getpid", return_value=2000):
+                    collected = scraped.collect()
+
+        self.assertEqual(collected[(REQUEST_QUERIES.name, self.labels)][-2:], [6, 3])
+
+
+@override_settings(PROFILING_ENABLED=True)
+class ProfilingTest(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.staff = User.objects.create_superuser(
+            email="staff@test.com", password="testpassword", username="staff"
+        )
+        self.user = User.objects.create_user(
+            email="customer@test.com", password="testpassword", username="customer"
+        )
+        self.url = reverse("bookings:user_reservations")
+
+    def get(self, user, **headers):
+        token = RefreshToken.for_user(user).access_token
+        # A client of its own, as the middleware chain is built on first use
+        return APIClient().get(
+            self.url, HTTP_AUTHORIZATION=f"Bearer {token}", **headers
+        )
+
+    def test_staff_requests_are_profiled(self):
+        response = self.get(self.staff, HTTP_X_PROFILE="1")
+
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual(report["path"], self.url)
+        self.assertEqual(report["status"], 200)
+        self.assertIn("cumulative", report["stats"])
+        self.assertIn("list", report["stats"])
+        self.assertEqual(report["query_count"], len(report["queries"]))
+        self.assertTrue(
+            any("bookings_reservation" in query["sql"] for query in report["queries"])
+        )
+        self.assertTrue(all(query["duration"] >= 0 for query in report["queries"]))
+
+    def test_other_requests_are_not_profiled(self):
+        for response in (
+            self.get(self.user, HTTP_X_PROFILE="1"),
+            self.get(self.staff),
+            APIClient().get(self.url, HTTP_X_PROFILE="1"),
+        ):
+            self.assertNotIn("stats", response.json())
+
+        with override_settings(PROFILING_ENABLED=False):
+            self.assertNotIn("stats", self.get(self.staff, HTTP_X_PROFILE="1").json())
+
+    def test_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(PROFILING_DIR=directory):
+                response = self.get(self.staff, HTTP_X_PROFILE="store")
+
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("results", response.json())
+            profile_id = response[PROFILE_ID_HEADER]
+            stats = pstats.Stats(os.path.join(directory, f"{profile_id}.prof"))
+            self.assertGreater(stats.total_calls, 0)
+            with open(os.path.join(directory, f"{profile_id}.json")) as file:
+                report = json.load(file)
+            self.assertEqual(report["query_count"], len(report["queries"]))
+
+
+@traced
+def traced_function(fail=False):
+    with span("inner", size=3) as current:
+        if current:
+            current.attributes["found"] = True
+        if fail:
+            raise ValueError
+
+
+class TracingTest(SimpleTestCase):
+    def get_traces(self, logs):
+        return [record.trace for record in logs.records]
+
+    @override_settings(TRACING_SAMPLE_RATE=1)
+    def test_nested_spans(self):
+        with self.assertLogs("core.common.tracing") as logs:
+            with span("outer"):
+                traced_function()
+                with self.assertRaises(ValueError):
+                    traced_function(fail=True)
+
+        [trace] = self.get_traces(logs)
+        self.assertEqual(json.loads(logs.records[0].getMessage()), trace)
+        self.assertEqual(trace["name"], "outer")
+        first, second = trace["children"]
+        self.assertEqual(first["name"], "traced_function")
+        self.assertEqual(
+            first["children"],
+            [
+                {
+                    "name": "inner",
+                    "duration_ms": first["children"][0]["duration_ms"],
+                    "attributes": {"size": 3, "found": True},
+                }
+            ],
+        )
+        self.assertNotIn("error", first)
+        self.assertEqual(second["error"], "ValueError")
+        self.assertEqual(second["children"][0]["error"], "ValueError")
+
+    @override_settings(TRACING_SAMPLE_RATE=0.5)
+    def test_sampling(self):
+        with mock.patch("random.random", side_effect=[0.9, 0.1]):
+            with self.assertLogs("core.common.tracing") as logs:
+                # Not sampled, along with everything it runs
+                with span("skipped") as skipped:
+                    self.assertIsNone(skipped)
+                    with span("nested") as nested:
+                        self.assertIsNone(nested)
+                with span("sampled"):
+                    pass
+
+        self.assertEqual(
+            [trace["name"] for trace in self.get_traces(logs)], ["sampled"]
+        )
+
+    @override_settings(TRACING_SAMPLE_RATE=0)
+    def test_disabled(self):
+        with self.assertNoLogs("core.common.tracing"):
+            with span("skipped") as skipped:
+                self.assertIsNone(skipped)
+            traced_function()
@@ -0,0 +1,137 @@
+import functools
+import json
+import logging
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar, Union
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class Span:
+    """
+    A timed operation, with the operations it ran nested under it.
+    """
+
+    __slots__ = ("name", "attributes", "started", "duration", "error", "children")
+
+    def __init__(self, name: str, attributes: Dict[str, Any]) -> None:
+        self.name = name
+        self.attributes = attributes
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.error: Optional[str] = None
+        self.children: List["Span"] = []
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Get the span and its children as a tree of plain dictionaries.
+        """
+        tree: Dict[str, Any] = {
+            "name": self.name,
+            "duration_ms": round(self.duration * 1000, 3),
+        }
+        if self.attributes:
+            tree["attributes"] = self.attributes
+        if self.error:
+            tree["error"] = self.error
+        if self.children:
+            tree["children"] = [child.to_dict() for child in self.children]
+        return tree
+
+
+# Set for the whole of a trace that was not sampled, so its spans are skipped
+NOT_SAMPLED = Span("not sampled", {})
+
+_current: ContextVar[Optional[Span]] = ContextVar("span", default=None)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Time a block as a span of the current trace, or start a trace.
+
+    A trace is started by the outermost span and kept for
+    TRACING_SAMPLE_RATE of them; once finished, its timing tree is logged as
+    one JSON line to the ``core.common.tracing`` logger. Yields the span, to
+    add attributes to, or None when the trace is not sampled.
+    """
+    parent = _current.get()
+    if parent is NOT_SAMPLED:
+        yield None
+        return
+    if parent is None:
+        rate = settings.TRACING_SAMPLE_RATE
+        if rate <= 0:
+            yield None
+            return
+        if rate < 1 and random.random() >= rate:
+            token = _current.set(NOT_SAMPLED)
+            try:
+                yield None
+            finally:
+                _current.reset(token)
+            return
+
+    current = Span(name, attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as error:
+        current.error = type(error).__name__
+        raise
+    finally:
+        current.duration = time.perf_counter() - current.started
+        _current.reset(token)
+        if parent is None:
+            log_trace(current)
+        else:
+            parent.children.append(current)
+
+
+def traced(name_or_function: Union[str, F, None] = None) -> Any:
+    """
+    Run every call of a function in a span named after it.
+
+    Use as ``@traced`` or ``@traced("name")``. Generator functions are not
+    supported, as only the creation of the generator would be timed.
+    """
+
+    def decorator(function: F) -> F:
+        name = (
+            name_or_function
+            if isinstance(name_or_function, str)
+            else function.__qualname__
+        )
+
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            # Skip the context manager when nothing is being traced
+            parent = _current.get()
+            if parent is NOT_SAMPLED or (
+                parent is None and settings.TRACING_SAMPLE_RATE <= 0
+            ):
+                return function(*args, **kwargs)
+            with span(name):
+                return function(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    if callable(name_or_function):
+        return decorator(name_or_function)
+    return decorator
+
+
+def log_trace(root: Span) -> None:
+    """
+    Log the timing tree of a finished trace.
+    """
+    trace = {"trace_id": uuid.uuid4().hex, "time": time.time(), **root.to_dict()}
+    logger.info(json.dumps(trace, default=str), extra={"trace": trace})
@@ -0,0 +1,55 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional, Tuple, Type
+
+from django.db.models import Model
+
+
+class UnitOfWork:
+    """
+    Identity map of one request.
+
+    Entities loaded through the repositories are kept by model and primary
+    key, so a row is fetched at most once per request and every layer works
+    on the same instance. Writes are not deferred: cancelling and booking
+    are conditional updates and constrained inserts, which must run when
+    called to tell whether they succeeded.
+    """
+
+    def __init__(self) -> None:
+        self._identity_map: Dict[Tuple[Type[Model], object], Model] = {}
+
+    def get(self, model: Type[Model], pk: object) -> Optional[Model]:
+        """
+        Get an entity already loaded in this unit of work.
+        """
+        return self._identity_map.get((model, model._meta.pk.to_python(pk)))
+
+    def add(self, instance: Model) -> Model:
+        """
+        Keep a loaded entity, returning the instance already kept for its row.
+        """
+        return self._identity_map.setdefault((type(instance), instance.pk), instance)
+
+
+_current: ContextVar[Optional[UnitOfWork]] = ContextVar("unit_of_work", default=None)
+
+
+def get_unit_of_work() -> Optional[UnitOfWork]:
+    """
+    Get the unit of work of the current request, if any.
+    """
+    return _current.get()
+
+
+@contextmanager
+def unit_of_work() -> Iterator[UnitOfWork]:
+    """
+    Run a block in its own unit of work.
+    """
+    work = UnitOfWork()
+    token = _current.set(work)
+    try:
+        yield work
+    finally:
+        _current.reset(token)
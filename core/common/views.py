@@ -0,0 +1,25 @@
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpRequest, HttpResponse
+
+from core.common.metrics import registry
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    """
+    Expose the request metrics of every worker in the Prometheus text format.
+
+    Not found unless METRICS_ENABLED is set. When METRICS_TOKEN is set,
+    scrapers must send it as a bearer token.
+    """
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    token = settings.METRICS_TOKEN
+    if token and not hmac.compare_digest(
+        request.headers.get("Authorization", ""), f"Bearer {token}"
+    ):
+        return HttpResponse(status=401)
+    return HttpResponse(
+        registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,208 @@
+import copy
+import threading
+import time
+from typing import AbstractSet, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from core.tables.models import Table
+from core.tables.pricing import PriceMatrix
+
+
+class TableCandidate(NamedTuple):
+    """A table that can seat a party, with the price the party would pay."""
+
+    price: float
+    seats_allocated: int
+    table: Table
+
+
+class TablePrices(NamedTuple):
+    """A table with the price of every number of seats it can be booked for.
+
+    ``prices[seats]`` is infinite when that many seats can't be booked.
+    """
+
+    table: Table
+    prices: Tuple[float, ...]
+
+
+class TableAllocationIndex:
+    """
+    Per-process index of available tables keyed by party size.
+
+    For every party size the index keeps the suitable tables ordered from the
+    cheapest to the most expensive option, so allocating a table is a
+    dictionary lookup instead of a round of queries. It also keeps the tables
+    grouped by seat count with their prices precomputed, for splitting large
+    parties across tables, and the price matrix it is built from (see
+    ``core.tables.pricing``). The index is rebuilt lazily after ``invalidate``
+    is called (see ``core.tables.signals``).
+
+    Other worker processes are notified through a version stored in the
+    Django cache, which must be shared by all the workers when there is more
+    than one (see ``core.tables.checks``). Each worker reads it at most once
+    every ALLOCATION_INDEX_CHECK_SECONDS. The version is the time of the last
+    change, and a new one is stored when it is evicted, so it never goes back
+    to the version of an older index.
+    """
+
+    VERSION_CACHE_KEY = "tables:allocation-index:version"
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+        self._candidates: Dict[int, List[TableCandidate]] = {}
+        self._tables_by_seats: Dict[int, List[TablePrices]] = {}
+        self._price_matrix = PriceMatrix([])
+
+    def invalidate(self) -> None:
+        """
+        Drop the index in this process and tell the other workers to do so.
+
+        The other workers are told once the current transaction commits, so
+        they can't rebuild their index from the inventory before the change.
+        """
+        with self._lock:
+            self._version = None
+        transaction.on_commit(self._bump_version)
+
+    def _bump_version(self) -> None:
+        # Also drops an index this process rebuilt before the commit
+        with self._lock:
+            self._version = None
+        cache.set(self.VERSION_CACHE_KEY, time.time_ns(), timeout=None)
+
+    def candidates(
+        self,
+        people_count: int,
+        exclude_table_ids: AbstractSet[int] = frozenset(),
+        copy_tables: bool = True,
+    ) -> Iterator[TableCandidate]:
+        """
+        Get the tables that can seat the party, best option first.
+
+        Without ``copy_tables`` the tables are shared with the index and must
+        not be modified.
+        """
+        for candidate in self._get_candidates().get(people_count, []):
+            if candidate.table.pk not in exclude_table_ids:
+                if copy_tables:
+                    candidate = candidate._replace(table=copy.copy(candidate.table))
+                yield candidate
+
+    def best(
+        self, people_count: int, exclude_table_ids: AbstractSet[int] = frozenset()
+    ) -> Optional[TableCandidate]:
+        """
+        Get the cheapest table for the party.
+        """
+        return next(self.candidates(people_count, exclude_table_ids), None)
+
+    def can_seat(self, people_count: int) -> bool:
+        """
+        Check whether any single available table can seat the party.
+        """
+        return people_count in self._get_candidates()
+
+    def tables_by_seats(
+        self, exclude_table_ids: AbstractSet[int] = frozenset()
+    ) -> Dict[int, List[TablePrices]]:
+        """
+        Get the tables grouped by seat count, cheapest first.
+
+        The tables are shared with the index and must not be modified.
+        """
+        self._get_candidates()
+        return {
+            seats: [
+                table_prices
+                for table_prices in tables
+                if table_prices.table.pk not in exclude_table_ids
+            ]
+            for seats, tables in self._tables_by_seats.items()
+        }
+
+    def price_matrix(self) -> PriceMatrix:
+        """
+        Get the prices of every available table for every party size.
+
+        The matrix is shared with the index and must not be modified.
+        """
+        self._get_candidates()
+        return self._price_matrix
+
+    def _get_candidates(self) -> Dict[int, List[TableCandidate]]:
+        version = self._shared_version()
+        with self._lock:
+            if self._version is None or self._version != version:
+                (
+                    self._candidates,
+                    self._tables_by_seats,
+                    self._price_matrix,
+                ) = self._build()
+                self._version = version
+            return self._candidates
+
+    def _shared_version(self) -> Optional[int]:
+        checked_at = time.monotonic()
+        if (
+            self._version is not None
+            and checked_at - self._checked_at < settings.ALLOCATION_INDEX_CHECK_SECONDS
+        ):
+            return self._version
+        version = cache.get(self.VERSION_CACHE_KEY)
+        if version is None:
+            # Missing or evicted, start from a version no index was built at
+            version = time.time_ns()
+            cache.add(self.VERSION_CACHE_KEY, version, timeout=None)
+            version = cache.get(self.VERSION_CACHE_KEY, version)
+        self._checked_at = checked_at
+        return version
+
+    @staticmethod
+    def _build() -> Tuple[
+        Dict[int, List[TableCandidate]],
+        Dict[int, List[TablePrices]],
+        PriceMatrix,
+    ]:
+        # Imported here to avoid circular imports
+        from core.tables.services import TableService
+
+        matrix = PriceMatrix(list(TableService.get_available_tables()))
+
+        index: Dict[int, List[TableCandidate]] = {}
+        for people_count in matrix.party_sizes.tolist():
+            column = people_count - 1
+            candidates = [
+                TableCandidate(
+                    float(matrix.prices[row, column]),
+                    int(matrix.seats_allocated[row, column]),
+                    matrix.tables[row],
+                )
+                for row in matrix.order(people_count).tolist()
+            ]
+            if candidates:
+                index[people_count] = candidates
+
+        tables_by_seats: Dict[int, List[TablePrices]] = {}
+        # The matrix rows are ordered by table number, which breaks the ties
+        for row in sorted(
+            range(len(matrix.tables)), key=lambda row: matrix.tables[row].price_per_seat
+        ):
+            table = matrix.tables[row]
+            # A whole table, or an even number of its seats
+            prices = [float("inf")] * (table.seats + 1)
+            for seats in [*range(2, table.seats, 2), table.seats]:
+                prices[seats] = float(matrix.prices[row, seats - 1])
+            tables_by_seats.setdefault(table.seats, []).append(
+                TablePrices(table, tuple(prices))
+            )
+
+        return index, tables_by_seats, matrix
+
+
+allocation_index = TableAllocationIndex()
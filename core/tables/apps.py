@@ -6,3 +6,7 @@ class TablesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core.tables"
     verbose_name = _("Tables")
+
+    def ready(self) -> None:
+        # Register signal handlers and system checks
+        from core.tables import checks, signals  # noqa: F401
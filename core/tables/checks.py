@@ -0,0 +1,33 @@
+from typing import Any, List
+
+from django.conf import settings
+from django.core.checks import CheckMessage, Error, Tags, register
+
+# Backends keeping their entries in the memory of each process
+PROCESS_LOCAL_CACHES = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+@register(Tags.caches, deploy=True)
+def check_allocation_index_cache(**kwargs: Any) -> List[CheckMessage]:
+    """
+    Check that the workers share the cache the allocation index relies on.
+
+    Each worker keeps its own allocation index and learns about inventory
+    changes made by the others from a version counter in the default cache.
+    """
+    backend = settings.CACHES.get("default", {}).get("BACKEND", "")
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        Error(
+            f"The default cache ({backend}) is not shared between processes, so "
+            "workers would keep allocating tables changed by other workers.",
+            hint="Set CACHE_BACKEND to a shared backend such as "
+            "django.core.cache.backends.db.DatabaseCache or a memcached or "
+            "redis backend.",
+            id="tables.E001",
+        )
+    ]
@@ -0,0 +1,130 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.tables.allocation import TablePrices
+
+INF = float("inf")
+
+
+def cheapest_combination(
+    tables_by_seats: Dict[int, List[TablePrices]],
+    people_count: int,
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Find the cheapest set of tables that seats a party together.
+
+    ``tables_by_seats`` maps each seat count to its tables, cheapest first,
+    as kept by the allocation index. Seats are allocated by the single-table
+    rules: a whole table, or an even number of its seats.
+
+    Two exchange arguments keep the search small. Of two partly used
+    tables, moving seats to the cheaper one never costs more, so at most one
+    table is partly used. Within a seat count, a cheaper table is never
+    worse used whole than a dearer one. So an optimal split takes the k
+    cheapest tables of each seat count whole, plus at most one partly used
+    table, the next one in its seat count. That is a knapsack over seat
+    counts rather than tables, and its size does not grow with the number of
+    tables.
+    """
+    if people_count <= 0:
+        return None
+
+    classes = [
+        (seats, tables)
+        for seats, tables in sorted(tables_by_seats.items())
+        if seats > 0 and tables
+    ]
+
+    # dp[partial][covered] is the lowest cost for covering that many people
+    # (capped at the party size), with or without a partly used table.
+    dp = [[INF] * (people_count + 1) for _ in range(2)]
+    dp[0][0] = 0.0
+    layers = []
+
+    for seats, tables in classes:
+        # More than ceil(people / seats) whole tables are never needed, and
+        # the partly used table is the one right after them
+        tables = tables[: -(-people_count // seats) + 1]
+        full_costs = [0.0]
+        for table_prices in tables:
+            full_costs.append(full_costs[-1] + table_prices.prices[seats])
+        partial_costs = [
+            [
+                (allocated, table_prices.prices[allocated])
+                for allocated in range(2, seats, 2)
+            ]
+            for table_prices in tables
+        ]
+
+        new = [[INF] * (people_count + 1) for _ in range(2)]
+        new_whole, new_partial = new
+        # back[partial][covered] = (previous partial, previous covered, k, s)
+        back: List[List[Optional[Tuple[int, int, int, int]]]] = [
+            [None] * (people_count + 1) for _ in range(2)
+        ]
+        back_whole, back_partial = back
+
+        for covered in range(people_count + 1):
+            base_whole = dp[0][covered]
+            base_partial = dp[1][covered]
+            if base_whole == INF and base_partial == INF:
+                continue
+
+            for k in range(len(tables) + 1):
+                full_cost = full_costs[k]
+                reached = covered + k * seats
+                capped = reached if reached < people_count else people_count
+
+                cost = base_whole + full_cost
+                if cost < new_whole[capped]:
+                    new_whole[capped] = cost
+                    back_whole[capped] = (0, covered, k, 0)
+                cost = base_partial + full_cost
+                if cost < new_partial[capped]:
+                    new_partial[capped] = cost
+                    back_partial[capped] = (1, covered, k, 0)
+
+                if reached >= people_count:
+                    break
+
+                # Partly use the next cheapest table of this seat count
+                if base_whole != INF and k < len(tables):
+                    for allocated, partial_cost in partial_costs[k]:
+                        cost = base_whole + full_cost + partial_cost
+                        capped = min(reached + allocated, people_count)
+                        if cost < new_partial[capped]:
+                            new_partial[capped] = cost
+                            back_partial[capped] = (0, covered, k, allocated)
+                        if capped == people_count:
+                            break
+
+        dp = new
+        layers.append((seats, tables, back))
+
+    partial = 0 if dp[0][people_count] <= dp[1][people_count] else 1
+    if dp[partial][people_count] == INF:
+        return None
+
+    # Walk the seat counts backwards to recover the chosen tables
+    combination = []
+    covered = people_count
+    for seats, tables, back in reversed(layers):
+        partial, covered, k, allocated = back[partial][covered]
+        for table_prices in tables[:k]:
+            combination.append(
+                {
+                    "table": table_prices.table,
+                    "seats_allocated": seats,
+                    "price": table_prices.prices[seats],
+                }
+            )
+        if allocated:
+            combination.append(
+                {
+                    "table": tables[k].table,
+                    "seats_allocated": allocated,
+                    "price": tables[k].prices[allocated],
+                }
+            )
+
+    combination.sort(key=lambda table_info: table_info["table"].table_number)
+    return combination
@@ -0,0 +1,85 @@
+# Generated by Django 4.2.11 on 2026-10-18 07:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_occupancies(apps, schema_editor):
+    Reservation = apps.get_model("bookings", "Reservation")
+    TableOccupancy = apps.get_model("tables", "TableOccupancy")
+
+    slot_minutes = settings.BOOKING_SLOT_MINUTES
+    slot_count = -(-settings.BOOKING_DURATION_MINUTES // slot_minutes)
+
+    occupancies = []
+    for reservation in Reservation.objects.exclude(status="cancelled"):
+        start_minute = (
+            reservation.reservation_time.hour * 60 + reservation.reservation_time.minute
+        )
+        first_slot = start_minute // slot_minutes
+        for slot in range(first_slot, first_slot + slot_count):
+            occupancies.append(
+                TableOccupancy(
+                    table_id=reservation.table_id,
+                    reservation_id=reservation.id,
+                    date=reservation.reservation_date,
+                    slot=slot,
+                )
+            )
+    TableOccupancy.objects.bulk_create(occupancies, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookings", "0002_sync_reservation_time"),
+        ("tables", "0002_initial_tables"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TableOccupancy",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                (
+                    "slot",
+                    models.PositiveSmallIntegerField(
+                        help_text="Index of the time slot within the day"
+                    ),
+                ),
+                (
+                    "reservation",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="occupancies",
+                        to="bookings.reservation",
+                    ),
+                ),
+                (
+                    "table",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="occupancies",
+                        to="tables.table",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="tableoccupancy",
+            constraint=models.UniqueConstraint(
+                fields=("date", "slot", "table"), name="unique_table_occupancy"
+            ),
+        ),
+        migrations.RunPython(backfill_occupancies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.11 on 2026-10-18 07:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookings", "0004_bookinghold"),
+        ("tables", "0003_tableoccupancy"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tableoccupancy",
+            name="expires_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="tableoccupancy",
+            name="hold",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="occupancies",
+                to="bookings.bookinghold",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="tableoccupancy",
+            name="reservation",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="occupancies",
+                to="bookings.reservation",
+            ),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 4.2.11 on 2026-10-18 08:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_slot_bitmaps(apps, schema_editor):
+    TableOccupancy = apps.get_model("tables", "TableOccupancy")
+    TableSlotBitmap = apps.get_model("tables", "TableSlotBitmap")
+
+    bitmaps = {}
+    for table_id, date, slot in TableOccupancy.objects.filter(
+        reservation__isnull=False
+    ).values_list("table_id", "date", "slot"):
+        bitmaps[(table_id, date)] = bitmaps.get((table_id, date), 0) | 1 << slot
+
+    TableSlotBitmap.objects.bulk_create(
+        TableSlotBitmap(
+            table_id=table_id,
+            date=date,
+            bitmap=slots.to_bytes((slots.bit_length() + 7) // 8, "little"),
+        )
+        for (table_id, date), slots in bitmaps.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookings", "0004_bookinghold"),
+        ("tables", "0004_occupancy_hold"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TableSlotBitmap",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("bitmap", models.BinaryField(default=b"")),
+                (
+                    "table",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="slot_bitmaps",
+                        to="tables.table",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="tableslotbitmap",
+            constraint=models.UniqueConstraint(
+                fields=("date", "table"), name="unique_table_slot_bitmap"
+            ),
+        ),
+        migrations.RunPython(backfill_slot_bitmaps, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.11 on 2026-10-18 10:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tables", "0005_slot_bitmaps"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="tableoccupancy",
+            index=models.Index(
+                condition=models.Q(("expires_at__isnull", False)),
+                fields=["expires_at"],
+                name="occupancy_expires_at_idx",
+            ),
+        ),
+    ]
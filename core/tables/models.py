@@ -31,3 +31,103 @@ class Table(TimeStampedModel):
 
     def __str__(self) -> str:
         return f"Table {self.table_number} ({self.seats} seats)"
+
+
+class TableOccupancy(models.Model):
+    """
+    A time slot of a table taken by a reservation or a booking hold.
+
+    Each reservation occupies one row per slot it covers, so the unique
+    constraint rejects overlapping bookings of the same table and the free
+    tables for a slot can be found from the (date, slot) prefix. Slots held
+    by a hold carry its expiry and count as free once it has passed.
+    """
+
+    table = models.ForeignKey(
+        Table,
+        on_delete=models.CASCADE,
+        related_name="occupancies",
+    )
+
+    reservation = models.ForeignKey(
+        "bookings.Reservation",
+        on_delete=models.CASCADE,
+        related_name="occupancies",
+        null=True,
+        blank=True,
+    )
+
+    hold = models.ForeignKey(
+        "bookings.BookingHold",
+        on_delete=models.CASCADE,
+        related_name="occupancies",
+        null=True,
+        blank=True,
+    )
+
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    date = models.DateField()
+
+    slot = models.PositiveSmallIntegerField(
+        help_text="Index of the time slot within the day"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "slot", "table"],
+                name="unique_table_occupancy",
+            )
+        ]
+        indexes = [
+            # Slots of booking holds, found by expiry to be reclaimed
+            models.Index(
+                fields=["expires_at"],
+                condition=models.Q(expires_at__isnull=False),
+                name="occupancy_expires_at_idx",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"Table {self.table_id} - {self.date} slot {self.slot}"
+
+
+class TableSlotBitmap(models.Model):
+    """
+    The slots of a table taken by reservations on a day, as a bitmap.
+
+    Bit ``n`` is set while slot ``n`` is taken by a reservation. The bitmaps
+    are kept in step with the reservation occupancies by ``TableService``, so
+    searching the free slots of a date range reads one row per table and
+    day. Slots taken by booking holds are not tracked here.
+    """
+
+    table = models.ForeignKey(
+        Table,
+        on_delete=models.CASCADE,
+        related_name="slot_bitmaps",
+    )
+
+    date = models.DateField()
+
+    bitmap = models.BinaryField(default=b"")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "table"],
+                name="unique_table_slot_bitmap",
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"Table {self.table_id} - {self.date} slots {self.slots:b}"
+
+    @property
+    def slots(self) -> int:
+        return int.from_bytes(self.bitmap, "little")
+
+    @slots.setter
+    def slots(self, value: int) -> None:
+        self.bitmap = value.to_bytes((value.bit_length() + 7) // 8, "little")
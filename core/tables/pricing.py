@@ -0,0 +1,93 @@
+from typing import AbstractSet, Dict, List, Optional
+
+import numpy as np
+
+from core.tables.models import Table
+
+
+class PriceMatrix:
+    """
+    Prices of every available table for every party size.
+
+    Row ``i`` holds ``tables[i]`` and column ``j`` a party of ``j + 1``
+    people. The pricing rules are those of
+    ``TableService.calculate_table_price``: an odd party is rounded up to an
+    even number of seats unless it fills the table, and a whole table costs
+    (M-1)*X. Parties a table can't seat cost infinity. Prices are computed
+    in cents, so they match the Decimal arithmetic to the last bit.
+    """
+
+    def __init__(self, tables: List[Table]) -> None:
+        self.tables = sorted(tables, key=lambda table: table.table_number)
+        self.table_ids = np.array([table.pk for table in self.tables], dtype=np.int64)
+        self.table_numbers = np.array(
+            [table.table_number for table in self.tables], dtype=np.int64
+        )
+        self.seats = np.array([table.seats for table in self.tables], dtype=np.int64)
+        self.party_sizes = np.arange(1, self.seats.max(initial=0) + 1, dtype=np.int64)
+
+        cents = np.array(
+            [int(table.price_per_seat * 100) for table in self.tables], dtype=np.int64
+        )
+        requested = self.party_sizes[np.newaxis, :]
+        seats = self.seats[:, np.newaxis]
+
+        # Odd parties that don't fill the table are rounded up to even seats
+        allocated = np.where(requested == seats, requested, requested + requested % 2)
+        fits = allocated <= seats
+        price_cents = np.where(
+            allocated == seats,
+            cents[:, np.newaxis] * (seats - 1),
+            cents[:, np.newaxis] * allocated,
+        )
+
+        self.seats_allocated = np.where(fits, allocated, 0)
+        self.prices = np.where(fits, price_cents / 100, np.inf)
+        # Odd parties go to a table of exactly their size when there is one
+        self.exact = (requested == seats) & (requested % 2 == 1)
+
+    def order(self, people_count: int) -> np.ndarray:
+        """
+        Get the rows of the tables that can seat the party, best option first.
+        """
+        if not 1 <= people_count <= len(self.party_sizes):
+            return np.empty(0, dtype=np.int64)
+
+        column = people_count - 1
+        prices = self.prices[:, column]
+        rows = np.lexsort((self.table_numbers, prices, ~self.exact[:, column]))
+        return rows[np.isfinite(prices[rows])]
+
+    def cheapest(
+        self, exclude_table_ids: AbstractSet[int] = frozenset()
+    ) -> List[Optional[Dict[str, object]]]:
+        """
+        Get the best table for every party size, or None when none fits.
+        """
+        if not self.tables:
+            return []
+
+        prices = self.prices
+        if exclude_table_ids:
+            excluded = np.isin(self.table_ids, list(exclude_table_ids))
+            prices = np.where(excluded[:, np.newaxis], np.inf, prices)
+
+        # An exact match wins over any rounded up table
+        exact = self.exact & np.isfinite(prices)
+        ranked = np.where(exact.any(axis=0) & ~exact, np.inf, prices)
+        rows = ranked.argmin(axis=0)
+        columns = np.arange(len(self.party_sizes))
+        found = np.isfinite(ranked[rows, columns])
+
+        return [
+            (
+                {
+                    "table": self.tables[row],
+                    "seats_allocated": int(self.seats_allocated[row, column]),
+                    "price": float(prices[row, column]),
+                }
+                if fits
+                else None
+            )
+            for column, (row, fits) in enumerate(zip(rows.tolist(), found.tolist()))
+        ]
@@ -1,7 +1,32 @@
-from typing import Optional, Dict, Any
-from django.db.models import QuerySet
+import copy
+from collections import defaultdict
+from datetime import date, time, timedelta
+from itertools import islice
+from typing import (
+    AbstractSet,
+    Optional,
+    Dict,
+    Any,
+    Callable,
+    DefaultDict,
+    Iterable,
+    Iterator,
+    List,
+    Set,
+    Tuple,
+    TypeVar,
+)
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q, QuerySet
+from django.utils import timezone
 
-from core.tables.models import Table
+from core.common.tracing import traced
+from core.tables.allocation import TableCandidate, allocation_index
+from core.tables.combinations import cheapest_combination
+from core.tables.models import Table, TableOccupancy, TableSlotBitmap
+
+T = TypeVar("T")
 
 
 class TableService:
@@ -11,6 +36,393 @@ class TableService:
     def get_available_tables() -> QuerySet[Table]:
         return Table.objects.filter(is_available=True)
 
+    @staticmethod
+    @traced
+    def lock_table_days(
+        table_days: Iterable[Tuple[int, date]], skip_locked: bool = False
+    ) -> Dict[Tuple[int, date], TableSlotBitmap]:
+        """Lock the days of tables for the current transaction.
+
+        Bookings of a table for the same day go one after the other, so each
+        one sees the slots and reservations of the ones before it. The day
+        bitmaps are the lock rows, created empty when missing. Returns the
+        locked bitmaps by (table_id, date); with ``skip_locked``, the days
+        another transaction holds are left out instead of waited for.
+
+        Run it in the savepoint of the booking, which releases the locks if
+        the booking fails. Days are waited for in a fixed order, so bookings
+        of several tables can't deadlock.
+        """
+        table_days = sorted(set(table_days))
+        if not table_days:
+            return {}
+
+        def lock(
+            keys: List[Tuple[int, date]],
+        ) -> Dict[Tuple[int, date], TableSlotBitmap]:
+            lookup = Q()
+            for table_id, reservation_date in keys:
+                lookup |= Q(table_id=table_id, date=reservation_date)
+            return {
+                (bitmap.table_id, bitmap.date): bitmap
+                for bitmap in TableSlotBitmap.objects.select_for_update(
+                    skip_locked=skip_locked
+                )
+                .filter(lookup)
+                .order_by("table_id", "date")
+            }
+
+        locked: Dict[Tuple[int, date], TableSlotBitmap] = {}
+        missing = table_days
+        # Waiting for days locked after others would break the order
+        if skip_locked or len(table_days) == 1:
+            locked = lock(table_days)
+            missing = [key for key in table_days if key not in locked]
+        if missing:
+            TableSlotBitmap.objects.bulk_create(
+                (
+                    TableSlotBitmap(table_id=table_id, date=reservation_date)
+                    for table_id, reservation_date in missing
+                ),
+                ignore_conflicts=True,
+            )
+            locked.update(lock(missing))
+        return locked
+
+    @staticmethod
+    def get_slots(
+        reservation_time: time, duration: Optional[timedelta] = None
+    ) -> range:
+        """Get the slots of the day covered by a reservation starting at a time.
+
+        Reservations last BOOKING_DURATION_MINUTES unless given a duration.
+        """
+        slot_minutes = settings.BOOKING_SLOT_MINUTES
+        start_minute = reservation_time.hour * 60 + reservation_time.minute
+        first_slot = start_minute // slot_minutes
+        minutes = (
+            duration // timedelta(minutes=1)
+            if duration is not None
+            else settings.BOOKING_DURATION_MINUTES
+        )
+        slot_count = -(-minutes // slot_minutes)
+        return range(first_slot, first_slot + slot_count)
+
+    @staticmethod
+    def ends_by_midnight(
+        reservation_time: time, duration: Optional[timedelta] = None
+    ) -> bool:
+        """Check whether a reservation starting at a time ends the same day.
+
+        The slots of a table are kept per day, so reservations running past
+        midnight are not taken.
+        """
+        return TableService.get_slots(reservation_time, duration).stop <= (
+            TableService.get_day_slots()
+        )
+
+    @staticmethod
+    def get_slot_mask(
+        reservation_time: time, duration: Optional[timedelta] = None
+    ) -> int:
+        """Get the slots covered by a reservation as a bitmap."""
+        slots = TableService.get_slots(reservation_time, duration)
+        return ((1 << len(slots)) - 1) << slots.start
+
+    def get_occupancies(
+        self, reservation_date: date, reservation_time: time
+    ) -> QuerySet[TableOccupancy]:
+        """Get the live occupancies overlapping a reservation."""
+        return TableOccupancy.objects.filter(
+            Q(expires_at__isnull=True) | Q(expires_at__gt=timezone.now()),
+            date=reservation_date,
+            slot__in=self.get_slots(reservation_time),
+        )
+
+    @traced
+    def get_occupied_table_ids(
+        self, reservation_date: date, reservation_time: time
+    ) -> Set[int]:
+        """Get the tables that are taken at any point of a reservation."""
+        return set(
+            self.get_occupancies(reservation_date, reservation_time).values_list(
+                "table_id", flat=True
+            )
+        )
+
+    def get_free_tables(
+        self, reservation_date: date, reservation_time: time
+    ) -> QuerySet[Table]:
+        """Get the available tables that are free for a whole reservation."""
+        occupied = self.get_occupancies(reservation_date, reservation_time).values(
+            "table_id"
+        )
+        return self.get_available_tables().exclude(id__in=occupied)
+
+    @traced
+    def occupy_slots(
+        self,
+        table: Table,
+        reservation: Any,
+        reservation_date: date,
+        reservation_time: time,
+        hold: Any = None,
+        slot_bitmap: Optional[TableSlotBitmap] = None,
+    ) -> None:
+        """Take the slots of a table for a reservation or a booking hold.
+
+        A reservation takes the slots of its own duration, a hold those of the
+        default duration. ``slot_bitmap`` is the table's day bitmap when it is
+        already locked.
+        """
+        duration = reservation.duration if reservation is not None else None
+        TableOccupancy.objects.bulk_create(
+            TableOccupancy(
+                table=table,
+                reservation=reservation,
+                hold=hold,
+                expires_at=hold.expires_at if hold else None,
+                date=reservation_date,
+                slot=slot,
+            )
+            for slot in self.get_slots(reservation_time, duration)
+        )
+        if reservation is not None:
+            self.update_slot_bitmaps(
+                [reservation], occupy=True, locked=[slot_bitmap] if slot_bitmap else []
+            )
+
+    @traced
+    def occupy_slots_for_reservations(
+        self, reservations: List[Any], slot_bitmaps: Iterable[TableSlotBitmap] = ()
+    ) -> None:
+        """Take the slots of many reservations in a single insert.
+
+        ``slot_bitmaps`` are the day bitmaps of their tables already locked.
+        """
+        TableOccupancy.objects.bulk_create(
+            TableOccupancy(
+                table_id=reservation.table_id,
+                reservation=reservation,
+                date=reservation.reservation_date,
+                slot=slot,
+            )
+            for reservation in reservations
+            for slot in self.get_slots(
+                reservation.reservation_time, reservation.duration
+            )
+        )
+        self.update_slot_bitmaps(reservations, occupy=True, locked=slot_bitmaps)
+
+    @traced
+    def reclaim_expired_slots(
+        self, table: Table, reservation_date: date, reservation_time: time
+    ) -> None:
+        """Free the slots of a table left behind by expired booking holds."""
+        TableOccupancy.objects.filter(
+            table=table,
+            date=reservation_date,
+            slot__in=self.get_slots(reservation_time),
+            expires_at__lte=timezone.now(),
+        ).delete()
+
+    @staticmethod
+    @traced
+    def release_slots(reservation: Any) -> None:
+        """Free the slots taken by a reservation."""
+        TableOccupancy.objects.filter(reservation=reservation).delete()
+        TableService.update_slot_bitmaps([reservation], occupy=False)
+
+    @staticmethod
+    def update_slot_bitmaps(
+        reservations: Iterable[Any],
+        occupy: bool,
+        locked: Iterable[TableSlotBitmap] = (),
+    ) -> None:
+        """Set or clear the slots of reservations in the tables' day bitmaps.
+
+        Takes a constant number of queries however many reservations there
+        are. The bitmap rows are locked until the end of the transaction.
+        Bitmaps already ``locked`` in it, as returned by ``lock_table_days``,
+        are updated without being created or read again.
+        """
+        masks: DefaultDict[Tuple[int, date], int] = defaultdict(int)
+        for reservation in reservations:
+            masks[
+                (reservation.table_id, reservation.reservation_date)
+            ] |= TableService.get_slot_mask(
+                reservation.reservation_time, reservation.duration
+            )
+        if not masks:
+            return
+
+        bitmaps = {(bitmap.table_id, bitmap.date): bitmap for bitmap in locked}
+        missing = [key for key in masks if key not in bitmaps]
+        with transaction.atomic(savepoint=False):
+            if missing and occupy:
+                TableSlotBitmap.objects.bulk_create(
+                    (
+                        TableSlotBitmap(table_id=table_id, date=reservation_date)
+                        for table_id, reservation_date in missing
+                    ),
+                    ignore_conflicts=True,
+                )
+            if missing:
+                bitmaps.update(
+                    ((bitmap.table_id, bitmap.date), bitmap)
+                    for bitmap in TableSlotBitmap.objects.select_for_update()
+                    .filter(
+                        table_id__in={table_id for table_id, _ in missing},
+                        date__in={reservation_date for _, reservation_date in missing},
+                    )
+                    .order_by("table_id", "date")
+                )
+
+            updated = []
+            for key, mask in masks.items():
+                bitmap = bitmaps.get(key)
+                if bitmap is None:
+                    continue
+                bitmap.slots = bitmap.slots | mask if occupy else bitmap.slots & ~mask
+                updated.append(bitmap)
+            TableSlotBitmap.objects.bulk_update(updated, ["bitmap"])
+
+    def search_availability(
+        self,
+        people_count: int,
+        start_date: date,
+        end_date: date,
+        start_time: Optional[time] = None,
+        end_time: Optional[time] = None,
+    ) -> List[Dict[str, Any]]:
+        """Get the start times between two dates at which a party can book.
+
+        Every start time between start_time and end_time (the whole day by
+        default) of every day is returned with the cheapest table free for
+        the whole reservation.
+        """
+        first_slot = self.get_slots(start_time).start if start_time else 0
+        last_slot = (
+            self.get_slots(end_time).start if end_time else self.get_day_slots() - 1
+        )
+        if last_slot < first_slot:
+            return []
+        window = ((1 << (last_slot - first_slot + 1)) - 1) << first_slot
+
+        return list(self._iter_free_slots(people_count, start_date, end_date, window))
+
+    def suggest_slots(
+        self,
+        people_count: int,
+        reservation_date: date,
+        reservation_time: time,
+        count: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Get the nearest start times after a reservation a party can book.
+
+        The search looks BOOKING_SUGGESTION_DAYS ahead at most and stops at
+        the first ``count`` start times (BOOKING_SUGGESTION_COUNT by default).
+        """
+        if count is None:
+            count = settings.BOOKING_SUGGESTION_COUNT
+        day = (1 << self.get_day_slots()) - 1
+        later = day & ~((1 << self.get_slots(reservation_time).start + 1) - 1)
+
+        return list(
+            islice(
+                self._iter_free_slots(
+                    people_count,
+                    reservation_date,
+                    reservation_date
+                    + timedelta(days=settings.BOOKING_SUGGESTION_DAYS - 1),
+                    day,
+                    first_window=later,
+                ),
+                count,
+            )
+        )
+
+    @staticmethod
+    def get_day_slots() -> int:
+        """Get the number of slots in a day."""
+        return 24 * 60 // settings.BOOKING_SLOT_MINUTES
+
+    def _iter_free_slots(
+        self,
+        people_count: int,
+        start_date: date,
+        end_date: date,
+        window: int,
+        first_window: Optional[int] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Get the free start times of a party in order, each with a table.
+
+        ``window`` is the bitmap of the start times searched each day, or
+        ``first_window`` on start_date. Reads the tables' day bitmaps and the
+        live booking holds in two queries, then finds the free start times of
+        each table and day with a few bitwise operations.
+        """
+        candidates = list(allocation_index.candidates(people_count, copy_tables=False))
+        if not candidates or end_date < start_date:
+            return
+
+        table_ids = [candidate.table.pk for candidate in candidates]
+        taken: DefaultDict[Tuple[int, date], int] = defaultdict(int)
+        for table_id, taken_date, bitmap in TableSlotBitmap.objects.filter(
+            table_id__in=table_ids, date__range=(start_date, end_date)
+        ).values_list("table_id", "date", "bitmap"):
+            taken[(table_id, taken_date)] |= int.from_bytes(bitmap, "little")
+        for table_id, taken_date, slot in TableOccupancy.objects.filter(
+            table_id__in=table_ids,
+            date__range=(start_date, end_date),
+            hold__isnull=False,
+            expires_at__gt=timezone.now(),
+        ).values_list("table_id", "date", "slot"):
+            taken[(table_id, taken_date)] |= 1 << slot
+
+        slot_minutes = settings.BOOKING_SLOT_MINUTES
+        slot_count = len(self.get_slots(time(0, 0)))
+        # Reservations must end by midnight
+        day_starts = (1 << (self.get_day_slots() - slot_count + 1)) - 1
+        window &= day_starts
+        if first_window is not None:
+            first_window &= day_starts
+        # Copies of the index's tables handed out in the results
+        tables: Dict[int, Table] = {}
+        for day in range((end_date - start_date).days + 1):
+            current_date = start_date + timedelta(days=day)
+            remaining = window
+            if day == 0 and first_window is not None:
+                remaining = first_window
+            found: Dict[int, TableCandidate] = {}
+
+            # The cheapest table takes every start time it is free at
+            for candidate in candidates:
+                if not remaining:
+                    break
+                busy = taken.get((candidate.table.pk, current_date), 0)
+                blocked = 0
+                for offset in range(slot_count):
+                    blocked |= busy >> offset
+                free = remaining & ~blocked
+                remaining &= blocked
+                while free:
+                    lowest = free & -free
+                    found[lowest.bit_length() - 1] = candidate
+                    free ^= lowest
+
+            for slot, candidate in sorted(found.items()):
+                if candidate.table.pk not in tables:
+                    tables[candidate.table.pk] = copy.copy(candidate.table)
+                minute = slot * slot_minutes
+                yield {
+                    "reservation_date": current_date,
+                    "reservation_time": time(minute // 60, minute % 60),
+                    "table": tables[candidate.table.pk],
+                    "seats_allocated": candidate.seats_allocated,
+                    "price": candidate.price,
+                }
+
     def calculate_table_price(self, table: Table, seats_requested: int) -> float:
         """Calculate the price for a table reservation."""
         # If booking the entire table, apply the discount (M-1)*X
@@ -20,52 +432,329 @@ class TableService:
         # Otherwise, charge per seat (X per seat)
         return float(table.price_per_seat * seats_requested)
 
-    def find_optimal_table(self, people_count: int) -> Optional[Dict[str, Any]]:
-        """Find the optimal table for the given number of people.
+    @traced
+    def allocate(
+        self,
+        people_count: int,
+        reservation_date: date,
+        reservation_time: time,
+        book: Callable[[Table, Dict[str, Any]], T],
+    ) -> Optional[T]:
+        """Book the cheapest table free for a reservation.
+
+        Walks the candidates from the cheapest, skipping the tables that got
+        booked meanwhile and those another booking is taking for the same day
+        right now (see ``lock_table_days``). ``book`` is called with the table
+        and the candidate details, along with the locked "slot_bitmap" of the
+        table's day, and must take the table's slots. When every table left is
+        being taken, the booking waits for them in turn.
+        """
+        with transaction.atomic():
+            candidates = list(
+                self.find_table_candidates(
+                    people_count, reservation_date, reservation_time
+                )
+            )
+            for skip_locked in (True, False):
+                contended = []
+                for table_info in candidates:
+                    table = table_info["table"]
+                    try:
+                        with transaction.atomic():
+                            locked = self.lock_table_days(
+                                [(table.pk, reservation_date)], skip_locked
+                            )
+                            if not locked:
+                                contended.append(table_info)
+                                continue
+                            self.reclaim_expired_slots(
+                                table, reservation_date, reservation_time
+                            )
+                            return book(
+                                table,
+                                {
+                                    **table_info,
+                                    "slot_bitmap": locked[(table.pk, reservation_date)],
+                                },
+                            )
+                    except IntegrityError:
+                        continue
+                candidates = contended
+
+        return None
+
+    @traced
+    def allocate_combination(
+        self,
+        people_count: int,
+        reservation_date: date,
+        reservation_time: time,
+        book: Callable[[List[Tuple[Table, Dict[str, Any]]]], T],
+    ) -> Optional[T]:
+        """Book the cheapest combination of tables that can seat a party.
+
+        When some of the chosen tables got booked meanwhile, or another
+        booking is taking them for the same day right now, the combination is
+        searched again without them. When only tables being taken are left,
+        the booking waits for them. ``book`` is called with the tables and
+        their details, each with its locked "slot_bitmap" as in ``allocate``,
+        and must take the tables' slots.
+        """
+        unavailable: Set[int] = set()
+        contended: Set[int] = set()
+        skip_locked = True
+        with transaction.atomic():
+            while True:
+                combination = self.find_table_combination(
+                    people_count,
+                    reservation_date,
+                    reservation_time,
+                    unavailable | contended if skip_locked else unavailable,
+                )
+                if not combination:
+                    if skip_locked and contended:
+                        skip_locked = False
+                        continue
+                    return None
+
+                tables = [
+                    (table_info["table"], table_info) for table_info in combination
+                ]
+                table_days = {(table.pk, reservation_date) for table, _ in tables}
+                try:
+                    with transaction.atomic():
+                        locked = self.lock_table_days(table_days, skip_locked)
+                        if len(locked) < len(table_days):
+                            contended.update(
+                                table_id for table_id, _ in table_days - set(locked)
+                            )
+                            continue
+                        for table, _ in tables:
+                            self.reclaim_expired_slots(
+                                table, reservation_date, reservation_time
+                            )
+                        return book(
+                            [
+                                (
+                                    table,
+                                    {
+                                        **table_info,
+                                        "slot_bitmap": locked[
+                                            (table.pk, reservation_date)
+                                        ],
+                                    },
+                                )
+                                for table, table_info in tables
+                            ]
+                        )
+                except IntegrityError:
+                    unavailable.update(table.pk for table, _ in tables)
+
+    @traced
+    def allocate_batch(
+        self, bookings: List[Tuple[int, date, time]]
+    ) -> List[Optional[Dict[str, Any]]]:
+        """Pick tables for many (people_count, date, time) bookings in one pass.
+
+        Bookings are served in order, each one taking the cheapest table left
+        free by the bookings before it. Only the days of the tables picked are
+        locked (see ``lock_table_days``), then their slots are read again. When
+        other bookings took some of them meanwhile, or hold the days of tables
+        picked after the first plan, the plan is made again around them. Each
+        booking planned comes with the locked "slot_bitmap" of its table's
+        day. Must run inside a transaction, which keeps the days locked until
+        the caller has written the reservations.
+        """
+        dates = {reservation_date for _, reservation_date, _ in bookings}
+        occupied: DefaultDict[Tuple[date, int], Set[int]] = defaultdict(set)
+        self._read_occupied(occupied, Q(date__in=dates))
+
+        locked: Dict[Tuple[int, date], TableSlotBitmap] = {}
+        unavailable: Set[Tuple[int, date]] = set()
+        while True:
+            plan = self._plan_batch(bookings, occupied, unavailable)
+            wanted = {
+                (info["table"].pk, reservation_date)
+                for info, (_, reservation_date, _) in zip(plan, bookings)
+                if info
+            } - set(locked)
+            if not wanted:
+                break
+
+            # Waiting for more days while holding some could deadlock
+            newly_locked = self.lock_table_days(wanted, skip_locked=bool(locked))
+            locked.update(newly_locked)
+            unavailable |= wanted - set(newly_locked)
+            if newly_locked:
+                # Bookings made since the slots were read
+                lookup = Q()
+                for table_id, reservation_date in newly_locked:
+                    lookup |= Q(table_id=table_id, date=reservation_date)
+                self._read_occupied(occupied, lookup)
+
+        for info, (_, reservation_date, _) in zip(plan, bookings):
+            if info:
+                info["slot_bitmap"] = locked[(info["table"].pk, reservation_date)]
+
+        planned = {info["table"].pk for info in plan if info}
+        if planned:
+            TableOccupancy.objects.filter(
+                table_id__in=planned,
+                date__in=dates,
+                expires_at__lte=timezone.now(),
+            ).delete()
+
+        return plan
+
+    @staticmethod
+    def _read_occupied(
+        occupied: DefaultDict[Tuple[date, int], Set[int]], lookup: Q
+    ) -> None:
+        # Add the tables taken at each (date, slot) by live occupancies
+        for table_id, occupied_date, slot in TableOccupancy.objects.filter(
+            Q(expires_at__isnull=True) | Q(expires_at__gt=timezone.now()), lookup
+        ).values_list("table_id", "date", "slot"):
+            occupied[(occupied_date, slot)].add(table_id)
+
+    def _plan_batch(
+        self,
+        bookings: List[Tuple[int, date, time]],
+        occupied: DefaultDict[Tuple[date, int], Set[int]],
+        unavailable: AbstractSet[Tuple[int, date]],
+    ) -> List[Optional[Dict[str, Any]]]:
+        taken = defaultdict(set, {key: set(ids) for key, ids in occupied.items()})
+        plan: List[Optional[Dict[str, Any]]] = []
+
+        for people_count, reservation_date, reservation_time in bookings:
+            slots = self.get_slots(reservation_time)
+            blocked = {
+                table_id
+                for table_id, unavailable_date in unavailable
+                if unavailable_date == reservation_date
+            }.union(*(taken[(reservation_date, slot)] for slot in slots))
+            candidate = allocation_index.best(people_count, exclude_table_ids=blocked)
+
+            if not candidate:
+                plan.append(None)
+                continue
+
+            for slot in slots:
+                taken[(reservation_date, slot)].add(candidate.table.pk)
+            plan.append(
+                {
+                    "table": candidate.table,
+                    "seats_allocated": candidate.seats_allocated,
+                    "price": candidate.price,
+                }
+            )
+
+        return plan
+
+    def find_table_candidates(
+        self,
+        people_count: int,
+        reservation_date: Optional[date] = None,
+        reservation_time: Optional[time] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Get the tables that fit the party, the cheapest option first.
 
         Rules:
         1. Tables have 4-10 seats
         2. Cannot book odd number of seats unless it equals table's total seats
         3. System offers the cheapest price option
+
+        The candidates are read from the in-memory allocation index. When a
+        date and time are given, tables already occupied during the
+        reservation are skipped, which costs a single query.
         """
-        available_tables = self.get_available_tables()
+        occupied = set()
+        if reservation_date is not None and reservation_time is not None:
+            occupied = self.get_occupied_table_ids(reservation_date, reservation_time)
 
-        if not available_tables:
-            return None
+        for candidate in allocation_index.candidates(
+            people_count, exclude_table_ids=occupied
+        ):
+            yield {
+                "table": candidate.table,
+                "seats_allocated": candidate.seats_allocated,
+                "price": candidate.price,
+            }
 
-        # Handle odd number of people
-        adjusted_people_count = people_count
-        if people_count % 2 != 0:  # If odd number
-            # First try to find a table with exactly this many seats
-            exact_match = available_tables.filter(seats=people_count).first()
-            if exact_match:
-                return {
-                    "table": exact_match,
-                    "seats_allocated": people_count,
-                    "price": self.calculate_table_price(exact_match, people_count),
-                }
-            # If no exact match, round up to next even number
-            adjusted_people_count = people_count + 1
+    @traced
+    def find_table_combination(
+        self,
+        people_count: int,
+        reservation_date: Optional[date] = None,
+        reservation_time: Optional[time] = None,
+        exclude_table_ids: AbstractSet[int] = frozenset(),
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Find the cheapest set of tables to split a party across.
 
-        # Find tables with enough seats
-        suitable_tables = available_tables.filter(seats__gte=adjusted_people_count)
+        Follows the same pricing rules as ``find_table_candidates`` for every
+        table of the set (see ``core.tables.combinations``). When a date and
+        time are given, tables already occupied during the reservation are
+        skipped.
+        """
+        occupied = set(exclude_table_ids)
+        if reservation_date is not None and reservation_time is not None:
+            occupied |= self.get_occupied_table_ids(reservation_date, reservation_time)
 
-        if not suitable_tables:
+        combination = cheapest_combination(
+            allocation_index.tables_by_seats(exclude_table_ids=occupied),
+            people_count,
+        )
+        if combination is None:
             return None
 
-        # Find the cheapest option
-        cheapest_option = None
-        lowest_price = float("inf")
-
-        for table in suitable_tables:
-            # Calculate price based on adjusted people count
-            price = self.calculate_table_price(table, adjusted_people_count)
-            if price < lowest_price:
-                lowest_price = price
-                cheapest_option = {
-                    "table": table,
-                    "seats_allocated": adjusted_people_count,
-                    "price": price,
-                }
+        # The index's tables are shared, hand out copies
+        return [
+            {**table_info, "table": copy.copy(table_info["table"])}
+            for table_info in combination
+        ]
+
+    def get_quotes(
+        self,
+        reservation_date: Optional[date] = None,
+        reservation_time: Optional[time] = None,
+    ) -> Dict[str, Any]:
+        """Get what every party size would pay, overall and at every table.
+
+        Read from the price matrix of the allocation index. When a date and
+        time are given, tables already occupied during the reservation are
+        left out, which costs a single query.
+        """
+        matrix = allocation_index.price_matrix()
+        occupied: Set[int] = set()
+        if reservation_date is not None and reservation_time is not None:
+            occupied = self.get_occupied_table_ids(reservation_date, reservation_time)
+
+        quotes = [
+            {"people_count": people_count, **(table_info or {})}
+            for people_count, table_info in zip(
+                matrix.party_sizes.tolist(), matrix.cheapest(occupied)
+            )
+        ]
+        tables = [
+            {
+                "table": table,
+                "prices": [price if price != float("inf") else None for price in row],
+            }
+            for table, row in zip(matrix.tables, matrix.prices.tolist())
+            if table.pk not in occupied
+        ]
+        return {"quotes": quotes, "tables": tables}
 
-        return cheapest_option
+    @traced
+    def find_optimal_table(
+        self,
+        people_count: int,
+        reservation_date: Optional[date] = None,
+        reservation_time: Optional[time] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Find the optimal table for the given number of people."""
+        return next(
+            self.find_table_candidates(
+                people_count, reservation_date, reservation_time
+            ),
+            None,
+        )
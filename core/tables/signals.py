@@ -0,0 +1,27 @@
+from typing import Any
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.bookings.models import Reservation
+from core.tables.allocation import allocation_index
+from core.tables.models import Table
+from core.tables.services import TableService
+
+
+@receiver(post_save, sender=Table)
+@receiver(post_delete, sender=Table)
+def invalidate_allocation_index(sender: Any, **kwargs: Any) -> None:
+    """
+    Rebuild the allocation index after the table inventory changes.
+    """
+    allocation_index.invalidate()
+
+
+@receiver(post_delete, sender=Reservation)
+def release_slot_bitmaps(sender: Any, instance: Reservation, **kwargs: Any) -> None:
+    """
+    Free the slots of a reservation deleted without being cancelled.
+    """
+    if instance.status != "cancelled":
+        TableService.update_slot_bitmaps([instance], occupy=False)
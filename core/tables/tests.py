@@ -1,7 +1,26 @@
-from django.test import TestCase
-from core.tables.models import Table
+import itertools
+import random
+import sys
+import time as timer
+from datetime import date, time, timedelta
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from core.bookings.models import BookingHold, Reservation
+from core.common.testing import benchmark
+from core.tables.allocation import TableAllocationIndex, allocation_index
+from core.tables.checks import check_allocation_index_cache
+from core.tables.combinations import cheapest_combination
+from core.tables.models import Table, TableOccupancy, TableSlotBitmap
+from core.tables.pricing import PriceMatrix
 from core.tables.services import TableService
 
+User = get_user_model()
+
 
 class TableModelTest(TestCase):
     def setUp(self):
@@ -78,3 +97,603 @@ class TableServiceTest(TestCase):
         self.assertIsNotNone(result)
         self.assertEqual(result["seats_allocated"], 6)
         self.assertEqual(result["table"].table_number, 103)
+
+
+class TableAllocationIndexTest(TestCase):
+    def setUp(self):
+        Table.objects.all().delete()
+        self.service = TableService()
+        self.table1 = Table.objects.create(
+            table_number=101, seats=4, price_per_seat=10.00
+        )
+        self.table2 = Table.objects.create(
+            table_number=102, seats=6, price_per_seat=8.00
+        )
+        self.table3 = Table.objects.create(
+            table_number=103, seats=5, price_per_seat=12.00
+        )
+
+    def tearDown(self):
+        Table.objects.all().delete()
+
+    def test_lookup_does_not_query_database(self):
+        self.service.find_optimal_table(4)
+        with self.assertNumQueries(0):
+            result = self.service.find_optimal_table(4)
+        self.assertEqual(result["table"].table_number, 101)
+
+    def test_candidates_ordered_by_price(self):
+        candidates = list(allocation_index.candidates(4))
+        self.assertEqual(
+            [candidate.table.table_number for candidate in candidates],
+            [101, 102, 103],
+        )
+        self.assertEqual(
+            [candidate.price for candidate in candidates], [30.0, 32.0, 48.0]
+        )
+
+    def test_odd_party_prefers_exact_match(self):
+        result = self.service.find_optimal_table(5)
+        self.assertEqual(result["table"].table_number, 103)
+        self.assertEqual(result["seats_allocated"], 5)
+        self.assertEqual(result["price"], 48.00)
+
+    def test_table_save_invalidates_index(self):
+        self.service.find_optimal_table(4)
+        self.table1.is_available = False
+        self.table1.save()
+        result = self.service.find_optimal_table(4)
+        self.assertEqual(result["table"].table_number, 102)
+
+    @override_settings(ALLOCATION_INDEX_CHECK_SECONDS=0)
+    def test_version_bump_from_other_process_invalidates_index(self):
+        self.service.find_optimal_table(4)
+        Table.objects.filter(pk=self.table1.pk).update(is_available=False)
+        cache.set(TableAllocationIndex.VERSION_CACHE_KEY, timer.time_ns())
+        result = self.service.find_optimal_table(4)
+        self.assertEqual(result["table"].table_number, 102)
+
+    @override_settings(ALLOCATION_INDEX_CHECK_SECONDS=0)
+    def test_evicted_version_invalidates_index(self):
+        self.service.find_optimal_table(4)
+        Table.objects.filter(pk=self.table1.pk).update(is_available=False)
+        cache.delete(TableAllocationIndex.VERSION_CACHE_KEY)
+        result = self.service.find_optimal_table(4)
+        self.assertEqual(result["table"].table_number, 102)
+
+    def test_version_read_once_per_check_interval(self):
+        self.service.find_optimal_table(4)
+        with mock.patch("core.tables.allocation.cache") as shared_cache:
+            self.service.find_optimal_table(4)
+            self.service.find_optimal_table(6)
+        shared_cache.get.assert_not_called()
+
+    def test_other_processes_are_told_on_commit(self):
+        self.service.find_optimal_table(4)
+        version = cache.get(TableAllocationIndex.VERSION_CACHE_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.table1.is_available = False
+            self.table1.save()
+            # Other workers can't rebuild from the inventory before the change
+            self.assertEqual(cache.get(TableAllocationIndex.VERSION_CACHE_KEY), version)
+            result = self.service.find_optimal_table(4)
+            self.assertEqual(result["table"].table_number, 102)
+        self.assertGreater(cache.get(TableAllocationIndex.VERSION_CACHE_KEY), version)
+
+    def test_party_larger_than_any_table(self):
+        self.assertIsNone(self.service.find_optimal_table(11))
+
+    def test_process_local_cache_fails_deploy_check(self):
+        self.assertEqual(
+            [error.id for error in check_allocation_index_cache()], ["tables.E001"]
+        )
+        shared = {"default": {"BACKEND": "django.core.cache.backends.db.DatabaseCache"}}
+        with override_settings(CACHES=shared):
+            self.assertEqual(check_allocation_index_cache(), [])
+
+
+class TableCombinationTest(TestCase):
+    def setUp(self):
+        Table.objects.all().delete()
+        self.service = TableService()
+        for table_number, seats, price in (
+            (101, 4, 10.00),
+            (102, 6, 8.00),
+            (103, 5, 12.00),
+            (104, 10, 15.00),
+        ):
+            Table.objects.create(
+                table_number=table_number, seats=seats, price_per_seat=price
+            )
+
+    def tearDown(self):
+        Table.objects.all().delete()
+
+    def group(self, tables):
+        with mock.patch.object(
+            TableService, "get_available_tables", return_value=tables
+        ):
+            return TableAllocationIndex._build()[1]
+
+    def brute_force(self, tables, people_count):
+        options = [
+            [(0, 0.0)]
+            + [
+                (seats, self.service.calculate_table_price(table, seats))
+                for seats in [*range(2, table.seats, 2), table.seats]
+            ]
+            for table in tables
+        ]
+        return min(
+            (
+                sum(price for _, price in combination)
+                for combination in itertools.product(*options)
+                if sum(seats for seats, _ in combination) >= people_count
+            ),
+            default=None,
+        )
+
+    def test_split_party(self):
+        combination = self.service.find_table_combination(12)
+        self.assertEqual(
+            [
+                (table_info["table"].table_number, table_info["seats_allocated"])
+                for table_info in combination
+            ],
+            [(101, 4), (102, 6), (103, 2)],
+        )
+        self.assertEqual(sum(table_info["price"] for table_info in combination), 94.0)
+
+    def test_matches_brute_force(self):
+        generator = random.Random(7)
+        for _ in range(200):
+            tables = [
+                Table(
+                    pk=table_number,
+                    table_number=table_number,
+                    seats=generator.randint(4, 10),
+                    price_per_seat=Decimal(generator.randint(5, 20)),
+                )
+                for table_number in range(1, generator.randint(1, 5) + 1)
+            ]
+            people_count = generator.randint(1, 30)
+            combination = cheapest_combination(self.group(tables), people_count)
+            expected = self.brute_force(tables, people_count)
+
+            if expected is None:
+                self.assertIsNone(combination)
+                continue
+            self.assertAlmostEqual(
+                sum(table_info["price"] for table_info in combination), expected
+            )
+            self.assertGreaterEqual(
+                sum(table_info["seats_allocated"] for table_info in combination),
+                people_count,
+            )
+
+    def test_skips_occupied_tables(self):
+        table = Table.objects.get(table_number=102)
+        combination = self.service.find_table_combination(
+            12, exclude_table_ids={table.pk}
+        )
+        self.assertNotIn(
+            102, [table_info["table"].table_number for table_info in combination]
+        )
+
+    def test_not_enough_seats(self):
+        self.assertIsNone(self.service.find_table_combination(26))
+
+    @benchmark
+    def test_benchmark_hundreds_of_tables(self):
+        generator = random.Random(7)
+        tables_by_seats = self.group(
+            [
+                Table(
+                    pk=table_number,
+                    table_number=table_number,
+                    seats=generator.randint(4, 10),
+                    price_per_seat=Decimal(generator.randint(5, 30)),
+                )
+                for table_number in range(1, 301)
+            ]
+        )
+        rounds = 50
+        for people_count in (11, 16, 24):
+            started = timer.perf_counter()
+            for _ in range(rounds):
+                combination = cheapest_combination(tables_by_seats, people_count)
+            elapsed = (timer.perf_counter() - started) / rounds
+
+            sys.stderr.write(
+                f"\n300 tables, party of {people_count}: {elapsed * 1000:.3f} ms"
+            )
+            self.assertGreaterEqual(
+                sum(table_info["seats_allocated"] for table_info in combination),
+                people_count,
+            )
+            self.assertLess(elapsed, 0.001)
+
+
+class PriceMatrixTest(TestCase):
+    def setUp(self):
+        Table.objects.all().delete()
+        self.service = TableService()
+        for table_number, seats, price in (
+            (101, 4, "10.10"),
+            (102, 6, "8.00"),
+            (103, 5, "12.35"),
+            (104, 10, "15.99"),
+            (105, 7, "9.50"),
+        ):
+            Table.objects.create(
+                table_number=table_number, seats=seats, price_per_seat=Decimal(price)
+            )
+
+    def tearDown(self):
+        Table.objects.all().delete()
+
+    def test_matches_calculate_table_price(self):
+        matrix = allocation_index.price_matrix()
+        for row, table in enumerate(matrix.tables):
+            for people_count in range(1, 11):
+                seats = matrix.seats_allocated[row, people_count - 1]
+                price = matrix.prices[row, people_count - 1]
+                if people_count > table.seats:
+                    self.assertEqual(price, float("inf"))
+                    continue
+                expected = people_count
+                if people_count % 2 and people_count != table.seats:
+                    expected += 1
+                self.assertEqual(seats, expected)
+                self.assertEqual(
+                    price, self.service.calculate_table_price(table, expected)
+                )
+
+    def test_cheapest_matches_find_optimal_table(self):
+        cheapest = allocation_index.price_matrix().cheapest()
+        for people_count, table_info in enumerate(cheapest, start=1):
+            expected = self.service.find_optimal_table(people_count)
+            self.assertEqual(table_info["table"].pk, expected["table"].pk)
+            self.assertEqual(table_info["price"], expected["price"])
+            self.assertEqual(table_info["seats_allocated"], expected["seats_allocated"])
+
+    def test_rebuilt_when_tables_change(self):
+        matrix = allocation_index.price_matrix()
+        self.assertIs(allocation_index.price_matrix(), matrix)
+        Table.objects.create(table_number=106, seats=4, price_per_seat=1.00)
+        self.assertEqual(len(allocation_index.price_matrix().tables), 6)
+
+    def test_no_tables(self):
+        self.assertEqual(PriceMatrix([]).cheapest(), [])
+
+    @benchmark
+    def test_benchmark_quote_whole_floor(self):
+        generator = random.Random(7)
+        tables = [
+            Table(
+                pk=table_number,
+                table_number=table_number,
+                seats=generator.randint(4, 10),
+                price_per_seat=Decimal(generator.randint(500, 3000)) / 100,
+            )
+            for table_number in range(1, 301)
+        ]
+        matrix = PriceMatrix(tables)
+
+        def quote_table_by_table():
+            # What the matrix replaces: every table priced for every party
+            quotes = []
+            for people_count in range(1, 11):
+                options = []
+                for table in tables:
+                    exact = people_count == table.seats
+                    seats = people_count if exact else people_count + people_count % 2
+                    if seats <= table.seats:
+                        price = self.service.calculate_table_price(table, seats)
+                        options.append((not (exact and people_count % 2), price))
+                quotes.append(min(options)[1])
+            return quotes
+
+        def best_of(quote, runs=20):
+            timings = []
+            for _ in range(runs):
+                started = timer.perf_counter()
+                quote()
+                timings.append(timer.perf_counter() - started)
+            return min(timings)
+
+        loop = best_of(quote_table_by_table)
+        elapsed = best_of(matrix.cheapest)
+
+        sys.stderr.write(
+            f"\n300 tables, quotes for 1-10 people: matrix {elapsed * 1000000:.1f} us, "
+            f"table by table {loop * 1000000:.1f} us"
+        )
+        self.assertEqual(
+            [quote["price"] for quote in matrix.cheapest()], quote_table_by_table()
+        )
+        self.assertLess(elapsed, 0.001)
+        self.assertLess(elapsed, loop / 5)
+
+
+@override_settings(BOOKING_SLOT_MINUTES=30, BOOKING_DURATION_MINUTES=120)
+class TableOccupancyTest(TestCase):
+    def setUp(self):
+        Table.objects.all().delete()
+        self.service = TableService()
+        self.user = User.objects.create_user(email="occupancy@test.com", password="pw")
+        self.table1 = Table.objects.create(
+            table_number=101, seats=4, price_per_seat=10.00
+        )
+        self.table2 = Table.objects.create(
+            table_number=102, seats=4, price_per_seat=12.00
+        )
+        self.date = date(2030, 1, 1)
+        self.reservation = Reservation.objects.create(
+            user=self.user,
+            table=self.table1,
+            seats_reserved=4,
+            total_cost=30.00,
+            status="confirmed",
+            reservation_date=self.date,
+            reservation_time=time(19, 0),
+        )
+        self.service.occupy_slots(self.table1, self.reservation, self.date, time(19, 0))
+
+    def tearDown(self):
+        Reservation.objects.all().delete()
+        Table.objects.all().delete()
+
+    def test_get_slots(self):
+        self.assertEqual(list(self.service.get_slots(time(19, 15))), [38, 39, 40, 41])
+        self.assertEqual(
+            list(self.service.get_slots(time(19, 15), timedelta(minutes=50))),
+            [38, 39],
+        )
+
+    def test_occupy_slots_for_reservation_duration(self):
+        reservation = Reservation.objects.create(
+            user=self.user,
+            table=self.table2,
+            seats_reserved=4,
+            total_cost=30.00,
+            status="confirmed",
+            reservation_date=self.date,
+            reservation_time=time(12, 0),
+            duration=timedelta(hours=3),
+        )
+        self.service.occupy_slots(self.table2, reservation, self.date, time(12, 0))
+        self.assertEqual(
+            list(
+                TableOccupancy.objects.filter(reservation=reservation)
+                .order_by("slot")
+                .values_list("slot", flat=True)
+            ),
+            list(range(24, 30)),
+        )
+        self.assertEqual(
+            TableSlotBitmap.objects.get(table=self.table2, date=self.date).slots,
+            0b111111 << 24,
+        )
+
+    def test_get_free_tables_excludes_overlapping_bookings(self):
+        self.assertEqual(
+            list(self.service.get_free_tables(self.date, time(20, 30))),
+            [self.table2],
+        )
+        self.assertEqual(
+            list(self.service.get_free_tables(self.date, time(21, 0))),
+            [self.table1, self.table2],
+        )
+
+    def test_find_optimal_table_skips_occupied_table(self):
+        result = self.service.find_optimal_table(4, self.date, time(18, 0))
+        self.assertEqual(result["table"].table_number, 102)
+
+    def test_find_optimal_table_other_date(self):
+        result = self.service.find_optimal_table(
+            4, self.date + timedelta(days=1), time(19, 0)
+        )
+        self.assertEqual(result["table"].table_number, 101)
+
+    def test_release_slots(self):
+        TableService.release_slots(self.reservation)
+        self.assertEqual(
+            list(self.service.get_free_tables(self.date, time(19, 0))),
+            [self.table1, self.table2],
+        )
+
+    def test_double_booking_rejected(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.service.occupy_slots(
+                self.table1, self.reservation, self.date, time(20, 0)
+            )
+
+
+@override_settings(BOOKING_SLOT_MINUTES=30, BOOKING_DURATION_MINUTES=120)
+class TableSlotBitmapTest(TestCase):
+    def setUp(self):
+        Table.objects.all().delete()
+        self.service = TableService()
+        self.user = User.objects.create_user(email="bitmap@test.com", password="pw")
+        self.table1 = Table.objects.create(
+            table_number=101, seats=4, price_per_seat=10.00
+        )
+        self.table2 = Table.objects.create(
+            table_number=102, seats=6, price_per_seat=12.00
+        )
+        self.date = date(2030, 1, 4)
+
+    def tearDown(self):
+        Reservation.objects.all().delete()
+        Table.objects.all().delete()
+
+    def book(self, reservation_date, reservation_time, people_count=4):
+        return Reservation.create_reservation(
+            self.user, people_count, reservation_date, reservation_time
+        )
+
+    def get_slots(self, table, reservation_date):
+        bitmap = TableSlotBitmap.objects.filter(
+            table=table, date=reservation_date
+        ).first()
+        return bitmap.slots if bitmap else 0
+
+    def test_booking_and_cancelling_update_bitmap(self):
+        result = self.book(self.date, time(19, 0))
+        self.assertEqual(self.get_slots(self.table1, self.date), 0b1111 << 38)
+
+        self.book(self.date, time(12, 30))
+        self.assertEqual(
+            self.get_slots(self.table1, self.date), 0b1111 << 38 | 0b1111 << 25
+        )
+
+        Reservation.objects.get(pk=result.reservation_id).cancel()
+        self.assertEqual(self.get_slots(self.table1, self.date), 0b1111 << 25)
+
+    def test_confirmed_hold_updates_bitmap(self):
+        result = BookingHold.create_hold(self.user, 4, self.date, time(19, 0), 60)
+        self.assertEqual(self.get_slots(self.table1, self.date), 0)
+
+        BookingHold.objects.get(token=result["hold_token"]).confirm()
+        self.assertEqual(self.get_slots(self.table1, self.date), 0b1111 << 38)
+
+    def test_locked_bitmaps_are_not_read_again(self):
+        reservations = [
+            Reservation(
+                table=table,
+                reservation_date=self.date,
+                reservation_time=time(19, 0),
+                duration=timedelta(hours=2),
+            )
+            for table in (self.table1, self.table2)
+        ]
+        with transaction.atomic():
+            locked = self.service.lock_table_days([(self.table1.pk, self.date)])
+            with CaptureQueriesContext(connection) as queries:
+                self.service.update_slot_bitmaps(
+                    reservations, occupy=True, locked=locked.values()
+                )
+        # Only the day of table2 is created and locked before the update
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(self.get_slots(self.table1, self.date), 0b1111 << 38)
+        self.assertEqual(self.get_slots(self.table2, self.date), 0b1111 << 38)
+
+    def test_deleting_reservation_clears_bitmap(self):
+        self.book(self.date, time(19, 0))
+        Reservation.objects.all().delete()
+        self.assertEqual(self.get_slots(self.table1, self.date), 0)
+
+    def test_search_matches_booking_attempts(self):
+        generator = random.Random(7)
+        dates = [self.date + timedelta(days=day) for day in range(3)]
+        for _ in range(20):
+            self.book(
+                generator.choice(dates),
+                time(generator.randint(10, 21), generator.choice((0, 30))),
+                generator.choice((2, 4, 6)),
+            )
+        BookingHold.create_hold(self.user, 4, dates[0], time(9, 0), 60)
+
+        found = {
+            (item["reservation_date"], item["reservation_time"]): item
+            for item in self.service.search_availability(4, dates[0], dates[-1])
+        }
+        for reservation_date in dates:
+            for slot in range(48):
+                reservation_time = time(slot // 2, slot % 2 * 30)
+                expected = self.service.find_optimal_table(
+                    4, reservation_date, reservation_time
+                )
+                item = found.get((reservation_date, reservation_time))
+                if expected is None or not self.service.ends_by_midnight(
+                    reservation_time
+                ):
+                    self.assertIsNone(item)
+                else:
+                    self.assertEqual(item["table"].pk, expected["table"].pk)
+                    self.assertEqual(item["price"], expected["price"])
+
+    def test_search_time_window(self):
+        self.book(self.date, time(19, 0), 6)
+        results = self.service.search_availability(
+            6, self.date, self.date, time(17, 0), time(21, 0)
+        )
+        self.assertEqual(
+            [item["reservation_time"] for item in results],
+            [time(17, 0), time(21, 0)],
+        )
+
+    def test_suggest_slots(self):
+        self.book(self.date, time(19, 0), 6)
+        self.book(self.date, time(21, 0), 6)
+        suggestions = self.service.suggest_slots(6, self.date, time(19, 0), count=3)
+        self.assertEqual(
+            [
+                (item["reservation_date"], item["reservation_time"])
+                for item in suggestions
+            ],
+            [
+                (self.date + timedelta(days=1), time(0, 0)),
+                (self.date + timedelta(days=1), time(0, 30)),
+                (self.date + timedelta(days=1), time(1, 0)),
+            ],
+        )
+        self.assertEqual(suggestions[0]["table"].pk, self.table2.pk)
+
+    def test_search_stops_at_midnight(self):
+        results = self.service.search_availability(
+            4, self.date, self.date, time(21, 0), time(23, 30)
+        )
+        # A reservation lasts two hours and must end by midnight
+        self.assertEqual(
+            [item["reservation_time"] for item in results],
+            [time(21, 0), time(21, 30), time(22, 0)],
+        )
+        self.assertTrue(self.service.ends_by_midnight(time(22, 0)))
+        self.assertFalse(self.service.ends_by_midnight(time(22, 30)))
+
+    @override_settings(BOOKING_SUGGESTION_DAYS=2)
+    def test_suggest_slots_search_is_bounded(self):
+        for day in range(3):
+            for hour in range(0, 24, 2):
+                self.book(self.date + timedelta(days=day), time(hour, 0))
+                self.book(self.date + timedelta(days=day), time(hour, 0), 6)
+        self.assertEqual(self.service.suggest_slots(4, self.date, time(19, 0)), [])
+
+    def test_search_query_count_does_not_grow_with_range(self):
+        allocation_index.best(4)
+        with self.assertNumQueries(2):
+            self.service.search_availability(4, self.date, self.date)
+        with self.assertNumQueries(2):
+            self.service.search_availability(
+                4, self.date, self.date + timedelta(days=13)
+            )
+
+    def test_benchmark_week_search(self):
+        Table.objects.bulk_create(
+            Table(table_number=table_number, seats=4, price_per_seat=10.00)
+            for table_number in range(103, 303)
+        )
+        allocation_index.invalidate()
+        TableSlotBitmap.objects.bulk_create(
+            TableSlotBitmap(table=table, date=self.date + timedelta(days=day))
+            for table in Table.objects.all()
+            for day in range(7)
+        )
+        for bitmap in TableSlotBitmap.objects.all():
+            bitmap.slots = random.Random(bitmap.pk).getrandbits(48)
+            bitmap.save()
+        allocation_index.best(4)
+
+        rounds = 10
+        started = timer.perf_counter()
+        for _ in range(rounds):
+            self.service.search_availability(
+                4, self.date, self.date + timedelta(days=6)
+            )
+        elapsed = (timer.perf_counter() - started) / rounds
+
+        sys.stderr.write(
+            f"\n202 tables, week-wide availability search: {elapsed * 1000:.2f} ms"
+        )
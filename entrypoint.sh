@@ -36,6 +36,10 @@ echo "PostgreSQL is available."
 
 echo "Applying database migrations..."
 python manage.py migrate
+python manage.py createcachetable
+
+echo "Checking the deployment settings..."
+python manage.py check --deploy --fail-level ERROR
 
 if [ "$CREATE_SUPERUSER" = "true" ]; then
 echo "Creating superuser if it doesn't exist..."